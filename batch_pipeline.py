@@ -0,0 +1,529 @@
+"""
+Headless site-model -> ADD/UPDATE pipeline.
+
+Runs the same steps as the interactive Batch Site Model Editor (option 4) and
+Batch UDMI + Config Pipeline (option 5) for every selected building, without
+any prompts.  Every decision a user would normally make at the keyboard comes
+from a plan file (YAML or JSON) or from the default policy below, and the
+outcome for each device is written to a machine-readable JSON report.
+
+Plan file keys (all optional except site_models_dir):
+
+  site_models_dir: /path/to/site_models    # folder holding <building>/udmi/devices/
+  buildings: all                           # or a list of building folder names
+  devices: all                             # or a list of device folders to process
+  export_building_config: true             # pull a fresh BC unless a *_local.yaml exists
+  export_cache_ttl: 600                    # reuse a BC export younger than this many seconds; 0 = always pull
+  normalize_points: true                   # option 4 step: rename points, fix units
+  generate_updates: true                   # option 5 step: write _add/_update YAMLs
+  unmatched_points: keep                   # keep | skip  (the (k)/(s) bulk choices)
+  type_selection: top                      # top | complete  (complete = 100% required only)
+  add_missing_required: true               # add MISSING placeholders for the chosen type
+  accept_inferred_name: true               # use the name inferred from refs
+  workers: 1                               # buildings processed in parallel worker processes
+  incremental: true                        # skip devices unchanged since the last run (onboard_state.json)
+  report: /path/to/report.json             # default: <meter_onboarding>/headless_report.json
+  overrides:                               # per building, per device
+    building_a:
+      PVI-1: {name: power-meter-X, type: EM_PWM, missing_fields: [...], skip: false}
+
+With incremental on, each building's meter_onboarding/<building>/onboard_state.json
+records the input hashes and outputs of every device step that finished (see
+onboard_state.py); devices whose metadata.json, mapping files, discovery and
+building config entries and plan options are unchanged are not reprocessed.
+
+run_portfolio() is the menu/CLI portfolio mode: option 4 normalization for
+every building under the site_models directory, several buildings at a time.
+"""
+
+import contextlib
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from building_batch import (
+    DeviceSnapshot,
+    WORKING_FOLDER_NAME,
+    _apply_guid_from_building_config,
+    _apply_num_id_from_discovery,
+    _export_context,
+    _extract_building_code,
+    _get_export_status,
+    _get_guid_status,
+    _get_num_id_status,
+    _get_points_status,
+    _infer_meter_type,
+    _load_building_config,
+    _load_discovery_lookup,
+    _normalize_context,
+    _validate_discovery_json,
+    _write_export_yaml,
+    find_device_folders,
+    find_site_models,
+    load_device_snapshot,
+    load_device_snapshots,
+    load_site_models_dir,
+    overwrite_json,
+    save_site_models_dir,
+)
+from building_config_updater import BuildingConfigIndex
+from export_building_config import export_building_config
+from field_map_utils import get_field_map
+import instrumentation
+from onboard_state import BuildingState, step_inputs
+from site_model_editor import (
+    apply_resolution,
+    build_translation_rows,
+    process_points,
+    validate_site_model,
+)
+from translation_builder_udmi import build_udmi_dict_from_rows, missing_translation_rows
+from type_matcher import get_type_index, match_type, top_types
+
+
+_UNMATCHED_CHOICES = ("keep", "skip")
+_TYPE_CHOICES = ("top", "complete")
+
+# Default worker processes for portfolio mode
+MAX_PORTFOLIO_WORKERS = min(8, os.cpu_count() or 1)
+
+
+@dataclass
+class PipelinePolicy:
+    """Answers to every prompt the interactive batch flows would ask."""
+    site_models_dir: str = ""
+    buildings: Any = "all"
+    devices: Any = "all"
+    export_building_config: bool = True
+    export_cache_ttl: Optional[float] = None
+    normalize_points: bool = True
+    generate_updates: bool = True
+    unmatched_points: str = "keep"
+    type_selection: str = "top"
+    add_missing_required: bool = True
+    accept_inferred_name: bool = True
+    workers: int = 1
+    incremental: bool = True
+    report: Optional[str] = None
+    overrides: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PipelinePolicy":
+        if not isinstance(data, dict):
+            raise ValueError("A plan must be a mapping of plan keys")
+        known = set(cls.__dataclass_fields__)
+        unknown = sorted(set(data) - known)
+        if unknown:
+            raise ValueError(f"Unknown plan key(s): {', '.join(unknown)}")
+        policy = cls(**data)
+        if policy.unmatched_points not in _UNMATCHED_CHOICES:
+            raise ValueError(f"unmatched_points must be one of {_UNMATCHED_CHOICES}")
+        if policy.type_selection not in _TYPE_CHOICES:
+            raise ValueError(f"type_selection must be one of {_TYPE_CHOICES}")
+        if not isinstance(policy.workers, int) or isinstance(policy.workers, bool) or policy.workers < 1:
+            raise ValueError("workers must be a positive integer")
+        ttl = policy.export_cache_ttl
+        if ttl is not None and (not isinstance(ttl, (int, float)) or isinstance(ttl, bool) or ttl < 0):
+            raise ValueError("export_cache_ttl must be a non-negative number of seconds")
+        for key in ("buildings", "devices"):
+            value = getattr(policy, key)
+            if value != "all" and not isinstance(value, list):
+                raise ValueError(f"{key} must be 'all' or a list of folder names")
+        if not isinstance(policy.overrides, dict):
+            raise ValueError("overrides must map building names to device overrides")
+        for building, devices in policy.overrides.items():
+            if not isinstance(devices, dict) or not all(isinstance(o, dict) for o in devices.values()):
+                raise ValueError(f"overrides.{building} must map device folders to override mappings")
+        return policy
+
+    def override_for(self, building: str, folder: str) -> Dict[str, Any]:
+        return (self.overrides.get(building) or {}).get(folder) or {}
+
+
+def load_plan(path: str) -> PipelinePolicy:
+    """Load a YAML or JSON plan file into a PipelinePolicy."""
+    with open(path, "r", encoding="utf-8") as fh:
+        data = yaml.safe_load(fh) or {}  # JSON is valid YAML
+    if not isinstance(data, dict):
+        raise ValueError(f"Plan file must contain a mapping: {path}")
+    return PipelinePolicy.from_dict(data)
+
+
+# ---------------------------------------------------------------------------
+# Per-building steps
+# ---------------------------------------------------------------------------
+
+def _prepare_work_dir(policy: PipelinePolicy, building: str, devices_dir: str, report: Dict[str, Any]):
+    """Create meter_onboarding/<building> (keeping existing files) and load BC + discovery."""
+    parent = os.path.dirname(os.path.normpath(policy.site_models_dir))
+    work_dir = os.path.join(parent, WORKING_FOLDER_NAME, building)
+    os.makedirs(os.path.join(work_dir, "building_config_updates"), exist_ok=True)
+    report["work_dir"] = work_dir
+
+    building_code = _extract_building_code(devices_dir)
+    report["building_code"] = building_code
+    has_local = any(f.endswith("_full_building_config_local.yaml") for f in os.listdir(work_dir))
+    if building_code and policy.export_building_config and not has_local:
+        outfile = os.path.join(work_dir, f"{building_code}_full_building_config.yaml")
+        try:
+            # The TTL travels on the policy: worker processes do not see the
+            # parent's export_building_config.EXPORT_CACHE_TTL_S under spawn.
+            export_building_config(building_code, outfile, max_age=policy.export_cache_ttl)
+        except Exception as e:
+            report["errors"].append(f"Could not pull building config: {e}")
+
+    discovery_path = os.path.join(work_dir, "device_discovery.json")
+    discovery: Dict[str, int] = {}
+    if os.path.isfile(discovery_path) and os.path.getsize(discovery_path) > 0:
+        valid, err = _validate_discovery_json(discovery_path)
+        if valid:
+            discovery = _load_discovery_lookup(work_dir)
+        else:
+            report["errors"].append(f"device_discovery.json invalid: {err}")
+    else:
+        report["errors"].append(f"device_discovery.json missing or empty: {discovery_path}")
+
+    return work_dir, discovery, BuildingConfigIndex(_load_building_config(work_dir))
+
+
+def _normalize_device(policy, snapshot, discovery, building_config, entry, state=None) -> DeviceSnapshot:
+    """Option 4 for one device: num_id, GUID, point renames and units — no prompts.
+
+    Returns the device's snapshot as it is on disk afterwards.
+    """
+    parsed = snapshot.parsed
+    folder = snapshot.folder
+    context = _normalize_context(folder, snapshot.dbo_name, discovery, building_config, policy.unmatched_points)
+    if state is not None:
+        previous = state.current(folder, "normalize", step_inputs(snapshot.meta_path, context))
+        if previous is not None:
+            entry["normalize"] = dict(previous, points_changed=False, metadata_written=False, unchanged_since_last_run=True)
+            return snapshot
+
+    if discovery and folder in discovery:
+        _apply_num_id_from_discovery(parsed, discovery[folder])
+    if discovery and folder in discovery and building_config:
+        _apply_guid_from_building_config(folder, snapshot.dbo_name, parsed, building_config)
+
+    field_map = get_field_map(snapshot.meter_type)
+    original_points = parsed["pointset"]["points"]
+    updated_points, _, unmatched, ignored = process_points(
+        original_points, field_map.ci_raw_to_standard, field_map.dbo_units
+    )
+    to_skip = set(unmatched) if policy.unmatched_points == "skip" else set()
+    updated_points = apply_resolution(updated_points, to_skip)
+    # Key order is part of the file, so compare items in order
+    changed = list(updated_points.items()) != list(original_points.items())
+    # One write for num_id, GUID and points, skipped when the bytes are unchanged
+    written = overwrite_json(snapshot.meta_path, parsed, updated_points)
+    entry["normalize"] = {
+        "unmatched": sorted(unmatched),
+        "unmatched_action": policy.unmatched_points,
+        "ignored": sorted(ignored),
+        "points_written": len(updated_points),
+        "points_changed": changed,
+        "metadata_written": written,
+    }
+    on_disk = load_device_snapshot(os.path.dirname(os.path.dirname(snapshot.meta_path)), folder)
+    if state is not None and on_disk.parsed == parsed:
+        outputs = {k: v for k, v in entry["normalize"].items() if k != "metadata_written"}
+        state.record(folder, "normalize", step_inputs(snapshot.meta_path, context), outputs)
+    return on_disk
+
+
+def _export_mode(policy, override) -> Dict[str, Any]:
+    """The plan options that change what _generate_update writes for a device."""
+    return {
+        "type_selection": policy.type_selection,
+        "add_missing_required": policy.add_missing_required,
+        "accept_inferred_name": policy.accept_inferred_name,
+        "override": override,
+    }
+
+
+def _generate_update(
+    policy, building, snapshot, discovery, building_config, type_map, output_dir, entry, state=None,
+) -> None:
+    """Option 5 for one device: pick name and type, then write _add/_update YAML — no prompts."""
+    folder = snapshot.folder
+    meter_type = snapshot.meter_type
+    override = policy.override_for(building, folder)
+
+    num_st = _get_num_id_status(snapshot, discovery)
+    pts_st = _get_points_status(snapshot)
+    dbo_name = override.get("name") or (snapshot.dbo_name if policy.accept_inferred_name else "")
+    entry["dbo_name"] = dbo_name
+    if not dbo_name:
+        entry["skipped"] = "no meter name (inference failed or accept_inferred_name is false)"
+        return
+    if state is not None:
+        inputs = step_inputs(
+            snapshot.meta_path,
+            _export_context(folder, dbo_name, discovery, building_config, _export_mode(policy, override)),
+        )
+        previous = state.current(folder, "export", inputs)
+        if previous is not None:
+            entry.update((k, v) for k, v in previous.items() if k != "output_digest")
+            entry["unchanged_since_last_run"] = True
+            return
+    guid_st = _get_guid_status(snapshot, dbo_name, discovery, building_config)
+    export_st = _get_export_status(num_st, guid_st, pts_st)
+    entry["status"] = {"num_id": num_st, "guid": guid_st, "points": pts_st, "export": export_st}
+    if export_st == "[BLOCKED]":
+        entry["skipped"] = "not ready"
+        return
+    if export_st == "":
+        entry["skipped"] = "no discovery data"
+        return
+
+    meta_guid = snapshot.guid
+    if export_st == "[ADD]" and not meta_guid:
+        entry["skipped"] = "no GUID in metadata"
+        return
+    guid = meta_guid.replace("uuid://", "") if meta_guid else ""
+
+    field_standard_units = get_field_map(meter_type).standard_units
+    yaml_points = {k: v for k, v in snapshot.points.items() if k in field_standard_units}
+    if not yaml_points:
+        entry["skipped"] = "no recognized standard field names"
+        return
+
+    ranked = top_types(set(yaml_points), meter_type, type_map, 5)
+    entry["type_candidates"] = [r.type_name for r in ranked]
+    selected = None
+    if override.get("type"):
+        selected = match_type(set(yaml_points), override["type"], meter_type, type_map)
+        type_name = override["type"]
+    elif ranked and (policy.type_selection == "top" or ranked[0].required_pct == 100.0):
+        selected = ranked[0]
+        type_name = selected.type_name
+    else:
+        entry["skipped"] = "no acceptable canonical type"
+        return
+    entry["type"] = type_name
+
+    missing_fields: List[str] = []
+    if policy.add_missing_required and selected is not None:
+        missing_fields.extend(selected.missing_required)
+    missing_fields.extend(f for f in override.get("missing_fields") or [] if f not in missing_fields)
+    entry["missing_fields"] = missing_fields
+
+    rows = build_translation_rows(yaml_points, field_standard_units, dbo_name, "METER", type_name)
+    rows += missing_translation_rows(missing_fields, dbo_name, "METER", type_name)
+
+    num_id = str(snapshot.num_id if snapshot.num_id is not None else "")
+    udmi_dict = build_udmi_dict_from_rows(rows, num_id=num_id, guid=guid)
+    meter_data = udmi_dict.get(guid, next(iter(udmi_dict.values()), {}))
+
+    results: Dict[str, List[str]] = {"added": [], "updated": []}
+    _write_export_yaml(
+        export_st, guid, meter_data, dbo_name, snapshot.site_code,
+        building_config, output_dir, results,
+    )
+    written = results["added"] or results["updated"]
+    entry["output_file"] = os.path.join(output_dir, written[0]) if written else None
+    if state is not None and entry["output_file"]:
+        keys = ("dbo_name", "status", "type_candidates", "type", "missing_fields", "output_file")
+        state.record(folder, "export", inputs, {k: entry[k] for k in keys})
+
+
+def run_building(policy: PipelinePolicy, building: str, type_map=None) -> Dict[str, Any]:
+    """Run the full pipeline for one building folder and return its report entry."""
+    if type_map is None:
+        type_map = get_type_index()
+    report: Dict[str, Any] = {"building": building, "errors": [], "devices": []}
+    devices_dir = os.path.join(policy.site_models_dir, building, "udmi", "devices")
+    print(f"\n=== {building} ===")
+
+    work_dir, discovery, building_config = _prepare_work_dir(policy, building, devices_dir, report)
+    output_dir = os.path.join(work_dir, "building_config_updates")
+
+    folders = [f for f in find_device_folders(devices_dir) if _infer_meter_type(f)]
+    if policy.devices != "all":
+        wanted = set(policy.devices)
+        folders = [f for f in folders if f in wanted]
+    snapshots = load_device_snapshots(devices_dir, folders)
+    state = BuildingState.load(work_dir) if policy.incremental else None
+
+    for folder in folders:
+        print(f"\n--- Processing: {folder} ---")
+        entry: Dict[str, Any] = {"folder": folder}
+        report["devices"].append(entry)
+        if policy.override_for(building, folder).get("skip"):
+            entry["skipped"] = "skipped by plan"
+            continue
+        snapshot = snapshots[folder]
+        try:
+            if snapshot.parsed is None:
+                entry["error"] = f"Error reading metadata.json: {snapshot.load_error}"
+                continue
+            if not validate_site_model(snapshot.parsed):
+                entry["error"] = "metadata.json has no pointset.points"
+                continue
+            if policy.normalize_points:
+                snapshot = _normalize_device(policy, snapshot, discovery, building_config, entry, state)
+            if policy.generate_updates:
+                _generate_update(
+                    policy, building, snapshot, discovery, building_config, type_map, output_dir, entry, state,
+                )
+        except Exception as e:
+            entry["error"] = f"{type(e).__name__}: {e}"
+
+    if state is not None:
+        state.save()
+    return report
+
+
+def _run_building_captured(policy: PipelinePolicy, building: str, profile: bool = False):
+    """Worker-process entry point: run_building with its console output captured.
+
+    Returns (report, output, timing) so the parent can print each building's log
+    as one block; with profile, timing is this building's instrumentation.snapshot().
+    """
+    if profile:
+        instrumentation.enable()
+        instrumentation.reset()  # forked workers inherit the parent's spans
+    buf = io.StringIO()
+    with contextlib.redirect_stdout(buf):
+        try:
+            report = run_building(policy, building)
+        except Exception as e:
+            report = {"building": building, "errors": [f"{type(e).__name__}: {e}"], "devices": []}
+    return report, buf.getvalue(), instrumentation.snapshot() if profile else None
+
+
+def _run_buildings(policy: PipelinePolicy, buildings: List[str]) -> List[Dict[str, Any]]:
+    """Run every building, in worker processes when policy.workers > 1. Reports keep input order."""
+    workers = min(policy.workers, len(buildings))
+    if workers <= 1:
+        type_map = get_type_index()
+        return [run_building(policy, b, type_map) for b in buildings]
+
+    if policy.export_cache_ttl is None:
+        # Pin the parent's current TTL (e.g. --force-refresh from the menu) for the workers
+        from export_building_config import EXPORT_CACHE_TTL_S
+        policy = replace(policy, export_cache_ttl=EXPORT_CACHE_TTL_S)
+    print(f"Processing {len(buildings)} building(s) in {workers} worker process(es)...")
+    reports: Dict[str, Dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        profile = instrumentation.is_enabled()
+        futures = {pool.submit(_run_building_captured, policy, b, profile): b for b in buildings}
+        for future in as_completed(futures):
+            building = futures[future]
+            try:
+                report, output, timing = future.result()
+            except Exception as e:  # worker died; keep the other buildings
+                report, output, timing = (
+                    {"building": building, "errors": [f"{type(e).__name__}: {e}"], "devices": []}, "", None
+                )
+            reports[building] = report
+            instrumentation.merge(timing)
+            print(output, end="")
+    return [reports[b] for b in buildings]
+
+
+def _summarize(buildings: List[Dict[str, Any]]) -> Dict[str, int]:
+    devices = [d for b in buildings for d in b["devices"]]
+    files = [d["output_file"] for d in devices if d.get("output_file")]
+    normalized = [d["normalize"] for d in devices if "normalize" in d]
+    return {
+        "buildings": len(buildings),
+        "devices": len(devices),
+        "normalized": sum(1 for n in normalized if n["metadata_written"]),
+        "unchanged": sum(1 for n in normalized if not n["metadata_written"]),
+        "added": sum(1 for f in files if f.endswith("_add.yaml")),
+        "updated": sum(1 for f in files if f.endswith("_update.yaml")),
+        "skipped": sum(1 for d in devices if "skipped" in d),
+        "reused": sum(
+            1 for d in devices
+            if d.get("unchanged_since_last_run") or d.get("normalize", {}).get("unchanged_since_last_run")
+        ),
+        "errors": sum(1 for d in devices if "error" in d) + sum(len(b["errors"]) for b in buildings),
+    }
+
+
+def run_headless(policy: PipelinePolicy) -> Dict[str, Any]:
+    """Run every selected building unattended and write the JSON report. Returns the report."""
+    if not policy.site_models_dir or not os.path.isdir(policy.site_models_dir):
+        raise ValueError(f"site_models_dir not found: '{policy.site_models_dir}'")
+
+    available = find_site_models(policy.site_models_dir)
+    if policy.buildings == "all":
+        buildings = available
+    else:
+        missing = [b for b in policy.buildings if b not in available]
+        if missing:
+            raise ValueError(f"Building(s) not found under site_models_dir: {', '.join(missing)}")
+        buildings = list(policy.buildings)
+
+    started = time.time()
+    building_reports = _run_buildings(policy, buildings)
+    report = {
+        "site_models_dir": policy.site_models_dir,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "elapsed_s": round(time.time() - started, 3),
+        "summary": _summarize(building_reports),
+        "buildings": building_reports,
+    }
+
+    report_path = policy.report or os.path.join(
+        os.path.dirname(os.path.normpath(policy.site_models_dir)), WORKING_FOLDER_NAME, "headless_report.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    report["report_path"] = report_path
+
+    s = report["summary"]
+    print(f"\n=== Headless Pipeline Summary ===")
+    print(f"  Buildings: {s['buildings']}  Devices: {s['devices']}")
+    if policy.normalize_points:
+        print(f"  Points normalized: {s['normalized']}  Already normalized: {s['unchanged']}")
+    print(f"  Added: {s['added']}  Updated: {s['updated']}  Skipped: {s['skipped']}  Errors: {s['errors']}")
+    if policy.incremental:
+        print(f"  Unchanged since last run (not reprocessed): {s['reused']}")
+    print(f"  Report: {report_path}")
+    return report
+
+
+def run_portfolio(site_models_dir: Optional[str] = None, workers: int = MAX_PORTFOLIO_WORKERS) -> Optional[Dict[str, Any]]:
+    """Portfolio mode: option 4 normalization for every building under site_models_dir.
+
+    Uses the saved .site_models_dir (or asks for one) and the default
+    non-interactive policy: unmatched points are kept, and metadata.json is only
+    rewritten when its points change.  The per-building results are written to
+    <meter_onboarding>/portfolio_report.json.
+    """
+    if site_models_dir is None:
+        site_models_dir = load_site_models_dir()
+        if not site_models_dir or not os.path.isdir(site_models_dir):
+            raw = input("\nEnter site_models directory (or Enter to cancel): ").strip().strip('"').strip("'")
+            if not raw:
+                return None
+            if not os.path.isdir(raw):
+                print(f"Directory not found: {raw}")
+                return None
+            save_site_models_dir(raw)
+            site_models_dir = raw
+    if not find_site_models(site_models_dir):
+        print(f"No buildings with udmi/devices/ found under {site_models_dir}")
+        return None
+
+    return run_headless(portfolio_policy(PipelinePolicy(site_models_dir=site_models_dir), workers))
+
+
+def portfolio_policy(policy: PipelinePolicy, workers: Optional[int] = None) -> PipelinePolicy:
+    """Turn policy into a portfolio run: normalize only, in parallel, with its own report file."""
+    policy.generate_updates = False
+    policy.workers = max(1, workers if workers is not None else MAX_PORTFOLIO_WORKERS)
+    if not policy.report:
+        policy.report = os.path.join(
+            os.path.dirname(os.path.normpath(policy.site_models_dir)), WORKING_FOLDER_NAME, "portfolio_report.json"
+        )
+    return policy
@@ -0,0 +1 @@
+"""Performance benchmarks for the meter onboard tool (run as python -m benchmarks.<name>)."""
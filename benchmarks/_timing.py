@@ -0,0 +1,13 @@
+"""Timing helpers shared by the benchmark scripts."""
+
+import time
+
+
+def best_of(repeat: int, fn):
+    """Call fn repeat times; return (fastest wall time in seconds, last result)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
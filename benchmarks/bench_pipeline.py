@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark of the per-meter hot paths on synthetic site models.
+
+    python -m benchmarks.bench_pipeline [--scale 2x20x30 ...] [--repeat 3] [--json results.json]
+
+Each --scale is BUILDINGSxMETERSxPOINTS (meters per building, mapped points
+per meter).  For every scale a site model is generated with
+benchmarks.synthetic_site and these stages are timed over all meters:
+
+    process_points                          point renames and unit fixes (option 4)
+    extract_asset_name_from_refs            meter name inference from refs
+    rank_types                              canonical type ranking
+    build_udmi_dict                         translation DataFrame -> UDMI dict
+    run_building_config_updater_from_data   ADD/UPDATE files, one call per building
+
+Timings are the best of --repeat runs.  name_accuracy is the share of meters
+whose inferred name matches the generated one, and derivation_cache holds the
+hit/miss counts of the device-name cache over the extraction runs.  Results are written as JSON
+(with the Python version and date) so runs can be compared over time.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Tuple
+
+import yaml_io
+from benchmarks._timing import best_of
+from benchmarks.synthetic_site import SyntheticSite, generate_site
+from building_config_updater import run_building_config_updater_from_data
+from field_map_utils import get_field_map
+from site_model_editor import (
+    build_translation_rows,
+    build_yaml_asset_name,
+    clear_derivation_cache,
+    derivation_cache_stats,
+    extract_asset_name_from_refs,
+    process_points,
+)
+from translation_builder_udmi import build_udmi_dict, rows_to_dataframe
+from type_matcher import get_type_index, rank_types
+
+DEFAULT_SCALES = ["1x10x20", "4x50x40", "10x100x60"]
+DEFAULT_OUTPUT = "bench_pipeline_results.json"
+
+
+def parse_scale(text: str) -> Tuple[int, int, int]:
+    """Parse "BUILDINGSxMETERSxPOINTS" into three positive ints."""
+    try:
+        buildings, meters, points = (int(part) for part in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scale must look like 2x20x30, got {text!r}")
+    if min(buildings, meters, points) < 1:
+        raise argparse.ArgumentTypeError(f"scale values must be at least 1, got {text!r}")
+    return buildings, meters, points
+
+
+def _load_meters(site: SyntheticSite) -> List[Dict[str, Any]]:
+    meters = []
+    for building in site.buildings:
+        for meter in building.meters:
+            with open(os.path.join(building.devices_dir, meter.folder, "metadata.json"), encoding="utf-8") as f:
+                parsed = json.load(f)
+            meters.append({"building": building, "meter": meter, "points": parsed["pointset"]["points"]})
+    return meters
+
+
+def _stage(seconds: float, calls: int) -> Dict[str, Any]:
+    return {
+        "total_s": round(seconds, 5),
+        "calls": calls,
+        "per_call_us": round(seconds / calls * 1e6, 2) if calls else None,
+    }
+
+
+def run_scale(buildings: int, meters: int, points: int, repeat: int, seed: int = 0) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        site = generate_site(tmp, buildings, meters, points, seed)
+        loaded = _load_meters(site)
+        type_index = get_type_index()
+
+        def _process_all() -> List[Dict[str, Any]]:
+            out = []
+            for m in loaded:
+                fm = get_field_map(m["meter"].meter_type)
+                out.append(process_points(m["points"], fm.ci_raw_to_standard, fm.dbo_units)[0])
+            return out
+
+        def _extract_all() -> List[Any]:
+            return [extract_asset_name_from_refs(m["points"], m["meter"].meter_type) for m in loaded]
+
+        t_process, normalized = best_of(repeat, _process_all)
+        clear_derivation_cache()
+        t_extract, names = best_of(repeat, _extract_all)
+        derivation_cache = derivation_cache_stats()
+
+        # Standard-field points per meter, as option 5 sees them after option 4
+        yaml_points = []
+        for m, pts in zip(loaded, normalized):
+            standard_units = get_field_map(m["meter"].meter_type).standard_units
+            yaml_points.append({k: v for k, v in pts.items() if k in standard_units})
+
+        def _rank_all() -> List[Any]:
+            return [rank_types(set(p), m["meter"].meter_type, type_index) for m, p in zip(loaded, yaml_points)]
+
+        t_rank, ranked = best_of(repeat, _rank_all)
+
+        frames = []
+        for m, pts, candidates in zip(loaded, yaml_points, ranked):
+            meter = m["meter"]
+            type_name = candidates[0].type_name if candidates else ""
+            asset = build_yaml_asset_name(meter.name, meter.meter_type)
+            rows = build_translation_rows(pts, get_field_map(meter.meter_type).standard_units, asset, "METER", type_name)
+            frames.append((rows_to_dataframe(rows), meter))
+
+        def _udmi_all() -> List[Dict[str, Any]]:
+            return [build_udmi_dict(df, num_id=str(meter.num_id), guid=meter.guid) for df, meter in frames]
+
+        t_udmi, udmi_dicts = best_of(repeat, _udmi_all)
+
+        entries: Dict[str, List[Dict[str, Any]]] = {}
+        for (_, meter), m, udmi in zip(frames, loaded, udmi_dicts):
+            building = m["building"]
+            entries.setdefault(building.work_dir, []).append(
+                {"guid": meter.guid, "data": udmi[meter.guid], "site_code": building.site_code}
+            )
+        output_dir = os.path.join(tmp, "output")
+
+        def _update_all() -> None:
+            with contextlib.redirect_stdout(io.StringIO()):
+                for work_dir, meter_entries in entries.items():
+                    run_building_config_updater_from_data(meter_entries, work_dir, output_dir)
+
+        t_update, _ = best_of(repeat, _update_all)
+        written = sorted(os.listdir(output_dir))
+
+    expected = [m["meter"].name for m in loaded]
+    n = len(loaded)
+    return {
+        "scale": {"buildings": buildings, "meters_per_building": meters, "points_per_meter": points},
+        "meters": n,
+        "points": sum(len(m["points"]) for m in loaded),
+        "name_accuracy": round(sum(a == b for a, b in zip(names, expected)) / n, 4),
+        "add_files": sum(1 for f in written if f.endswith("_add.yaml")),
+        "update_files": sum(1 for f in written if f.endswith("_update.yaml")),
+        "derivation_cache": derivation_cache,
+        "stages": {
+            "process_points": _stage(t_process, n),
+            "extract_asset_name_from_refs": _stage(t_extract, n),
+            "rank_types": _stage(t_rank, n),
+            "build_udmi_dict": _stage(t_udmi, n),
+            "run_building_config_updater_from_data": _stage(t_update, len(entries)),
+        },
+    }
+
+
+def run(scales: List[Tuple[int, int, int]], repeat: int, log: Callable[[str], None] = print) -> Dict[str, Any]:
+    results = []
+    for buildings, meters, points in scales:
+        start = time.perf_counter()
+        result = run_scale(buildings, meters, points, repeat)
+        log(f"\n{buildings}x{meters}x{points}: {result['meters']} meter(s), {result['points']} point(s) "
+            f"({time.perf_counter() - start:.1f}s)")
+        for stage, timing in result["stages"].items():
+            log(f"  {stage:<40} {timing['total_s']:>9.4f}s  {timing['per_call_us']:>10.1f} us/call")
+        results.append(result)
+    return {
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "libyaml": yaml_io.HAS_LIBYAML,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=parse_scale, action="append",
+                        help=f"BUILDINGSxMETERSxPOINTS, repeatable (default {' '.join(DEFAULT_SCALES)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", default=DEFAULT_OUTPUT, help=f"results file (default {DEFAULT_OUTPUT})")
+    args = parser.parse_args(argv)
+
+    report = run(args.scale or [parse_scale(s) for s in DEFAULT_SCALES], args.repeat)
+    with open(args.json, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"\nResults written to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Benchmark yaml_io against plain PyYAML on a synthetic building config.
+
+    python -m benchmarks.bench_yaml_io [--entities 50000] [--repeat 3] [--json out.json]
+
+Times parsing the full building config and emitting ADD/UPDATE section files,
+and checks that yaml_io produces the same objects and byte-identical text.
+"""
+
+import argparse
+import json
+import random
+import sys
+import uuid
+
+import yaml
+
+import yaml_io
+from benchmarks._timing import best_of
+
+_ENTITY_TYPES = ["METERS/EM_PWM_AVCM", "HVAC/VAV_SD_DSP", "HVAC/AHU_DX", "LIGHTING/LC_BASIC", "FACILITIES/FLOOR"]
+_FIELDS = [
+    "active_power_sensor", "energy_accumulator", "current_sensor", "voltage_sensor",
+    "power_factor_sensor", "reactive_power_sensor", "frequency_sensor",
+]
+
+
+def synthetic_building_config(entities: int, seed: int = 0) -> dict:
+    """Return a building config dict with one building and `entities` child entities."""
+    rng = random.Random(seed)
+    building_guid = str(uuid.UUID(int=rng.getrandbits(128)))
+    config = {
+        "CONFIG_METADATA": {"operation": "INITIALIZE"},
+        building_guid: {"code": "US-SYN-0001", "etag": "1", "type": "FACILITIES/BUILDING"},
+    }
+    for i in range(entities):
+        entity_type = rng.choice(_ENTITY_TYPES)
+        entity = {
+            "cloud_device_id": str(2_000_000_000_000_000 + i),
+            "code": f"{entity_type.split('/')[1].split('_')[0].lower()}-{i:06d}",
+            "etag": str(rng.randint(1, 10 ** 6)),
+            "type": entity_type,
+        }
+        if entity_type.startswith("METERS/"):
+            entity["translation"] = {
+                f: {
+                    "present_value": f"points.{f}.present_value",
+                    "units": {"key": f"pointset.points.{f}.unit", "values": {"kilowatts": "kW"}},
+                }
+                for f in rng.sample(_FIELDS, 4)
+            }
+            entity["connections"] = {building_guid: "CONTAINS"}
+        config[str(uuid.UUID(int=rng.getrandbits(128)))] = entity
+    return config
+
+
+def run(entities: int, repeat: int) -> dict:
+    config = synthetic_building_config(entities)
+    text = yaml.dump(config, sort_keys=False, default_flow_style=False)
+    guids = list(config)[2:]
+    updates = [
+        {"CONFIG_METADATA": {"operation": "UPDATE"}, guids[0]: config[guids[0]], g: config[g]}
+        for g in guids[:1000]
+    ]
+
+    def pyyaml_sections():
+        return ["\n".join(yaml.dump({k: v}, sort_keys=False, default_flow_style=False) for k, v in doc.items())
+                for doc in updates]
+
+    load_py, parsed_py = best_of(repeat, lambda: yaml.safe_load(text))
+    load_io, parsed_io = best_of(repeat, lambda: yaml_io.load(text))
+    dump_py, out_py = best_of(repeat, pyyaml_sections)
+    dump_io, out_io = best_of(repeat, lambda: [yaml_io.dump_sections(doc) for doc in updates])
+
+    return {
+        "entities": entities,
+        "config_bytes": len(text.encode("utf-8")),
+        "libyaml": yaml_io.HAS_LIBYAML,
+        "load_pyyaml_s": round(load_py, 4),
+        "load_yaml_io_s": round(load_io, 4),
+        "load_speedup": round(load_py / load_io, 2),
+        "dump_files": len(updates),
+        "dump_pyyaml_s": round(dump_py, 4),
+        "dump_yaml_io_s": round(dump_io, 4),
+        "dump_speedup": round(dump_py / dump_io, 2),
+        "parsed_equal": parsed_py == parsed_io,
+        "output_identical": out_py == out_io,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.entities, args.repeat)
+    for key, value in results.items():
+        print(f"  {key:<18} {value}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=2)
+    return 0 if results["parsed_equal"] and results["output_identical"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
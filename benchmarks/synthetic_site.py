@@ -0,0 +1,226 @@
+"""
+Generate synthetic site models for benchmarks and scale tests.
+
+    python -m benchmarks.synthetic_site OUT_DIR [--buildings 2] [--meters 20] [--points 30] [--seed 0]
+
+Writes the same layout the tool works on:
+
+    OUT_DIR/site_models/<site>/udmi/devices/<EM|PVI|WM>-<n>/metadata.json
+    OUT_DIR/meter_onboarding/<site>/<site>_full_building_config.yaml
+    OUT_DIR/meter_onboarding/<site>/device_discovery.json
+
+Point refs use the shapes seen in real BACnet exports: DP_CommN_<meter>_<raw>,
+DP_CommN_DataNab_<meter>_<raw> (gateway segment), DP_<meter>_<meter>_<raw>
+(doubled name) and DP_CommN_<meter>_<raw>_01 (numbered sub-points).  Half of
+the meters already exist in the building config (UPDATE), the rest are new
+(ADD).  Raw point names come from mappings/standard_field_map.yaml.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+import yaml_io
+from field_map_utils import _load_field_map_yaml
+from site_model_editor import build_yaml_asset_name
+
+_METER_BASES = ["MAIN_Meter", "PV_Meter", "SUB_Meter", "IDF1_2Raw", "CHW_Plant", "Kitchen_Panel"]
+_REF_SHAPES = [("comm", 0.6), ("gateway", 0.15), ("doubled", 0.15), ("indexed", 0.1)]
+# (folder prefix, meter type, share of meters)
+_FOLDER_PREFIXES = [("EM", "EM", 0.6), ("PVI", "EM", 0.3), ("WM", "WM", 0.1)]
+
+
+@dataclass
+class SyntheticMeter:
+    folder: str
+    meter_type: str
+    name: str        # raw device name embedded in every ref
+    guid: str
+    num_id: int
+    shape: str
+    in_building_config: bool
+
+
+@dataclass
+class SyntheticBuilding:
+    site_code: str
+    devices_dir: str
+    work_dir: str
+    config_path: str
+    meters: List[SyntheticMeter] = field(default_factory=list)
+
+
+@dataclass
+class SyntheticSite:
+    root: str
+    site_models_dir: str
+    onboarding_dir: str
+    buildings: List[SyntheticBuilding] = field(default_factory=list)
+
+    @property
+    def meter_count(self) -> int:
+        return sum(len(b.meters) for b in self.buildings)
+
+
+def _raw_names(meter_type: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """Return ([(raw_name, standard_unit)], [ignored raw names]) for meter_type."""
+    fields = _load_field_map_yaml()[meter_type] or {}
+    raw, ignored = [], []
+    for standard_field, data in fields.items():
+        names = (data or {}).get("names") or []
+        if standard_field == "IGNORE":
+            ignored.extend(n for n in names if not n[-1].isdigit())
+        else:
+            raw.extend((n, (data or {}).get("standard_unit") or "") for n in names)
+    return raw, ignored
+
+
+def _pick(rng: random.Random, weighted: List[tuple]) -> tuple:
+    roll, total = rng.random(), 0.0
+    for item in weighted:
+        total += item[-1]
+        if roll < total:
+            return item
+    return weighted[-1]
+
+
+def _ref(shape: str, comm: int, name: str, raw: str) -> str:
+    if shape == "gateway":
+        return f"DP_Comm{comm}_DataNab_{name}_{raw}"
+    if shape == "doubled":
+        return f"DP_{name}_{name}_{raw}"
+    if shape == "indexed":
+        return f"DP_Comm{comm}_{name}_{raw}_01"
+    return f"DP_Comm{comm}_{name}_{raw}"
+
+
+def _metadata(meter: SyntheticMeter, site_code: str, points: Dict[str, Any]) -> Dict[str, Any]:
+    gateway = f"CGW-{meter.num_id % 7 + 1}"
+    return {
+        "timestamp": "2026-01-01T00:00:00Z",
+        "version": "1.5.3",
+        "cloud": {"resource_type": "PROXIED", "num_id": meter.num_id},
+        "system": {
+            "location": {"site": site_code},
+            "name": meter.name,
+            "physical_tag": {
+                "asset": {"guid": f"uuid://{meter.guid}", "site": site_code, "name": meter.folder}
+            },
+        },
+        "gateway": {"gateway_id": gateway, "target": {"family": "vendor"}},
+        "localnet": {"families": {"iot": {"addr": meter.folder}}, "parent": {"target": gateway, "family": "bacnet"}},
+        "pointset": {"points": points},
+    }
+
+
+def _points(rng: random.Random, meter: SyntheticMeter, count: int, catalog) -> Dict[str, Any]:
+    raw, ignored = catalog[meter.meter_type]
+    comm = rng.randint(1, 4)
+    chosen = rng.sample(raw, min(count, len(raw)))
+    points: Dict[str, Any] = {}
+    for raw_name, unit in chosen:
+        points[raw_name.lower()] = {"units": unit, "writable": False, "ref": _ref(meter.shape, comm, meter.name, raw_name)}
+    for raw_name in ignored[:2]:
+        points[raw_name] = {"units": "", "writable": False, "ref": f"DP_Comm{comm}_{meter.name}_{raw_name}"}
+    # Large meters repeat channels as numbered sub-points (kW_01, kW_02, ...)
+    extra = 0
+    while len(points) < count + 2:
+        extra += 1
+        raw_name, unit = chosen[extra % len(chosen)]
+        key = f"{raw_name.lower()}_{extra:02d}"
+        points[key] = {"units": unit, "writable": False, "ref": f"DP_Comm{comm}_{meter.name}_{raw_name}_{extra:02d}"}
+    return points
+
+
+def _building_config(rng: random.Random, building: SyntheticBuilding) -> Dict[str, Any]:
+    building_guid = str(uuid.UUID(int=rng.getrandbits(128)))
+    config: Dict[str, Any] = {
+        "CONFIG_METADATA": {"operation": "EXPORT"},
+        building_guid: {"code": building.site_code, "etag": f"{rng.getrandbits(32):08x}", "type": "FACILITIES/BUILDING"},
+    }
+    for meter in building.meters:
+        if not meter.in_building_config:
+            continue
+        config[meter.guid] = {
+            "cloud_device_id": str(meter.num_id),
+            "code": build_yaml_asset_name(meter.name, meter.meter_type),
+            "connections": {building_guid: ["CONTAINS"]},
+            "etag": f"{rng.getrandbits(32):08x}",
+            "type": "METERS/EM_PWM" if meter.meter_type == "EM" else "METERS/WM",
+        }
+    return config
+
+
+def _discovery(rng: random.Random, building: SyntheticBuilding) -> List[List[Any]]:
+    rows: List[List[Any]] = [["device_registry_id", "device_id", "device_num_id", "last_event_time"]]
+    for meter in building.meters:
+        # An older registration first, as seen after device replacements
+        if rng.random() < 0.2:
+            rows.append([building.site_code, meter.folder, str(meter.num_id + 1), "2025-01-01T00:00:00Z"])
+        rows.append([building.site_code, meter.folder, str(meter.num_id), "2026-01-01T00:00:00Z"])
+    return rows
+
+
+def generate_site(root: str, buildings: int = 2, meters: int = 20, points: int = 30, seed: int = 0) -> SyntheticSite:
+    """Write a synthetic site model tree under root and describe what was written."""
+    rng = random.Random(seed)
+    catalog = {meter_type: _raw_names(meter_type) for meter_type in ("EM", "WM")}
+    site = SyntheticSite(root, os.path.join(root, "site_models"), os.path.join(root, "meter_onboarding"))
+
+    for b in range(buildings):
+        site_code = f"US-SYN-{b + 1:04d}"
+        work_dir = os.path.join(site.onboarding_dir, site_code)
+        building = SyntheticBuilding(
+            site_code,
+            os.path.join(site.site_models_dir, site_code, "udmi", "devices"),
+            work_dir,
+            os.path.join(work_dir, f"{site_code}_full_building_config.yaml"),
+        )
+        counters: Dict[str, int] = {}
+        for m in range(meters):
+            prefix, meter_type, _ = _pick(rng, _FOLDER_PREFIXES)
+            counters[prefix] = counters.get(prefix, 0) + 1
+            meter = SyntheticMeter(
+                folder=f"{prefix}-{counters[prefix]}",
+                meter_type=meter_type,
+                name=f"{rng.choice(_METER_BASES)}{m:03d}",
+                guid=str(uuid.UUID(int=rng.getrandbits(128))),
+                num_id=rng.randint(10 ** 14, 10 ** 16),
+                shape=_pick(rng, _REF_SHAPES)[0],
+                in_building_config=m % 2 == 0,
+            )
+            building.meters.append(meter)
+            device_dir = os.path.join(building.devices_dir, meter.folder)
+            os.makedirs(device_dir, exist_ok=True)
+            with open(os.path.join(device_dir, "metadata.json"), "w", encoding="utf-8") as f:
+                json.dump(_metadata(meter, site_code, _points(rng, meter, points, catalog)), f, indent=2)
+
+        os.makedirs(work_dir, exist_ok=True)
+        yaml_io.write_sections(building.config_path, _building_config(rng, building))
+        with open(os.path.join(work_dir, "device_discovery.json"), "w", encoding="utf-8") as f:
+            json.dump(_discovery(rng, building), f, indent=2)
+        site.buildings.append(building)
+    return site
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out_dir")
+    parser.add_argument("--buildings", type=int, default=2)
+    parser.add_argument("--meters", type=int, default=20, help="meters per building")
+    parser.add_argument("--points", type=int, default=30, help="mapped points per meter")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    site = generate_site(args.out_dir, args.buildings, args.meters, args.points, args.seed)
+    print(f"Wrote {len(site.buildings)} building(s), {site.meter_count} meter(s) under {site.root}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
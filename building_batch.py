@@ -1,14 +1,13 @@
 import json
 import os
 import shutil
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from typing import Dict, Any, List, Optional
 
-import yaml
-
-import pandas as pd
-
-from field_map_utils import _load_field_map_yaml, load_field_dbo_units, load_field_standard_units
+from field_map_utils import _load_field_map_yaml, get_field_map, load_field_dbo_units, load_field_standard_units
 from site_model_editor import (
     load_site_model,
     validate_site_model,
@@ -19,17 +18,27 @@ from site_model_editor import (
     extract_asset_name_from_refs,
     build_yaml_asset_name,
     add_missing_points,
-    build_translation_dataframe,
+    build_translation_rows,
 )
 from field_map_utils import resolve_unmatched
 from export_building_config import export_building_config
+from building_config_updater import BuildingConfigIndex
 from type_matcher import run_type_matcher, get_type_name, get_type_fields
-from translation_builder_udmi import build_udmi_dict
+from translation_builder_udmi import build_udmi_dict_from_rows, missing_translation_rows
+from discovery_json import DISCOVERY_HEADERS, scan_discovery
+from onboard_state import BuildingState, step_inputs
+import instrumentation
+from json_io import write_json_if_changed
+import yaml_io
 
 
 METER_PREFIXES = ("EM-", "GM-", "WM-", "PVI-", "EMV-")
 WORKING_FOLDER_NAME = "meter_onboarding"
 
+# Upper bound on metadata.json files read concurrently when listing a building.
+# Reads are I/O bound, so this mainly hides per-file latency on network shares.
+MAX_SCAN_WORKERS = 8
+
 _PREFIX_TO_METER_TYPE: Dict[str, str] = {
     "EM": "EM",
     "EMV": "EM",
@@ -80,32 +89,12 @@ def _load_discovery_lookup(work_dir: str) -> Dict[str, int]:
 
     When multiple rows share the same device_id, the row with the most recent
     last_event_time is used. Null timestamps (None or the string "null") rank lowest.
+    The file is streamed once and the result cached (see discovery_json).
     """
-    path = os.path.join(work_dir, "device_discovery.json")
-    try:
-        with open(path, encoding="utf-8") as f:
-            data = json.load(f)
-        headers = data[0]
-        id_idx = headers.index("device_id")
-        num_id_idx = headers.index("device_num_id")
-        time_idx = headers.index("last_event_time")
-
-        best: Dict[str, tuple] = {}  # device_id -> (row, normalized_time_str)
-        for row in data[1:]:
-            if len(row) <= num_id_idx or row[num_id_idx] is None:
-                continue
-            device_id = row[id_idx]
-            t = row[time_idx] if len(row) > time_idx else None
-            if t is None or t == "null":
-                t = ""
-            if device_id not in best or t > best[device_id][1]:
-                best[device_id] = (row, t)
-
-        return {did: int(entry[0][num_id_idx]) for did, entry in best.items()}
-    except Exception:
-        return {}
+    return scan_discovery(os.path.join(work_dir, "device_discovery.json")).lookup
 
 
+@instrumentation.timed("load_building_config")
 def _load_building_config(work_dir: str) -> Dict[str, Any]:
     """Load building config from work_dir. Prefers *_local.yaml variant over exported file."""
     try:
@@ -113,16 +102,14 @@ def _load_building_config(work_dir: str) -> Dict[str, Any]:
         # Pass 1: prefer _local variant (for offline/debug use)
         for f in files:
             if f.endswith("_full_building_config_local.yaml"):
-                with open(os.path.join(work_dir, f), encoding="utf-8") as fh:
-                    data = yaml.safe_load(fh)
+                data = yaml_io.load_file_cached(os.path.join(work_dir, f))
                 if isinstance(data, dict):
                     print(f"  Using local building config: {f}")
                     return data
         # Pass 2: regular exported file
         for f in files:
             if f.endswith("_full_building_config.yaml"):
-                with open(os.path.join(work_dir, f), encoding="utf-8") as fh:
-                    data = yaml.safe_load(fh)
+                data = yaml_io.load_file_cached(os.path.join(work_dir, f))
                 if isinstance(data, dict):
                     return data
     except Exception:
@@ -230,31 +217,13 @@ def _extract_building_code(devices_dir: str) -> Optional[str]:
     return None
 
 
-_DISCOVERY_HEADERS = ["device_registry_id", "device_id", "device_num_id", "last_event_time"]
+_DISCOVERY_HEADERS = DISCOVERY_HEADERS
 
 
 def _validate_discovery_json(path: str) -> tuple[bool, str]:
     """Return (valid, error_message). Valid if parseable JSON array-of-arrays with correct headers."""
-    try:
-        with open(path, encoding="utf-8") as f:
-            data = json.load(f)
-    except json.JSONDecodeError as e:
-        return False, f"Invalid JSON: {e}"
-    except Exception as e:
-        return False, f"Could not read file: {e}"
-
-    if not isinstance(data, list) or len(data) < 2:
-        return False, "Expected a JSON array with at least 2 rows (header + data)."
-
-    headers = data[0]
-    if not isinstance(headers, list):
-        return False, "First row must be an array of column headers."
-
-    missing = [h for h in _DISCOVERY_HEADERS if h not in headers]
-    if missing:
-        return False, f"Missing required headers: {missing}"
-
-    return True, ""
+    scan = scan_discovery(path)
+    return scan.valid, scan.error
 
 
 def _prompt_discovery_json(work_dir: str) -> None:
@@ -301,37 +270,119 @@ def find_device_folders(devices_dir: str) -> List[str]:
     ])
 
 
-def _preview_device_name(devices_dir: str, folder: str) -> str:
-    """Return the pre-parsed DBO asset name for display, or an error indicator."""
+_UNSET = object()  # DeviceSnapshot: raw name not computed yet
+
+
+@dataclass
+class DeviceSnapshot:
+    """Parsed metadata.json for one device folder.
+
+    Read once per device and shared by the status columns in select_devices and
+    the per-device processing loops, so each file is opened a single time.
+    parsed is None when the file is missing or unreadable (see load_error).
+    """
+    folder: str
+    meta_path: str
+    parsed: Optional[Dict[str, Any]] = None
+    load_error: Optional[Exception] = None
+    meter_type: Optional[str] = None
+    _raw_name: Any = field(default=_UNSET, init=False, repr=False)
+
+    @property
+    def points(self) -> Dict[str, Any]:
+        return (self.parsed or {}).get("pointset", {}).get("points") or {}
+
+    @property
+    def num_id(self) -> Any:
+        return (self.parsed or {}).get("cloud", {}).get("num_id")
+
+    @property
+    def guid(self) -> Optional[str]:
+        return (self.parsed or {}).get("system", {}).get("physical_tag", {}).get("asset", {}).get("guid")
+
+    @property
+    def site_code(self) -> str:
+        return (self.parsed or {}).get("system", {}).get("location", {}).get("site", "")
+
+    @property
+    def raw_name(self) -> Optional[str]:
+        """Meter name extracted from point refs (computed on first access)."""
+        if self._raw_name is _UNSET:
+            self._raw_name = (
+                extract_asset_name_from_refs(self.points, self.meter_type) if self.meter_type else None
+            )
+        return self._raw_name
+
+    @property
+    def dbo_name(self) -> str:
+        raw_name = self.raw_name
+        return build_yaml_asset_name(raw_name, self.meter_type) if raw_name else ""
+
+
+def load_device_snapshot(devices_dir: str, folder: str) -> DeviceSnapshot:
+    """Read <devices_dir>/<folder>/metadata.json into a DeviceSnapshot (never raises)."""
+    meta_path = os.path.join(devices_dir, folder, "metadata.json")
+    snapshot = DeviceSnapshot(folder=folder, meta_path=meta_path, meter_type=_infer_meter_type(folder))
     try:
-        meter_type = _infer_meter_type(folder)
-        if not meter_type:
-            return "(unknown meter type)"
-        meta_path = os.path.join(devices_dir, folder, "metadata.json")
         parsed = load_site_model(meta_path)
-        points = parsed.get("pointset", {}).get("points") or {}
-        if not points:
+        if not isinstance(parsed, dict):
+            raise ValueError("metadata.json is not a JSON object")
+        snapshot.parsed = parsed
+    except Exception as e:
+        snapshot.load_error = e
+    return snapshot
+
+
+@instrumentation.timed("load_device_snapshots")
+def load_device_snapshots(
+    devices_dir: str,
+    folders: List[str],
+    max_workers: int = MAX_SCAN_WORKERS,
+    log=None,
+) -> Dict[str, DeviceSnapshot]:
+    """Return {folder: DeviceSnapshot} for every folder, in folder order.
+
+    Up to max_workers metadata.json files are read and parsed concurrently.
+    log, if given, receives a one-line summary of how long the scan took.
+    """
+    start = time.perf_counter()
+    workers = max(1, min(max_workers, len(folders)))
+    if workers == 1:
+        loaded = [load_device_snapshot(devices_dir, f) for f in folders]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            loaded = list(pool.map(lambda f: load_device_snapshot(devices_dir, f), folders))
+    if log is not None:
+        log(f"Scanned {len(folders)} metadata.json file(s) in {time.perf_counter() - start:.2f}s "
+            f"({workers} worker(s)).")
+    return {snapshot.folder: snapshot for snapshot in loaded}
+
+
+def _preview_device_name(snapshot: DeviceSnapshot) -> str:
+    """Return the pre-parsed DBO asset name for display, or an error indicator."""
+    if not snapshot.meter_type:
+        return "(unknown meter type)"
+    if snapshot.parsed is None:
+        return "(name unknown)"
+    try:
+        if not snapshot.points:
             return "(no points)"
-        raw_name = extract_asset_name_from_refs(points, meter_type)
-        if not raw_name:
-            return "(name unknown)"
-        return build_yaml_asset_name(raw_name, meter_type)
+        return snapshot.dbo_name or "(name unknown)"
     except Exception:
         return "(name unknown)"
 
 
-def _get_num_id_status(devices_dir: str, folder: str, discovery: Dict[str, int]) -> str:
+def _get_num_id_status(snapshot: DeviceSnapshot, discovery: Dict[str, int]) -> str:
     """Return a bracketed discovery status string, or '' if discovery is empty."""
     if not discovery:
         return ""
-    if folder not in discovery:
+    if snapshot.folder not in discovery:
         return "[not in discovery]"
-    disc_num = discovery[folder]
+    disc_num = discovery[snapshot.folder]
+    if snapshot.parsed is None:
+        return "[?]"
     try:
-        meta_path = os.path.join(devices_dir, folder, "metadata.json")
-        with open(meta_path, encoding="utf-8") as f:
-            meta = json.load(f)
-        meta_num = meta.get("cloud", {}).get("num_id")
+        meta_num = snapshot.num_id
         if meta_num is None:
             return f"[ADD {disc_num} to SM]"
         if int(meta_num) != disc_num:
@@ -342,29 +393,19 @@ def _get_num_id_status(devices_dir: str, folder: str, discovery: Dict[str, int])
 
 
 def _get_guid_status(
-    devices_dir: str,
-    folder: str,
+    snapshot: DeviceSnapshot,
     dbo_name: str,
     discovery: Dict[str, int],
-    building_config: Dict[str, Any],
+    building_config: "BuildingConfigIndex | Dict[str, Any]",
 ) -> str:
     """Return a bracketed GUID status string, or '' if preconditions aren't met."""
-    if not discovery or folder not in discovery or not building_config or not dbo_name:
+    if not discovery or snapshot.folder not in discovery or not building_config or not dbo_name:
         return ""
-    bc_guid = None
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("code") == dbo_name:
-            bc_guid = key
-            break
+    bc_guid = BuildingConfigIndex.of(building_config).guid_for_code(dbo_name)
+    if snapshot.parsed is None:
+        return "[?]"
     try:
-        meta_path = os.path.join(devices_dir, folder, "metadata.json")
-        with open(meta_path, encoding="utf-8") as f:
-            meta = json.load(f)
-        meta_guid = (
-            meta.get("system", {}).get("physical_tag", {}).get("asset", {}).get("guid")
-        )
+        meta_guid = snapshot.guid
     except Exception:
         return "[?]"
     if bc_guid is None:
@@ -375,29 +416,28 @@ def _get_guid_status(
     return "[GUID BC\u2192SM]"
 
 
-def _get_points_status(devices_dir: str, folder: str) -> str:
+def _get_points_status(snapshot: DeviceSnapshot) -> str:
     """Return [GOOD], [FAIL], or '' based on whether Option 4 has been run.
 
     [GOOD] if every point key is either a DBO standard field name or an IGNORE entry in
     the field map (ignored points keep their raw names in the file after Option 4).
     [FAIL] if any point key is unrecognized — Option 4 still needs to run.
     """
-    meter_type = _infer_meter_type(folder)
+    meter_type = snapshot.meter_type
     if not meter_type:
         return ""
+    if snapshot.parsed is None:
+        return "[?]"
     try:
-        meta_path = os.path.join(devices_dir, folder, "metadata.json")
-        with open(meta_path, encoding="utf-8") as f:
-            meta = json.load(f)
-        points = meta.get("pointset", {}).get("points") or {}
+        points = snapshot.points
         if not points:
             return ""
-        field_standard_units = load_field_standard_units(meter_type)
+        field_standard_units = get_field_map(meter_type).standard_units
         non_dbo = [k for k in points if k not in field_standard_units]
         if not non_dbo:
             return "[GOOD]"
         # Non-DBO points are acceptable if they are IGNORE entries in the field map
-        ci_field_map = build_case_insensitive_field_map(meter_type)
+        ci_field_map = get_field_map(meter_type).ci_raw_to_standard
         truly_unmatched = [k for k in non_dbo if ci_field_map.get(k.lower()) != "IGNORE"]
         return "[GOOD]" if not truly_unmatched else "[FAIL]"
     except Exception:
@@ -419,17 +459,34 @@ def _get_export_status(num_status: str, guid_status: str, points_status: str) ->
     return "[BLOCKED]"
 
 
+def _apply_num_id_from_discovery(parsed: Dict[str, Any], disc_num: int) -> None:
+    """Set cloud.num_id from discovery in parsed if it is missing; warn on mismatch.
+
+    Only parsed is changed; save it with save_device_metadata.
+    """
+    cloud = parsed.setdefault("cloud", {})
+    meta_num = cloud.get("num_id")
+    if meta_num is None:
+        cloud["num_id"] = disc_num
+        print(f"  Added cloud.num_id = {disc_num}")
+    elif int(meta_num) != disc_num:
+        print(
+            f"  WARNING: cloud.num_id mismatch — "
+            f"metadata={meta_num}, discovery={disc_num}. Not auto-corrected."
+        )
+
+
 def _apply_guid_from_building_config(
-    file_path: str, folder: str, dbo_name: str, parsed: Dict[str, Any], building_config: Dict[str, Any]
+    folder: str,
+    dbo_name: str,
+    parsed: Dict[str, Any],
+    building_config: "BuildingConfigIndex | Dict[str, Any]",
 ) -> None:
-    """Reconcile system.physical_tag.asset.guid in metadata.json against building config."""
-    bc_guid = None
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("code") == dbo_name:
-            bc_guid = key
-            break
+    """Reconcile system.physical_tag.asset.guid in parsed against building config.
+
+    Only parsed is changed; save it with save_device_metadata.
+    """
+    bc_guid = BuildingConfigIndex.of(building_config).guid_for_code(dbo_name)
 
     meta_guid = (
         parsed.get("system", {})
@@ -439,10 +496,6 @@ def _apply_guid_from_building_config(
     )
     meta_guid_bare = meta_guid.replace("uuid://", "") if meta_guid else None
 
-    def _write_parsed() -> None:
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(parsed, f, indent=2)
-
     def _set_guid(g: str) -> None:
         parsed.setdefault("system", {}).setdefault("physical_tag", {}).setdefault("asset", {})["guid"] = g
 
@@ -452,46 +505,82 @@ def _apply_guid_from_building_config(
         else:
             guid_to_write = f"uuid://{bc_guid}"
             _set_guid(guid_to_write)
-            try:
-                _write_parsed()
-                action = "updated" if meta_guid else "added"
-                print(f"  GUID {action} from building config: {guid_to_write}")
-                if meta_guid:
-                    print(f"    (was: {meta_guid})")
-            except Exception as e:
-                print(f"  Could not write GUID: {e}")
+            action = "updated" if meta_guid else "added"
+            print(f"  GUID {action} from building config: {guid_to_write}")
+            if meta_guid:
+                print(f"    (was: {meta_guid})")
     else:
         if meta_guid:
             print(f"  Not in building config \u2014 keeping existing GUID: {meta_guid}")
         else:
             new_guid = f"uuid://{uuid.uuid4()}"
             _set_guid(new_guid)
-            try:
-                _write_parsed()
-                print(f"  Not in building config \u2014 generated new GUID: {new_guid}")
-            except Exception as e:
-                print(f"  Could not write new GUID: {e}")
+            print(f"  Not in building config \u2014 generated new GUID: {new_guid}")
+
+
+def _normalize_context(
+    folder: str,
+    dbo_name: str,
+    discovery: Dict[str, int],
+    building_config: "BuildingConfigIndex | Dict[str, Any]",
+    mode: str,
+) -> Dict[str, Any]:
+    """Everything besides metadata.json and the mappings that option 4 reads for a device."""
+    bc_index = BuildingConfigIndex.of(building_config)
+    return {
+        "num_id": discovery.get(folder),
+        "bc_guid": bc_index.guid_for_code(dbo_name) if bc_index else None,
+        "mode": mode,
+    }
+
+
+def _export_context(
+    folder: str,
+    dbo_name: str,
+    discovery: Dict[str, int],
+    building_config: "BuildingConfigIndex | Dict[str, Any]",
+    mode: Any,
+) -> Dict[str, Any]:
+    """Everything besides metadata.json and the mappings that option 5 reads for a device."""
+    bc_index = BuildingConfigIndex.of(building_config)
+    return {
+        "num_id": discovery.get(folder),
+        "dbo_name": dbo_name,
+        "building": bc_index.building,
+        "meter": bc_index.entity_by_code(dbo_name),
+        "mode": mode,
+    }
+
+
+def _confirm_redo(indent: str = "") -> bool:
+    """Ask whether to reprocess a device the state manifest says is unchanged (default: no)."""
+    return input(f"{indent}Redo it anyway? (y/N): ").strip().lower() == "y"
 
 
 def select_devices(
     folders: List[str],
     devices_dir: str,
     discovery: Optional[Dict[str, int]] = None,
-    building_config: Optional[Dict[str, Any]] = None,
+    building_config: "BuildingConfigIndex | Dict[str, Any] | None" = None,
     points_statuses: Optional[List[str]] = None,
     export_statuses: Optional[List[str]] = None,
+    snapshots: Optional[Dict[str, DeviceSnapshot]] = None,
 ) -> List[str]:
-    labels = [_preview_device_name(devices_dir, f) for f in folders]
-    num_statuses = [_get_num_id_status(devices_dir, f, discovery or {}) for f in folders]
-    guid_statuses = [
-        _get_guid_status(
-            devices_dir, f,
-            label if not label.startswith("(") else "",
-            discovery or {},
-            building_config or {},
-        )
-        for f, label in zip(folders, labels)
-    ]
+    if snapshots is None:
+        snapshots = load_device_snapshots(devices_dir, folders, log=print)
+    with instrumentation.span("select_devices.status"):
+        bc_index = BuildingConfigIndex.of(building_config)
+        labels = [_preview_device_name(snapshots[f]) for f in folders]
+        num_statuses = [_get_num_id_status(snapshots[f], discovery or {}) for f in folders]
+        guid_statuses = [
+            _get_guid_status(
+                snapshots[f],
+                label if not label.startswith("(") else "",
+                discovery or {},
+                bc_index,
+            )
+            for f, label in zip(folders, labels)
+        ]
 
     has_num = any(num_statuses)
     has_guid = any(guid_statuses)
@@ -553,24 +642,31 @@ def select_devices(
         print(f"Invalid input. Enter numbers between 1 and {len(folders)}, or 'all'.")
 
 
-def overwrite_json(file_path: str, parsed: Dict[str, Any], updated_points: Dict[str, Any]) -> None:
-    parsed["pointset"]["points"] = updated_points
-    json_string = json.dumps(parsed, indent=2)
+def save_device_metadata(file_path: str, parsed: Dict[str, Any]) -> bool:
+    """Write all pending changes to a device's metadata.json in one go. Returns True if written."""
     try:
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(json_string)
-        print(f"Overwritten: {file_path}")
+        written = write_json_if_changed(file_path, parsed)
     except PermissionError:
         print(f"Permission denied: Cannot write to {file_path}")
+        return False
     except Exception as e:
         print(f"Failed to overwrite file: {e}")
+        return False
+    print(f"Overwritten: {file_path}" if written else f"Unchanged: {file_path}")
+    return written
+
+
+def overwrite_json(file_path: str, parsed: Dict[str, Any], updated_points: Dict[str, Any]) -> bool:
+    parsed["pointset"]["points"] = updated_points
+    return save_device_metadata(file_path, parsed)
 
 
 def run_building_batch() -> None:
     # 1. Get building directory via site_models selection or direct path
     building_dir: Optional[str] = None
     discovery: Dict[str, int] = {}
-    building_config: Dict[str, Any] = {}
+    building_config = BuildingConfigIndex({})
+    state: Optional[BuildingState] = None
 
     saved_dir = load_site_models_dir()
     if saved_dir and os.path.isdir(saved_dir):
@@ -618,7 +714,8 @@ def run_building_batch() -> None:
         # Ensure discovery JSON is populated
         _prompt_discovery_json(work_dir)
         discovery = _load_discovery_lookup(work_dir)
-        building_config = _load_building_config(work_dir)
+        building_config = BuildingConfigIndex(_load_building_config(work_dir))
+        state = BuildingState.load(work_dir)
 
     # Validate field map YAML before doing any work
     try:
@@ -641,107 +738,106 @@ def run_building_batch() -> None:
         print("No device folders found.")
         return
 
-    selected = select_devices(folders, devices_dir, discovery, building_config)
+    snapshots = load_device_snapshots(devices_dir, folders, log=print)
+    selected = select_devices(folders, devices_dir, discovery, building_config, snapshots=snapshots)
 
     # Process each device end-to-end before moving to the next
     for folder in selected:
-        file_path = os.path.join(devices_dir, folder, "metadata.json")
+        snapshot = snapshots[folder]
+        file_path = snapshot.meta_path
         print(f"\n--- Processing: {folder} ---")
 
-        if not os.path.isfile(file_path):
+        if isinstance(snapshot.load_error, FileNotFoundError):
             print(f"metadata.json not found in {folder}, skipping.")
             continue
 
-        try:
-            parsed = load_site_model(file_path)
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}, skipping.")
+        if snapshot.parsed is None:
+            print(f"Error reading {file_path}: {snapshot.load_error}, skipping.")
             continue
+        parsed = snapshot.parsed
 
         if not validate_site_model(parsed):
             print(f"Skipping {folder}.")
             continue
 
-        # Apply cloud.num_id from discovery — write immediately so it persists even if skipped
-        if discovery and folder in discovery:
-            disc_num = discovery[folder]
-            cloud = parsed.setdefault("cloud", {})
-            meta_num = cloud.get("num_id")
-            if meta_num is None:
-                cloud["num_id"] = disc_num
-                try:
-                    with open(file_path, "w", encoding="utf-8") as f:
-                        json.dump(parsed, f, indent=2)
-                    print(f"  Added cloud.num_id = {disc_num}")
-                except Exception as e:
-                    print(f"  Could not write cloud.num_id: {e}")
-            elif int(meta_num) != disc_num:
-                print(
-                    f"  WARNING: cloud.num_id mismatch — "
-                    f"metadata={meta_num}, discovery={disc_num}. Not auto-corrected."
-                )
-
-        # Reconcile GUID from building config (only for devices confirmed in discovery)
-        if discovery and folder in discovery and building_config:
-            meter_type_hint = _infer_meter_type(folder)
-            points_hint = parsed.get("pointset", {}).get("points") or {}
-            raw_name_hint = extract_asset_name_from_refs(points_hint, meter_type_hint) if meter_type_hint else None
-            dbo_name = build_yaml_asset_name(raw_name_hint, meter_type_hint) if raw_name_hint else ""
-            _apply_guid_from_building_config(file_path, folder, dbo_name, parsed, building_config)
+        context = _normalize_context(folder, snapshot.dbo_name, discovery, building_config, "interactive")
+        if state is not None and state.current(folder, "normalize", step_inputs(file_path, context)) is not None:
+            print("Unchanged since last run (metadata.json and mappings).")
+            if not _confirm_redo():
+                continue
 
-        while True:
-            skip_prompt = input("Skip or process this meter? (Enter=Process, 2=Skip): ").strip()
-            if skip_prompt in ("", "2"):
-                break
-            print("Invalid input. Press Enter to process or 2 to skip.")
-        if skip_prompt == "2":
-            continue
+        # num_id, GUID and point changes are collected in parsed and written once,
+        # when this device is done — including when it is skipped part-way.
+        try:
+            # Apply cloud.num_id from discovery
+            if discovery and folder in discovery:
+                _apply_num_id_from_discovery(parsed, discovery[folder])
+
+            # Reconcile GUID from building config (only for devices confirmed in discovery)
+            if discovery and folder in discovery and building_config:
+                _apply_guid_from_building_config(folder, snapshot.dbo_name, parsed, building_config)
 
-        meter_type = _infer_meter_type(folder)
-        if not meter_type:
-            meter_type_map = {"1": "EM", "2": "WM", "3": "GM"}
             while True:
-                mt_prompt = input("Enter meter type (1=EM, 2=WM, 3=GM): ").strip()
-                if mt_prompt in meter_type_map:
-                    meter_type = meter_type_map[mt_prompt]
+                skip_prompt = input("Skip or process this meter? (Enter=Process, 2=Skip): ").strip()
+                if skip_prompt in ("", "2"):
                     break
-                print("Invalid input. Enter 1, 2, or 3.")
-        try:
-            ci_field_map = build_case_insensitive_field_map(meter_type)
-            field_dbo_units = load_field_dbo_units(meter_type)
-        except ValueError as e:
-            print(e)
-            print(f"Skipping {folder}.")
-            continue
+                print("Invalid input. Press Enter to process or 2 to skip.")
+            if skip_prompt == "2":
+                continue
 
-        points = parsed["pointset"]["points"]
-        yaml_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings", "standard_field_map.yaml")
-        all_to_skip: set = set()
-        all_ignored: set = set()
+            meter_type = _infer_meter_type(folder)
+            if not meter_type:
+                meter_type_map = {"1": "EM", "2": "WM", "3": "GM"}
+                while True:
+                    mt_prompt = input("Enter meter type (1=EM, 2=WM, 3=GM): ").strip()
+                    if mt_prompt in meter_type_map:
+                        meter_type = meter_type_map[mt_prompt]
+                        break
+                    print("Invalid input. Enter 1, 2, or 3.")
+            try:
+                ci_field_map = build_case_insensitive_field_map(meter_type)
+                field_dbo_units = load_field_dbo_units(meter_type)
+            except ValueError as e:
+                print(e)
+                print(f"Skipping {folder}.")
+                continue
 
-        while True:
-            ci_field_map = build_case_insensitive_field_map(meter_type)
-            updated_points, mapped_summary, unmatched, ignored = process_points(points, ci_field_map, field_dbo_units)
-            all_ignored |= set(ignored)
-            remaining = [k for k in unmatched if k not in all_to_skip]
-            print_review(mapped_summary, remaining, ignored)
+            points = parsed["pointset"]["points"]
+            yaml_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings", "standard_field_map.yaml")
+            all_to_skip: set = set()
+            all_ignored: set = set()
 
-            if not remaining:
-                break
+            while True:
+                ci_field_map = build_case_insensitive_field_map(meter_type)
+                updated_points, mapped_summary, unmatched, ignored = process_points(points, ci_field_map, field_dbo_units)
+                all_ignored |= set(ignored)
+                remaining = [k for k in unmatched if k not in all_to_skip]
+                print_review(mapped_summary, remaining, ignored)
 
-            to_skip_new, retry = resolve_unmatched(remaining, meter_type, yaml_path)
-            all_to_skip |= to_skip_new
-            if not retry:
-                break
+                if not remaining:
+                    break
 
-        updated_points = apply_resolution(updated_points, all_to_skip)
+                to_skip_new, retry = resolve_unmatched(remaining, meter_type, yaml_path)
+                all_to_skip |= to_skip_new
+                if not retry:
+                    break
 
-        confirm = input("\nContinue with these mappings? (Enter=Yes, 2=Skip): ").strip()
-        if confirm == "2":
-            print("Skipping.")
-            continue
+            updated_points = apply_resolution(updated_points, all_to_skip)
+
+            confirm = input("\nContinue with these mappings? (Enter=Yes, 2=Skip): ").strip()
+            if confirm == "2":
+                print("Skipping.")
+                continue
+
+            parsed["pointset"]["points"] = updated_points
+        finally:
+            save_device_metadata(file_path, parsed)
 
-        overwrite_json(file_path, parsed, updated_points)
+        # Only reached when the device was fully processed
+        if state is not None and load_site_model(file_path) == parsed:
+            state.record(folder, "normalize", step_inputs(file_path, context),
+                         {"points_written": len(updated_points)})
+            state.save()
 
 
 def _write_export_yaml(
@@ -750,30 +846,18 @@ def _write_export_yaml(
     meter_data: Dict[str, Any],
     dbo_name: str,
     site_code: str,
-    building_config: Dict[str, Any],
+    building_config: "BuildingConfigIndex | Dict[str, Any]",
     output_dir: str,
     results: Dict[str, List[str]],
 ) -> None:
     """Write a _add.yaml or _update.yaml building config file for a single meter."""
+    bc_index = BuildingConfigIndex.of(building_config)
+
     # Find building entity (for code and etag)
-    building_guid: Optional[str] = None
-    building_data: Dict[str, Any] = {}
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("type") == "FACILITIES/BUILDING":
-            building_guid, building_data = key, value
-            break
+    building_guid, building_data = bc_index.building or (None, {})
 
     # Find existing BC entry for this meter (needed for UPDATE)
-    bc_meter_guid: Optional[str] = None
-    bc_meter_data: Dict[str, Any] = {}
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("code") == dbo_name:
-            bc_meter_guid, bc_meter_data = key, value
-            break
+    bc_meter_guid, bc_meter_data = bc_index.entity_by_code(dbo_name) or (None, {})
 
     building_entry: Dict[str, Any] = {
         "code": building_data.get("code", site_code),
@@ -793,9 +877,9 @@ def _write_export_yaml(
         for k, v in bc_meter_data.items():
             if k not in UDMI_FIELDS:
                 meter_entry[k] = v
-        for field in ("translation", "type", "update_mask"):
-            if field in meter_data:
-                meter_entry[field] = meter_data[field]
+        for key in ("translation", "type", "update_mask"):
+            if key in meter_data:
+                meter_entry[key] = meter_data[key]
         out_key = bc_meter_guid or guid
         filename = f"{site_code}_{dbo_name}_update.yaml"
 
@@ -805,12 +889,7 @@ def _write_export_yaml(
         out_key: meter_entry,
     }
     out_path = os.path.join(output_dir, filename)
-    parts = [
-        yaml.dump({k: v}, sort_keys=False, default_flow_style=False)
-        for k, v in output.items()
-    ]
-    with open(out_path, "w", encoding="utf-8") as fh:
-        fh.write("\n".join(parts))
+    yaml_io.write_sections(out_path, output)
     print(f"  Written: {out_path}")
     results["added" if export_st == "[ADD]" else "updated"].append(filename)
 
@@ -819,7 +898,7 @@ def run_export_batch() -> None:
     """Option 5 — Export batch: generate _add.yaml / _update.yaml building config files."""
     building_dir: Optional[str] = None
     discovery: Dict[str, int] = {}
-    building_config: Dict[str, Any] = {}
+    building_config = BuildingConfigIndex({})
 
     saved_dir = load_site_models_dir()
     if saved_dir and os.path.isdir(saved_dir):
@@ -864,7 +943,8 @@ def run_export_batch() -> None:
 
         _prompt_discovery_json(work_dir)
         discovery = _load_discovery_lookup(work_dir)
-        building_config = _load_building_config(work_dir)
+        building_config = BuildingConfigIndex(_load_building_config(work_dir))
+        state = BuildingState.load(work_dir)
     else:
         print("Building dir is not inside a saved site_models directory — no work_dir created.")
         return
@@ -885,56 +965,59 @@ def run_export_batch() -> None:
         print("No device folders found.")
         return
 
-    # Compute all statuses for the device list
-    labels = [_preview_device_name(devices_dir, f) for f in folders]
-    num_statuses = [_get_num_id_status(devices_dir, f, discovery) for f in folders]
-    guid_statuses = [
-        _get_guid_status(
-            devices_dir, f,
-            label if not label.startswith("(") else "",
-            discovery, building_config,
-        )
-        for f, label in zip(folders, labels)
-    ]
-    points_statuses = [_get_points_status(devices_dir, f) for f in folders]
-    export_statuses = [
-        _get_export_status(ns, gs, ps)
-        for ns, gs, ps in zip(num_statuses, guid_statuses, points_statuses)
-    ]
+    # Compute all statuses for the device list from one read of each metadata.json
+    snapshots = load_device_snapshots(devices_dir, folders, log=print)
+    with instrumentation.span("select_devices.status"):
+        labels = [_preview_device_name(snapshots[f]) for f in folders]
+        num_statuses = [_get_num_id_status(snapshots[f], discovery) for f in folders]
+        guid_statuses = [
+            _get_guid_status(
+                snapshots[f],
+                label if not label.startswith("(") else "",
+                discovery, building_config,
+            )
+            for f, label in zip(folders, labels)
+        ]
+        points_statuses = [_get_points_status(snapshots[f]) for f in folders]
+        export_statuses = [
+            _get_export_status(ns, gs, ps)
+            for ns, gs, ps in zip(num_statuses, guid_statuses, points_statuses)
+        ]
+    device_statuses = {
+        f: (ns, gs, ps) for f, ns, gs, ps in zip(folders, num_statuses, guid_statuses, points_statuses)
+    }
 
     selected = select_devices(
         folders, devices_dir, discovery, building_config,
         points_statuses=points_statuses, export_statuses=export_statuses,
+        snapshots=snapshots,
     )
 
-    results: Dict[str, List[str]] = {"added": [], "updated": []}
+    results: Dict[str, List[str]] = {"added": [], "updated": [], "unchanged": []}
 
     for folder in selected:
-        file_path = os.path.join(devices_dir, folder, "metadata.json")
+        snapshot = snapshots[folder]
+        file_path = snapshot.meta_path
         print(f"\n--- Processing: {folder} ---")
 
-        if not os.path.isfile(file_path):
+        if isinstance(snapshot.load_error, FileNotFoundError):
             print(f"  metadata.json not found in {folder}, skipping.")
             continue
 
-        try:
-            parsed = load_site_model(file_path)
-        except Exception as e:
-            print(f"  Error reading {file_path}: {e}, skipping.")
+        if snapshot.parsed is None:
+            print(f"  Error reading {file_path}: {snapshot.load_error}, skipping.")
             continue
+        parsed = snapshot.parsed
 
         if not validate_site_model(parsed):
             print(f"  Skipping {folder}.")
             continue
 
-        meter_type = _infer_meter_type(folder)
-        points_hint = parsed.get("pointset", {}).get("points") or {}
-        raw_name = extract_asset_name_from_refs(points_hint, meter_type) if meter_type else None
-        dbo_name = build_yaml_asset_name(raw_name, meter_type) if raw_name else ""
+        meter_type = snapshot.meter_type
+        points_hint = snapshot.points
+        dbo_name = snapshot.dbo_name
 
-        num_st = _get_num_id_status(devices_dir, folder, discovery)
-        guid_st = _get_guid_status(devices_dir, folder, dbo_name, discovery, building_config)
-        pts_st = _get_points_status(devices_dir, folder)
+        num_st, guid_st, pts_st = device_statuses[folder]
         export_st = _get_export_status(num_st, guid_st, pts_st)
 
         if export_st == "[BLOCKED]":
@@ -944,12 +1027,25 @@ def run_export_batch() -> None:
             print(f"  Skipping {folder} — no discovery data.")
             continue
 
+        # The hash covers the BC entry of the name actually used, which may have
+        # been typed over the inferred one on the last run
+        last_name = state.recorded(folder, "export").get("dbo_name") or dbo_name
+        previous = state.current(folder, "export", step_inputs(
+            file_path, _export_context(folder, last_name, discovery, building_config, "interactive"),
+        ))
+        if previous is not None:
+            kept = os.path.basename(previous["output_file"])
+            print(f"  Unchanged since last run — {kept} is current.")
+            if not _confirm_redo("  "):
+                results["unchanged"].append(kept)
+                continue
+
         # Confirm or override the inferred meter name before writing YAML
         print(f"  Name: {dbo_name or '(could not infer)'}")
         name_input = input("  Confirm name (Enter) or type override: ").strip()
         if name_input:
             dbo_name = name_input
-            guid_st = _get_guid_status(devices_dir, folder, dbo_name, discovery, building_config)
+            guid_st = _get_guid_status(snapshot, dbo_name, discovery, building_config)
             export_st = _get_export_status(num_st, guid_st, pts_st)
             if export_st in ("[BLOCKED]", ""):
                 print(f"  Blocked after name change (guid: {guid_st}). Skipping.")
@@ -990,20 +1086,10 @@ def run_export_batch() -> None:
 
         # Build translation DataFrame and UDMI dict
         missing_fields = add_missing_points(dbo_name, pre_add=pre_add_fields)
-        df = build_translation_dataframe(yaml_points, field_standard_units, dbo_name, "METER", type_name)
-        if missing_fields:
-            missing_rows = pd.DataFrame([{
-                "assetName": dbo_name,
-                "object_name": "MISSING",
-                "standardFieldName": field,
-                "raw_units": "MISSING",
-                "DBO_standard_units": "MISSING",
-                "generalType": "METER",
-                "typeName": type_name,
-            } for field in missing_fields])
-            df = pd.concat([df, missing_rows], ignore_index=True)
-
-        udmi_dict = build_udmi_dict(df, num_id=num_id, guid=guid)
+        rows = build_translation_rows(yaml_points, field_standard_units, dbo_name, "METER", type_name)
+        rows += missing_translation_rows(missing_fields, dbo_name, "METER", type_name)
+
+        udmi_dict = build_udmi_dict_from_rows(rows, num_id=num_id, guid=guid)
         guid_key = guid if guid else ""
         meter_data = udmi_dict.get(guid_key, next(iter(udmi_dict.values()), {}))
 
@@ -1011,8 +1097,17 @@ def run_export_batch() -> None:
             export_st, guid_key, meter_data, dbo_name, site_code,
             building_config, output_dir, results,
         )
-
-    print(f"\nExport complete — {len(results['added'])} added, {len(results['updated'])} updated.")
+        written = results["added" if export_st == "[ADD]" else "updated"][-1]
+        inputs = step_inputs(file_path, _export_context(folder, dbo_name, discovery, building_config, "interactive"))
+        state.record(folder, "export", inputs, {
+            "dbo_name": dbo_name,
+            "type": type_name,
+            "output_file": os.path.join(output_dir, written),
+        })
+        state.save()
+
+    print(f"\nExport complete — {len(results['added'])} added, {len(results['updated'])} updated, "
+          f"{len(results['unchanged'])} unchanged since last run.")
     if results["added"]:
         print("  ADD files:")
         for f in results["added"]:
@@ -1,7 +1,7 @@
 import os
 import re
 
-import yaml
+import yaml_io
 
 
 def _extract_site_code(filename: str) -> str | None:
@@ -10,31 +10,60 @@ def _extract_site_code(filename: str) -> str | None:
     return match.group(1) if match else None
 
 
-def _find_building_entity(building_config: dict) -> tuple[str, dict] | None:
+class BuildingConfigIndex:
+    """Lookup tables over a parsed building config, built in one pass.
+
+    Replaces per-meter linear scans over every entity with O(1) lookups:
+      code_to_guid   {entity code: guid}  (first entity wins, as the scans did)
+      building       (guid, entity) of the first FACILITIES/BUILDING, or None
+    """
+
+    def __init__(self, building_config: dict | None) -> None:
+        self.config: dict = building_config if isinstance(building_config, dict) else {}
+        self.code_to_guid: dict[str, str] = {}
+        self.building: tuple[str, dict] | None = None
+        for key, value in self.config.items():
+            if key == "CONFIG_METADATA" or not isinstance(value, dict):
+                continue
+            code = value.get("code")
+            if code is not None:
+                self.code_to_guid.setdefault(code, key)
+            if value.get("type") == "FACILITIES/BUILDING" and self.building is None:
+                self.building = (key, value)
+
+    @classmethod
+    def of(cls, building_config: "BuildingConfigIndex | dict | None") -> "BuildingConfigIndex":
+        """Return building_config if it is already an index, otherwise index it."""
+        if isinstance(building_config, cls):
+            return building_config
+        return cls(building_config)
+
+    def __bool__(self) -> bool:
+        return bool(self.config)
+
+    def guid_for_code(self, code: str) -> str | None:
+        return self.code_to_guid.get(code)
+
+    def entity_by_code(self, code: str) -> tuple[str, dict] | None:
+        guid = self.code_to_guid.get(code)
+        return (guid, self.config[guid]) if guid is not None else None
+
+
+def _find_building_entity(building_config: "BuildingConfigIndex | dict") -> tuple[str, dict] | None:
     """Return (guid_key, entity_dict) for the FACILITIES/BUILDING entity, or None."""
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("type") == "FACILITIES/BUILDING":
-            return key, value
-    return None
+    return BuildingConfigIndex.of(building_config).building
 
 
-def _find_meter_entity_by_code(meter_code: str, building_config: dict) -> tuple[str, dict] | None:
+def _find_meter_entity_by_code(meter_code: str, building_config: "BuildingConfigIndex | dict") -> tuple[str, dict] | None:
     """Return (guid_key, entity_dict) for the entity with matching code, or None."""
-    for key, value in building_config.items():
-        if key == "CONFIG_METADATA":
-            continue
-        if isinstance(value, dict) and value.get("code") == meter_code:
-            return key, value
-    return None
+    return BuildingConfigIndex.of(building_config).entity_by_code(meter_code)
 
 
 def _process_meter(
     meter_guid: str,
     meter_data: dict,
     site_code: str,
-    building_config: dict,
+    building_config: "BuildingConfigIndex | dict",
     output_dir: str,
     results: dict,
 ) -> None:
@@ -45,6 +74,7 @@ def _process_meter(
         results["failed"].append(meter_guid)
         return
 
+    building_config = BuildingConfigIndex.of(building_config)
     building_entity = _find_building_entity(building_config)
     if building_entity is None:
         print("  No FACILITIES/BUILDING entity found in building config, skipping.")
@@ -80,12 +110,7 @@ def _process_meter(
         out_filename = f"{site_code}_{meter_code}_update.yaml"
         out_path = os.path.join(output_dir, out_filename)
         try:
-            parts = [
-                yaml.dump({k: v}, sort_keys=False, default_flow_style=False)
-                for k, v in output.items()
-            ]
-            with open(out_path, "w", encoding="utf-8") as fh:
-                fh.write("\n".join(parts))
+            yaml_io.write_sections(out_path, output)
             print(f"  Update written: {out_path}")
             print(f"  Note: Update the site model GUID ({bc_meter_guid})")
             results["updated"].append((out_filename, bc_meter_guid))
@@ -112,12 +137,7 @@ def _process_meter(
         out_filename = f"{site_code}_{meter_code}_add.yaml"
         out_path = os.path.join(output_dir, out_filename)
         try:
-            parts = [
-                yaml.dump({k: v}, sort_keys=False, default_flow_style=False)
-                for k, v in output.items()
-            ]
-            with open(out_path, "w", encoding="utf-8") as fh:
-                fh.write("\n".join(parts))
+            yaml_io.write_sections(out_path, output)
             print(f"  Add written: {out_path}")
             results["added"].append(out_filename)
         except Exception as e:
@@ -150,8 +170,8 @@ def run_building_config_updater_from_data(
     """
     os.makedirs(output_dir, exist_ok=True)
 
-    # Pre-load building configs for each unique site code
-    loaded_configs: dict[str, dict | None] = {}
+    # Pre-load and index building configs for each unique site code
+    loaded_configs: dict[str, BuildingConfigIndex | None] = {}
     for entry in meter_entries:
         site_code = entry["site_code"]
         if site_code not in loaded_configs:
@@ -161,8 +181,10 @@ def run_building_config_updater_from_data(
                 loaded_configs[site_code] = None
             else:
                 try:
-                    with open(config_path, "r", encoding="utf-8") as fh:
-                        loaded_configs[site_code] = yaml.safe_load(fh)
+                    building_config = yaml_io.load_file_cached(config_path)
+                    loaded_configs[site_code] = (
+                        BuildingConfigIndex(building_config) if isinstance(building_config, dict) else None
+                    )
                 except Exception as e:
                     print(f"  Failed to load building config for {site_code}: {e}")
                     loaded_configs[site_code] = None
@@ -172,7 +194,7 @@ def run_building_config_updater_from_data(
     for entry in meter_entries:
         site_code = entry["site_code"]
         building_config = loaded_configs.get(site_code)
-        if building_config is None or not isinstance(building_config, dict):
+        if building_config is None:
             results["failed"].append(entry.get("data", {}).get("code", entry["guid"]))
             continue
         print(f"\n--- {entry.get('data', {}).get('code', entry['guid'])} ({site_code}) ---")
@@ -221,6 +243,7 @@ def run_building_config_updater(input_dir: str | None = None) -> None:
     os.makedirs(output_dir, exist_ok=True)
 
     results: dict = {"added": [], "updated": [], "failed": []}
+    indexes_by_site: dict[str, BuildingConfigIndex] = {}
 
     for filename in udmi_files:
         udmi_path = os.path.join(input_dir, filename)
@@ -240,22 +263,23 @@ def run_building_config_updater(input_dir: str | None = None) -> None:
             results["failed"].append(filename)
             continue
 
-        try:
-            with open(building_config_path, "r", encoding="utf-8") as fh:
-                building_config = yaml.safe_load(fh)
-        except Exception as e:
-            print(f"  Failed to load building config: {e}")
-            results["failed"].append(filename)
-            continue
-
-        if not isinstance(building_config, dict):
-            print("  Building config is not a valid YAML mapping, skipping.")
-            results["failed"].append(filename)
-            continue
+        building_config = indexes_by_site.get(site_code)
+        if building_config is None:
+            try:
+                parsed_config = yaml_io.load_file_cached(building_config_path)
+            except Exception as e:
+                print(f"  Failed to load building config: {e}")
+                results["failed"].append(filename)
+                continue
+
+            if not isinstance(parsed_config, dict):
+                print("  Building config is not a valid YAML mapping, skipping.")
+                results["failed"].append(filename)
+                continue
+            building_config = indexes_by_site[site_code] = BuildingConfigIndex(parsed_config)
 
         try:
-            with open(udmi_path, "r", encoding="utf-8") as fh:
-                udmi_data = yaml.safe_load(fh)
+            udmi_data = yaml_io.load_file(udmi_path)
         except Exception as e:
             print(f"  Failed to load UDMI YAML: {e}")
             results["failed"].append(filename)
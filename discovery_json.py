@@ -0,0 +1,227 @@
+"""
+Single-pass reader for device_discovery.json exports.
+
+The file is a JSON array of arrays: a header row followed by one row per
+device registration.  scan_discovery() validates the headers and keeps only
+the newest row per device_id while streaming, so memory grows with the number
+of devices, not the number of rows.  The result is cached next to the file and
+reused until the file's size or mtime changes.
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+DISCOVERY_HEADERS = ["device_registry_id", "device_id", "device_num_id", "last_event_time"]
+
+CACHE_SUFFIX = ".lookup-cache.json"
+_CACHE_VERSION = 1
+_CHUNK_SIZE = 1 << 16
+_WS_RE = re.compile(r"[ \t\n\r]*")
+# A decode error this close to the end of the buffer may just be a value cut
+# off by the chunk boundary (e.g. "tru" or "1e"); anything earlier is malformed.
+_TRUNCATION_MARGIN = 16
+
+
+class NotAnArray(ValueError):
+    """The document does not start with a JSON array."""
+
+
+@dataclass
+class DiscoveryScan:
+    """Outcome of one pass over a discovery file."""
+    valid: bool
+    error: str = ""
+    lookup: Dict[str, int] = field(default_factory=dict)  # device_id -> device_num_id
+
+
+def iter_json_array(fh: IO[str], chunk_size: int = _CHUNK_SIZE) -> Iterator[Any]:
+    """Yield the elements of the top-level JSON array in fh one at a time.
+
+    Only the current element and one read chunk are held in memory.
+    Raises json.JSONDecodeError (a ValueError) on malformed input as soon as
+    the bad element is read, without reading the rest of the file.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def _fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def _skip_ws() -> Optional[str]:
+        nonlocal pos
+        while True:
+            pos = _WS_RE.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not _fill():
+                return None
+
+    def _fail(msg: str):
+        raise json.JSONDecodeError(msg, buf, pos)
+
+    if _skip_ws() != "[":
+        raise NotAnArray("Expecting '[' at start of discovery data")
+    pos += 1
+    if _skip_ws() == "]":
+        pos += 1
+    else:
+        while True:
+            if _skip_ws() is None:
+                _fail("Unterminated array")
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError as e:
+                    truncated = e.msg.startswith("Unterminated string") or e.pos >= len(buf) - _TRUNCATION_MARGIN
+                    if truncated and _fill():
+                        continue
+                    raise
+                # A number at the end of the buffer may continue in the next chunk
+                if end == len(buf) and not eof and _fill():
+                    continue
+                break
+            pos = end
+            yield value
+            sep = _skip_ws()
+            if sep == ",":
+                pos += 1
+            elif sep == "]":
+                pos += 1
+                break
+            else:
+                _fail("Expecting ',' or ']' between discovery rows")
+    if _skip_ws() is not None:
+        _fail("Extra data after discovery array")
+
+
+def _scan_stream(fh: IO[str]) -> DiscoveryScan:
+    rows = iter_json_array(fh)
+    not_array = DiscoveryScan(False, "Expected a JSON array with at least 2 rows (header + data).")
+    try:
+        headers = next(rows, None)
+        if headers is None:
+            return not_array
+        if isinstance(headers, list):
+            header_error = ""
+            missing = [h for h in DISCOVERY_HEADERS if h not in headers]
+            if missing:
+                header_error = f"Missing required headers: {missing}"
+        else:
+            header_error = "First row must be an array of column headers."
+            headers = []
+        try:
+            id_idx = headers.index("device_id")
+            num_id_idx = headers.index("device_num_id")
+            time_idx = headers.index("last_event_time")
+            lookup_ok = True
+        except ValueError:
+            id_idx = num_id_idx = time_idx = 0
+            lookup_ok = False
+
+        best: Dict[str, tuple] = {}  # device_id -> (num_id, normalized_time_str)
+        row_count = 0
+        for row in rows:
+            row_count += 1
+            if not lookup_ok:
+                continue
+            try:
+                if len(row) <= num_id_idx or row[num_id_idx] is None:
+                    continue
+                device_id = row[id_idx]
+                t = row[time_idx] if len(row) > time_idx else None
+                if t is None or t == "null":
+                    t = ""
+                if device_id not in best or t > best[device_id][1]:
+                    best[device_id] = (row[num_id_idx], t)
+            except Exception:
+                lookup_ok = False  # keep validating; an unusable row empties the lookup
+    except NotAnArray:
+        return not_array
+    except json.JSONDecodeError as e:
+        return DiscoveryScan(False, f"Invalid JSON: {e}")
+
+    try:
+        lookup = {did: int(num_id) for did, (num_id, _) in best.items()} if lookup_ok else {}
+    except (TypeError, ValueError):
+        lookup = {}
+    if row_count == 0:
+        return not_array
+    if header_error:
+        return DiscoveryScan(False, header_error, lookup)
+    return DiscoveryScan(True, "", lookup)
+
+
+def _cache_path(path: str) -> str:
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, "." + name + CACHE_SUFFIX)
+
+
+def _read_cache(path: str, signature: List[int]) -> Optional[DiscoveryScan]:
+    try:
+        with open(_cache_path(path), "r", encoding="utf-8") as fh:
+            cached = json.load(fh)
+        if cached.get("version") != _CACHE_VERSION or cached.get("signature") != signature:
+            return None
+        return DiscoveryScan(bool(cached["valid"]), cached["error"], {k: int(v) for k, v in cached["lookup"].items()})
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+
+def _write_cache(path: str, signature: List[int], scan: DiscoveryScan) -> None:
+    cache = _cache_path(path)
+    tmp = cache + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({
+                "version": _CACHE_VERSION,
+                "signature": signature,
+                "valid": scan.valid,
+                "error": scan.error,
+                "lookup": scan.lookup,
+            }, fh)
+        os.replace(tmp, cache)
+    except OSError:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+def scan_discovery(path: str, use_cache: bool = True) -> DiscoveryScan:
+    """Validate path and build its {device_id: device_num_id} lookup in one streaming pass.
+
+    When several rows share a device_id, the row with the most recent
+    last_event_time wins; null timestamps (None or "null") rank lowest.
+    """
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        return DiscoveryScan(False, f"Could not read file: {e}")
+    signature = [st.st_size, st.st_mtime_ns]
+    if use_cache:
+        cached = _read_cache(path, signature)
+        if cached is not None:
+            return cached
+
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            scan = _scan_stream(fh)
+    except (OSError, UnicodeDecodeError) as e:
+        return DiscoveryScan(False, f"Could not read file: {e}")
+    if use_cache:
+        _write_cache(path, signature, scan)
+    return scan
@@ -2,15 +2,146 @@ import subprocess
 import re
 import os
 import sys
+import json
+import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+import instrumentation
+from operation_poller import (
+    OperationTimeout,
+    file_signature,
+    is_running,
+    poll_operation,
+    read_fresh_outfile,
+)
 
-def export_building_config(building_code, outfile_path):
+# Upper bound on concurrent ExportBuildingConfig calls in multi-building runs
+MAX_EXPORT_WORKERS = 4
+
+# Overall time budget for one export's GetOperation polling, in seconds
+EXPORT_DEADLINE_S = 600
+
+# Local copy of the last export per building code.  A cached export younger
+# than EXPORT_CACHE_TTL_S is reused instead of calling ExportBuildingConfig
+# again; 0 disables reuse (every export goes to the server).
+EXPORT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "meter_onboard", "exports")
+EXPORT_CACHE_TTL_S = 600
+
+
+# ----------------------------
+# Export cache
+# ----------------------------
+
+def _export_cache_paths(building_code):
+    base = os.path.join(EXPORT_CACHE_DIR, building_code)
+    return base + ".yaml", base + ".json"
+
+
+def _scan_export_metadata(path):
+    """Return (CONFIG_METADATA dict, building etag) from an exported config without a full YAML parse."""
+    config_metadata = {}
+    building_etag = None
+    block, block_etag, block_is_building = None, None, False
+    with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+        for line in fh:
+            if line[:1] not in (" ", "\t", "\n", "#", ""):
+                if block_is_building and building_etag is None:
+                    building_etag = block_etag
+                block, block_etag, block_is_building = line.split(":", 1)[0].strip("'\""), None, False
+                continue
+            key, sep, value = line.strip().partition(":")
+            if not sep or line.startswith("    "):
+                continue
+            value = value.strip().strip("'\"")
+            if block == "CONFIG_METADATA":
+                config_metadata[key] = value
+            elif key == "etag":
+                block_etag = value
+            elif key == "type" and value == "FACILITIES/BUILDING":
+                block_is_building = True
+    if block_is_building and building_etag is None:
+        building_etag = block_etag
+    return config_metadata, building_etag
+
+
+def _load_cached_export(building_code, max_age):
+    """Return the cache record for building_code if its export is younger than max_age, else None."""
+    if max_age <= 0:
+        return None
+    data_path, meta_path = _export_cache_paths(building_code)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as fh:
+            record = json.load(fh)
+        age = time.time() - float(record["exported_at"])
+        if not 0 <= age < max_age or os.path.getsize(data_path) != record["size"]:
+            return None
+        if not record.get("config_metadata"):  # not a real export; never reuse it
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    record["age"] = age
+    record["path"] = data_path
+    return record
+
+
+def _store_export_cache(building_code, outfile_path):
+    """Record a finished export (cleaned file + CONFIG_METADATA + building etag) in the cache."""
+    data_path, meta_path = _export_cache_paths(building_code)
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(outfile_path, tmp)
+        config_metadata, building_etag = _scan_export_metadata(tmp)
+        record = {
+            "building_code": building_code,
+            "exported_at": time.time(),
+            "size": os.path.getsize(tmp),
+            "config_metadata": config_metadata,
+            "building_etag": building_etag,
+        }
+        os.replace(tmp, data_path)
+        tmp = None
+        with open(meta_path, "w", encoding="utf-8") as fh:
+            json.dump(record, fh, indent=2)
+    finally:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def invalidate_export_cache(building_code):
+    """Forget the cached export for building_code (e.g. after onboarding changed it)."""
+    for path in _export_cache_paths(building_code):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+@instrumentation.timed("export_building_config")
+def export_building_config(building_code, outfile_path, log=print, deadline=EXPORT_DEADLINE_S,
+                           force_refresh=False, max_age=None):
     """Run ExportBuildingConfig, poll until result is written to outfile, then clean gibberish.
 
     Returns True on success. Raises RuntimeError on failure (instead of sys.exit)
     so callers can handle errors without terminating the process.
+    log receives progress messages (defaults to print); deadline bounds the polling.
+
+    If this building was exported less than max_age seconds ago (default
+    EXPORT_CACHE_TTL_S) the cached copy is written to outfile_path instead;
+    force_refresh=True always asks the server for live state.
     """
+    if not force_refresh:
+        cached = _load_cached_export(building_code, EXPORT_CACHE_TTL_S if max_age is None else max_age)
+        if cached is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(outfile_path)), exist_ok=True)
+            shutil.copyfile(cached["path"], outfile_path)
+            instrumentation.count("export_building_config.cache_hit")
+            log(f"Using cached export from {cached['age']:.0f}s ago "
+                f"(building etag {cached.get('building_etag') or 'unknown'})")
+            return True
 
     # ----------------------------
     # Parse building code
@@ -40,8 +171,9 @@ def export_building_config(building_code, outfile_path):
         f"name: 'projects/digitalbuildings/countries/us/cities/{city_code}/buildings/{building_code_part}', profile:'projects/digitalbuildings/profiles/MaintenanceOps'"
     ]
 
-    print("Running export building config command...")
-    export_result = subprocess.run(export_args, capture_output=True, text=True)
+    log("Running export building config command...")
+    with instrumentation.span("stubby"):
+        export_result = subprocess.run(export_args, capture_output=True, text=True)
 
     if export_result.returncode != 0:
         msg = export_result.stderr.strip()
@@ -79,35 +211,88 @@ def export_building_config(building_code, outfile_path):
         f"name: 'projects/digitalbuildings/countries/us/cities/{city_code}/buildings/{building_code_part}', profile:'projects/digitalbuildings/profiles/MaintenanceOps', operation_name: '{operation_name}'"
     ]
 
-    time.sleep(10)
+    baseline = file_signature(outfile_path)
 
-    for attempt in range(1, 4):  # 3 tries max
-        print(f"Checking operation status (attempt {attempt})...")
-        get_op_result = subprocess.run(get_op_args, capture_output=True, text=True)
+    def _check(attempt):
+        log(f"Checking operation status (attempt {attempt})...")
+        with instrumentation.span("stubby"):
+            get_op_result = subprocess.run(get_op_args, capture_output=True, text=True)
 
         if get_op_result.returncode != 0:
-            print(f"Warning: GetOperation failed with exit code {get_op_result.returncode}")
+            log(f"Warning: GetOperation failed with exit code {get_op_result.returncode}")
             if get_op_result.stderr:
-                print("stderr:\n", get_op_result.stderr.strip())
+                log("stderr:\n " + get_op_result.stderr.strip())
 
-        # Try to read the outfile and check for "running"
-        if os.path.exists(outfile_path):
-            try:
-                with open(outfile_path, "r", encoding="utf-8", errors="ignore") as fh:
-                    content = fh.read()
-                if content.strip():
-                    if "running" in content.lower():
-                        print("Operation still running — retrying in 10 seconds...")
-                    else:
-                        clean_export_file(outfile_path)
-                        return True
-            except Exception as e:
-                print(f"Warning: couldn't read outfile {outfile_path}: {e}")
+        try:
+            content = read_fresh_outfile(outfile_path, get_op_result.returncode, baseline)
+        except Exception as e:
+            log(f"Warning: couldn't read outfile {outfile_path}: {e}")
+            return False, None
+        if not content.strip():
+            return False, None
+        # Only the operation header (before the exported config) carries the state
+        if is_running(content.partition("CONFIG_METADATA:")[0]):
+            log("Operation still running...")
+            return False, None
+        return True, None
+
+    try:
+        with instrumentation.span("export_building_config.poll"):
+            poll_operation(
+                _check,
+                deadline=deadline,
+                on_wait=lambda delay: log(f"Retrying in {delay:.1f} seconds..."),
+            )
+    except OperationTimeout as e:
+        raise RuntimeError(f"Export did not complete successfully ({e}).")
+
+    if not clean_export_file(outfile_path, log=log):
+        raise RuntimeError(f"Export output has no CONFIG_METADATA: {outfile_path}")
+    try:
+        _store_export_cache(building_code, outfile_path)
+    except OSError as e:
+        log(f"Warning: could not cache export: {e}")
+    return True
+
+
+def export_building_configs(outfiles, max_workers=MAX_EXPORT_WORKERS, on_result=None, force_refresh=False):
+    """Export several building configs concurrently, at most max_workers at a time.
+
+    outfiles maps building code -> outfile path. on_result(code, outfile, error) is
+    called from the calling thread as each export finishes (error is None on success).
+    Progress lines from each export are prefixed with its building code.
+    force_refresh bypasses the export cache for every building.
 
-        if attempt < 3:
-            time.sleep(10)
+    Returns {"success": [codes], "failed": [codes]}, each sorted.
+    """
+    results = {"success": [], "failed": []}
+    if not outfiles:
+        return results
+
+    def _log_for(code):
+        return lambda msg: print(f"  [{code}] {msg}", flush=True)
+
+    workers = max(1, min(max_workers, len(outfiles)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(export_building_config, code, outfile, _log_for(code), force_refresh=force_refresh): code
+            for code, outfile in outfiles.items()
+        }
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                future.result()
+                error = None
+                results["success"].append(code)
+            except Exception as e:  # one failed export must not abort the others
+                error = e
+                results["failed"].append(code)
+            if on_result is not None:
+                on_result(code, outfiles[code], error)
 
-    raise RuntimeError("Export did not complete successfully (still running after 3 attempts).")
+    results["success"].sort()
+    results["failed"].sort()
+    return results
 
 
 def _collect_building_codes_from_dir(project_dir: str) -> list:
@@ -144,7 +329,7 @@ def run_export_single() -> None:
 
     outfile = os.path.join(out_dir, f"{building_code}_full_building_config.yaml")
     try:
-        export_building_config(building_code, outfile)
+        export_building_config(building_code, outfile, force_refresh=True)
         print(f"Saved: {outfile}")
     except RuntimeError as e:
         print(f"Export failed: {e}")
@@ -180,18 +365,19 @@ def run_export_batch() -> str | None:
     os.makedirs(output_root, exist_ok=True)
     print(f"\nOutputs will be saved to: {output_root}\n")
 
-    results = {"success": [], "failed": []}
+    outfiles = {
+        code: os.path.join(output_root, f"{code}_full_building_config.yaml")
+        for code in building_codes
+    }
 
-    for code in building_codes:
-        outfile = os.path.join(output_root, f"{code}_full_building_config.yaml")
-        print(f"--- Exporting: {code} ---")
-        try:
-            export_building_config(code, outfile)
-            print(f"  Saved: {outfile}")
-            results["success"].append(code)
-        except RuntimeError as e:
-            print(f"  Failed: {e}")
-            results["failed"].append(code)
+    def _report(code, outfile, error):
+        if error is None:
+            print(f"--- {code}: Saved: {outfile}")
+        else:
+            print(f"--- {code}: Failed: {error}")
+
+    print(f"--- Exporting {len(outfiles)} building(s), up to {MAX_EXPORT_WORKERS} at a time ---")
+    results = export_building_configs(outfiles, on_result=_report, force_refresh=True)
 
     # Summary
     print(f"\n=== Export Summary ===")
@@ -206,8 +392,11 @@ def run_export_batch() -> str | None:
     return building_dir
 
 
-def clean_export_file(outfile_path):
-    """Remove gibberish characters before CONFIG_METADATA: in the exported file."""
+def clean_export_file(outfile_path, log=print):
+    """Remove gibberish characters before CONFIG_METADATA: in the exported file.
+
+    Returns True if the marker was found and the file cleaned, else False.
+    """
     try:
         with open(outfile_path, "r", encoding="utf-8", errors="ignore") as fh:
             content = fh.read()
@@ -215,17 +404,19 @@ def clean_export_file(outfile_path):
         marker = "CONFIG_METADATA:"
         idx = content.find(marker)
         if idx == -1:
-            print("⚠️ Warning: CONFIG_METADATA not found in file. Leaving file unchanged.")
-            return
+            log("⚠️ Warning: CONFIG_METADATA not found in file. Leaving file unchanged.")
+            return False
 
         cleaned_content = content[idx:]
         with open(outfile_path, "w", encoding="utf-8") as fh:
             fh.write(cleaned_content)
 
-        print("✅ Building config successfully refreshed")
+        log("✅ Building config successfully refreshed")
+        return True
 
     except Exception as e:
-        print(f"⚠️ Failed to clean file {outfile_path}: {e}")
+        log(f"⚠️ Failed to clean file {outfile_path}: {e}")
+        return False
 
 
 # ----------------------------
@@ -236,7 +427,7 @@ if __name__ == "__main__":
     outfile_path = input("Enter absolute path for output full_building_config.yaml: ").strip()
 
     try:
-        export_building_config(building_code, outfile_path)
+        export_building_config(building_code, outfile_path, force_refresh=True)
     except RuntimeError as e:
         print(f"Error: {e}")
         sys.exit(1)
\ No newline at end of file
@@ -1,25 +1,87 @@
 from __future__ import annotations
 
 import os
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional, Set, Tuple
 
 import yaml
 
-# ---------------------------------------------------------------------------
-# Config
-# ---------------------------------------------------------------------------
-
 # ---------------------------------------------------------------------------
 # Field map loading
 # ---------------------------------------------------------------------------
 
-def _load_field_map_yaml(yaml_file: Optional[str] = None) -> Dict[str, Any]:
+@dataclass
+class FieldMap:
+    """Compiled lookup tables for one meter type in standard_field_map.yaml."""
+    meter_type: str
+    raw_to_standard: Dict[str, str]
+    dbo_units: Dict[str, str]
+    standard_units: Dict[str, str]
+    ci_raw_to_standard: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_mappings(cls, all_mappings: Dict[str, Any], meter_type: str) -> "FieldMap":
+        fields = all_mappings[meter_type] or {}
+        raw_to_standard = {
+            object_name: standard_field
+            for standard_field, field_data in fields.items()
+            for object_name in ((field_data or {}).get("names") or [])
+        }
+        # Also map each standard field name to itself so already-processed points
+        # still have their units corrected on a second run.
+        for standard_field in fields:
+            if standard_field != "IGNORE":
+                raw_to_standard[standard_field.lower()] = standard_field
+        dbo_units = {
+            standard_field: (field_data or {}).get("dbo_unit", "")
+            for standard_field, field_data in fields.items()
+            if standard_field != "IGNORE"
+        }
+        standard_units = {
+            standard_field: (field_data or {}).get("standard_unit", "")
+            for standard_field, field_data in fields.items()
+            if standard_field != "IGNORE"
+        }
+        ci_raw_to_standard = {k.lower(): v for k, v in raw_to_standard.items()}
+        return cls(meter_type, raw_to_standard, dbo_units, standard_units, ci_raw_to_standard)
+
+
+@dataclass
+class _FieldMapCacheEntry:
+    signature: Optional[Tuple[int, int]]
+    mappings: Dict[str, Any]
+    compiled: Dict[str, FieldMap] = field(default_factory=dict)
+
+
+# Resolved YAML path -> parsed + compiled field map.  Entries are reused until
+# the file's (mtime, size) changes, so edits made during the "(a) Map all
+# manually" retry loop are picked up on the next load.
+_FIELD_MAP_CACHE: Dict[str, _FieldMapCacheEntry] = {}
+
+
+def clear_field_map_cache() -> None:
+    """Drop all cached field maps (the next load re-parses the YAML)."""
+    _FIELD_MAP_CACHE.clear()
+
+
+def _resolve_field_map_path(yaml_file: Optional[str] = None) -> str:
     if yaml_file is None:
-        yaml_file = _get_yaml_path()
-    else:
-        if not os.path.isabs(yaml_file):
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            yaml_file = os.path.join(base_dir, yaml_file)
+        return _get_yaml_path()
+    if not os.path.isabs(yaml_file):
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(base_dir, yaml_file)
+    return yaml_file
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _parse_field_map_yaml(yaml_file: str) -> Dict[str, Any]:
     try:
         with open(yaml_file, "r", encoding="utf-8") as f:
             all_mappings = yaml.safe_load(f)
@@ -34,6 +96,24 @@ def _load_field_map_yaml(yaml_file: Optional[str] = None) -> Dict[str, Any]:
     return all_mappings
 
 
+def _load_field_map_entry(yaml_file: Optional[str] = None) -> _FieldMapCacheEntry:
+    path = _resolve_field_map_path(yaml_file)
+    signature = _file_signature(path)
+    entry = _FIELD_MAP_CACHE.get(path)
+    if entry is not None and signature is not None and entry.signature == signature:
+        return entry
+    entry = _FieldMapCacheEntry(signature, _parse_field_map_yaml(path))
+    if signature is not None:
+        _FIELD_MAP_CACHE[path] = entry
+    else:
+        _FIELD_MAP_CACHE.pop(path, None)
+    return entry
+
+
+def _load_field_map_yaml(yaml_file: Optional[str] = None) -> Dict[str, Any]:
+    return _load_field_map_entry(yaml_file).mappings
+
+
 def _validate_meter_type(all_mappings: Dict[str, Any], meter_type: str) -> None:
     if meter_type not in all_mappings:
         raise ValueError(
@@ -42,43 +122,33 @@ def _validate_meter_type(all_mappings: Dict[str, Any], meter_type: str) -> None:
         )
 
 
+def get_field_map(meter_type: str, yaml_file: Optional[str] = None) -> FieldMap:
+    """Return the compiled FieldMap for meter_type, reloading only if the YAML changed.
+
+    The returned object is shared across callers — treat its dicts as read-only.
+    """
+    entry = _load_field_map_entry(yaml_file)
+    compiled = entry.compiled.get(meter_type)
+    if compiled is None:
+        _validate_meter_type(entry.mappings, meter_type)
+        compiled = FieldMap.from_mappings(entry.mappings, meter_type)
+        entry.compiled[meter_type] = compiled
+    return compiled
+
+
 def load_field_mapping(meter_type: str, yaml_file: Optional[str] = None) -> Dict[str, str]:
     """Return {object_name: standard_field_name} for the given meter type."""
-    all_mappings = _load_field_map_yaml(yaml_file)
-    _validate_meter_type(all_mappings, meter_type)
-    result = {
-        object_name: standard_field
-        for standard_field, field_data in all_mappings[meter_type].items()
-        for object_name in (field_data.get("names") or [])
-    }
-    # Also map each standard field name to itself so already-processed points
-    # still have their units corrected on a second run.
-    for standard_field in all_mappings[meter_type]:
-        if standard_field != "IGNORE":
-            result[standard_field.lower()] = standard_field
-    return result
+    return dict(get_field_map(meter_type, yaml_file).raw_to_standard)
 
 
 def load_field_dbo_units(meter_type: str, yaml_file: Optional[str] = None) -> Dict[str, str]:
     """Return {standard_field_name: dbo_unit} for the given meter type."""
-    all_mappings = _load_field_map_yaml(yaml_file)
-    _validate_meter_type(all_mappings, meter_type)
-    return {
-        standard_field: field_data.get("dbo_unit", "")
-        for standard_field, field_data in all_mappings[meter_type].items()
-        if standard_field != "IGNORE"
-    }
+    return dict(get_field_map(meter_type, yaml_file).dbo_units)
 
 
 def load_field_standard_units(meter_type: str, yaml_file: Optional[str] = None) -> Dict[str, str]:
     """Return {standard_field_name: standard_unit} for the given meter type."""
-    all_mappings = _load_field_map_yaml(yaml_file)
-    _validate_meter_type(all_mappings, meter_type)
-    return {
-        standard_field: field_data.get("standard_unit", "")
-        for standard_field, field_data in all_mappings[meter_type].items()
-        if standard_field != "IGNORE"
-    }
+    return dict(get_field_map(meter_type, yaml_file).standard_units)
 
 
 # ---------------------------------------------------------------------------
@@ -94,8 +164,10 @@ def _get_yaml_path(yaml_path: Optional[str] = None) -> str:
 
 
 def _get_standard_fields_for_meter(yaml_path: str, meter_type: str) -> List[str]:
-    with open(yaml_path, "r", encoding="utf-8") as f:
-        all_mappings = yaml.safe_load(f) or {}
+    try:
+        all_mappings = _load_field_map_yaml(yaml_path)
+    except ValueError:
+        return []
     return [k for k in all_mappings.get(meter_type, {}) if k != "IGNORE"]
 
 
@@ -146,8 +218,8 @@ def resolve_unmatched(
     if bulk == "a":
         available = _get_standard_fields_for_meter(resolved_yaml_path, meter_type)
         print(f"\nFields to add to standard_field_map.yaml:")
-        for field in sorted_unmatched:
-            print(f"  - {field}")
+        for raw in sorted_unmatched:
+            print(f"  - {raw}")
         print(f"\nFile: {resolved_yaml_path}")
         if available:
             print(f"\nAvailable standard fields for {meter_type}:")
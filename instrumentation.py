@@ -0,0 +1,229 @@
+"""
+Lightweight wall-time spans and counters for the batch hot paths.
+
+Off by default.  Enable with METER_ONBOARD_PROFILE=1 (or main.py --profile);
+set METER_ONBOARD_PROFILE_JSON=<path> (or --profile-json) to also append each
+report to that file as one JSON object per line.
+
+    with instrumentation.span("process_points"):
+        ...
+
+    @instrumentation.timed("build_udmi_dict")
+    def build_udmi_dict_from_rows(...): ...
+
+When disabled a span costs one attribute check.  Spans nest and are
+inclusive, and spans recorded on worker threads add up their own wall time,
+so stage totals can exceed the iteration's wall time.  Worker processes
+(portfolio mode, --workers) record their own stats and send a snapshot() back
+with each building; the parent merge()s them into its report.
+"""
+
+import builtins
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+ENV_VAR = "METER_ONBOARD_PROFILE"
+JSON_ENV_VAR = "METER_ONBOARD_PROFILE_JSON"
+
+
+class _State:
+    def __init__(self) -> None:
+        self.enabled = os.environ.get(ENV_VAR, "").strip().lower() not in ("", "0", "false", "no")
+        self.json_path: Optional[str] = os.environ.get(JSON_ENV_VAR) or None
+        self.lock = threading.Lock()
+        self.spans: Dict[str, list] = {}   # name -> [calls, total_s, max_s]
+        self.counters: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+
+_state = _State()
+
+
+def enable(json_path: Optional[str] = None) -> None:
+    """Turn recording on (and optionally set the JSON report file)."""
+    _state.enabled = True
+    if json_path:
+        _state.json_path = json_path
+
+
+def disable() -> None:
+    _state.enabled = False
+
+
+def is_enabled() -> bool:
+    return _state.enabled
+
+
+def reset() -> None:
+    """Drop everything recorded so far and restart the wall clock."""
+    with _state.lock:
+        _state.spans = {}
+        _state.counters = {}
+        _state.started = time.perf_counter()
+
+
+def _record(name: str, elapsed: float) -> None:
+    with _state.lock:
+        stats = _state.spans.get(name)
+        if stats is None:
+            _state.spans[name] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """Context manager that adds the wall time of its body to stage `name`."""
+    return _Span(name) if _state.enabled else _NULL_SPAN
+
+
+def timed(name: str) -> Callable:
+    """Decorator form of span()."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to counter `name` (cache hits, files written, ...)."""
+    if _state.enabled:
+        with _state.lock:
+            _state.counters[name] = _state.counters.get(name, 0) + n
+
+
+@contextmanager
+def track_prompts(name: str = "user_input") -> Iterator[None]:
+    """Time every input() call made inside the block as stage `name`."""
+    if not _state.enabled:
+        yield
+        return
+    real_input = builtins.input
+
+    def _timed_input(*args, **kwargs):
+        with span(name):
+            return real_input(*args, **kwargs)
+
+    builtins.input = _timed_input
+    try:
+        yield
+    finally:
+        builtins.input = real_input
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return the recorded stages (slowest first) and counters as plain data."""
+    with _state.lock:
+        spans = {name: list(stats) for name, stats in _state.spans.items()}
+        counters = dict(_state.counters)
+        wall = time.perf_counter() - _state.started
+    stages = [
+        {
+            "stage": name,
+            "calls": calls,
+            "total_s": round(total, 6),
+            "mean_ms": round(total / calls * 1000, 3),
+            "max_ms": round(longest * 1000, 3),
+        }
+        for name, (calls, total, longest) in sorted(spans.items(), key=lambda kv: kv[1][1], reverse=True)
+    ]
+    return {"wall_s": round(wall, 6), "stages": stages, "counters": counters}
+
+
+def merge(data: Optional[Dict[str, Any]]) -> None:
+    """Add a snapshot() taken in another process to the stats recorded here."""
+    if not data or not _state.enabled:
+        return
+    with _state.lock:
+        for s in data["stages"]:
+            longest = s["max_ms"] / 1000
+            stats = _state.spans.get(s["stage"])
+            if stats is None:
+                _state.spans[s["stage"]] = [s["calls"], s["total_s"], longest]
+            else:
+                stats[0] += s["calls"]
+                stats[1] += s["total_s"]
+                if longest > stats[2]:
+                    stats[2] = longest
+        for name, n in data["counters"].items():
+            _state.counters[name] = _state.counters.get(name, 0) + n
+
+
+def format_table(data: Dict[str, Any], title: str = "Timing") -> str:
+    lines = [f"\n--- {title} ({data['wall_s']:.2f}s wall) ---"]
+    if not data["stages"] and not data["counters"]:
+        lines.append("  (nothing recorded)")
+    if data["stages"]:
+        width = max(24, max(len(s["stage"]) for s in data["stages"]))
+        lines.append(f"  {'stage':<{width}}  {'calls':>7}  {'total s':>9}  {'mean ms':>9}  {'max ms':>9}")
+        for s in data["stages"]:
+            lines.append(
+                f"  {s['stage']:<{width}}  {s['calls']:>7}  {s['total_s']:>9.3f}  "
+                f"{s['mean_ms']:>9.2f}  {s['max_ms']:>9.2f}"
+            )
+    if data["counters"]:
+        lines.append("  counters: " + ", ".join(f"{k}={v}" for k, v in sorted(data["counters"].items())))
+    return "\n".join(lines)
+
+
+def report(title: str = "Timing", log=print, **extra) -> Optional[Dict[str, Any]]:
+    """Print the table (and append it to the JSON file if set), then reset.
+
+    Does nothing and returns None while recording is disabled.
+    """
+    if not _state.enabled:
+        return None
+    data = snapshot()
+    log(format_table(data, title))
+    if _state.json_path:
+        record = {"title": title, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), **extra, **data}
+        try:
+            with open(_state.json_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(record) + "\n")
+        except OSError as e:
+            log(f"Could not write timing report to {_state.json_path}: {e}")
+    reset()
+    return data
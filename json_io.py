@@ -0,0 +1,45 @@
+"""
+Shared JSON write helper.
+
+Device metadata.json files and the per-building onboard_state.json manifest
+are both written through write_json_if_changed, so an unchanged file keeps its
+mtime and an interrupted write never leaves a truncated one.
+"""
+
+import json
+import os
+import stat
+from typing import Any
+
+
+def write_json_if_changed(file_path: str, data: Any) -> bool:
+    """Write data as indent=2 JSON unless file_path already holds exactly those bytes.
+
+    The new content goes to a temp file in the same folder and is moved into
+    place with os.replace, so an interrupted write never leaves a truncated
+    file.  The existing file's permissions are kept.  Returns True if written.
+    """
+    text = json.dumps(data, indent=2)
+    expected = text.replace("\n", os.linesep).encode("utf-8")  # what text-mode "w" produces
+    try:
+        with open(file_path, "rb") as f:
+            if f.read() == expected:
+                return False
+        mode = stat.S_IMODE(os.stat(file_path).st_mode)
+    except FileNotFoundError:
+        mode = None
+
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        if mode is not None:
+            os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
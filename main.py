@@ -1,8 +1,10 @@
-import udmi_script
-import site_model_editor
-import building_batch
-import onboard_config_updates
-import export_building_config
+import argparse
+import sys
+
+import instrumentation
+
+# Flow modules (and through them pandas / PyYAML) are imported on selection,
+# so the menu appears without paying for flows that are never used.
 
 def show_menu() -> str:
     print("\n=== Meter Onboard Tool ===")
@@ -20,32 +22,130 @@ def show_menu() -> str:
     print("     Export building config, build meter data, and produce ADD/UPDATE files in one pass")
     print("  6. Onboard Updated Configs")
     print("     Submit ADD/UPDATE YAML files via stubby commands")
+    print("  7. Portfolio Site Model Editor")
+    print("     Normalize point names and fix units for every building under the site_models directory")
     while True:
-        choice = input("\nSelect an option (1-6): ").strip()
-        if choice in ("1", "2", "3", "4", "5", "6"):
+        choice = input("\nSelect an option (1-7): ").strip()
+        if choice in ("1", "2", "3", "4", "5", "6", "7"):
             return choice
-        print("Invalid selection. Please enter 1-6.")
+        print("Invalid selection. Please enter 1-7.")
 
 def run_loop() -> None:
     while True:
         choice = show_menu()
-        if choice == "1":
-            udmi_script.run_udmi()
-        elif choice == "2":
-            site_model_editor.run_site_model_editor()
-        elif choice == "3":
-            export_building_config.run_export_single()
-        elif choice == "4":
-            building_batch.run_building_batch()
-        elif choice == "5":
-            building_batch.run_export_batch()
-        elif choice == "6":
-            onboard_config_updates.run_onboard_updates()
+        instrumentation.reset()
+        with instrumentation.track_prompts():
+            if choice == "1":
+                import udmi_script
+                udmi_script.run_udmi()
+            elif choice == "2":
+                import site_model_editor
+                site_model_editor.run_site_model_editor()
+            elif choice == "3":
+                import export_building_config
+                export_building_config.run_export_single()
+            elif choice == "4":
+                import building_batch
+                building_batch.run_building_batch()
+            elif choice == "5":
+                import building_batch
+                building_batch.run_export_batch()
+            elif choice == "6":
+                import onboard_config_updates
+                onboard_config_updates.run_onboard_updates()
+            elif choice == "7":
+                import batch_pipeline
+                batch_pipeline.run_portfolio()
+        instrumentation.report(f"Timing for option {choice}", option=choice)
 
         again = input("\nRun again? (y/n): ").strip().lower()
         if again != "y":
             print("Goodbye!")
             break
 
-if __name__ == "__main__":
+def run_headless_cli(args: argparse.Namespace) -> int:
+    """Run the unattended pipeline from --plan / --site-models-dir. Returns the exit code."""
+    import batch_pipeline
+
+    try:
+        policy = batch_pipeline.load_plan(args.plan) if args.plan else batch_pipeline.PipelinePolicy()
+        if args.site_models_dir:
+            policy.site_models_dir = args.site_models_dir
+        if args.report:
+            policy.report = args.report
+        if args.portfolio:
+            policy = batch_pipeline.portfolio_policy(policy, args.workers)
+        elif args.workers is not None:
+            policy.workers = args.workers
+        if args.force_refresh:
+            policy.export_cache_ttl = 0
+        elif args.export_cache_ttl is not None:
+            policy.export_cache_ttl = args.export_cache_ttl
+        report = batch_pipeline.run_headless(policy)
+    except (OSError, ValueError) as e:
+        print(f"Headless run failed: {e}")
+        return 2
+    finally:
+        instrumentation.report("Timing for unattended run")
+    return 1 if report["summary"]["errors"] else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Meter Onboard Tool")
+    parser.add_argument(
+        "--plan",
+        help="run the site-model -> ADD/UPDATE pipeline unattended, driven by a YAML/JSON plan file",
+    )
+    parser.add_argument(
+        "--site-models-dir",
+        help="run unattended with the default policy on this site_models directory "
+             "(overrides site_models_dir in --plan)",
+    )
+    parser.add_argument("--report", help="path for the JSON report written by an unattended run")
+    parser.add_argument(
+        "--portfolio", action="store_true",
+        help="with --site-models-dir/--plan: only normalize points (option 4) for every building, in parallel",
+    )
+    parser.add_argument("--workers", type=int, help="buildings processed in parallel worker processes")
+    parser.add_argument(
+        "--force-refresh", action="store_true",
+        help="always pull live building configs instead of reusing a recent cached export",
+    )
+    parser.add_argument(
+        "--export-cache-ttl", type=float, metavar="SECONDS",
+        help="reuse a cached building config export younger than this (default 600s)",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help=f"print per-stage wall times after each run (same as {instrumentation.ENV_VAR}=1)",
+    )
+    parser.add_argument(
+        "--profile-json", metavar="PATH",
+        help="with --profile: also append each timing report to PATH as a JSON line",
+    )
+    args = parser.parse_args(argv)
+
+    if args.profile or args.profile_json:
+        instrumentation.enable(args.profile_json)
+    if args.export_cache_ttl is not None or args.force_refresh:
+        import export_building_config
+        if args.export_cache_ttl is not None:
+            export_building_config.EXPORT_CACHE_TTL_S = args.export_cache_ttl
+        if args.force_refresh:
+            export_building_config.EXPORT_CACHE_TTL_S = 0
+
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.portfolio and not (args.plan or args.site_models_dir):
+        import building_batch
+        args.site_models_dir = building_batch.load_site_models_dir()
+        if not args.site_models_dir:
+            parser.error("--portfolio needs --site-models-dir (no saved site_models directory)")
+    if args.plan or args.site_models_dir:
+        return run_headless_cli(args)
     run_loop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
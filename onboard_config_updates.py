@@ -2,10 +2,26 @@ import subprocess
 import re
 import os
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import yaml
+from export_building_config import export_building_config, invalidate_export_cache
+from building_config_updater import BuildingConfigIndex
+import instrumentation
+import yaml_io
+from operation_poller import (
+    OperationTimeout,
+    file_signature,
+    is_running,
+    poll_operation,
+    read_fresh_outfile,
+)
 
-from export_building_config import export_building_config
+# Overall time budget for one onboard's GetOperation polling, in seconds.
+# None keeps polling for as long as the operation reports "running".
+ONBOARD_DEADLINE_S = None
+
+# Upper bound on buildings onboarded concurrently by run_onboard_updates
+MAX_ONBOARD_WORKERS = 4
 
 
 # ----------------------------
@@ -14,9 +30,7 @@ from export_building_config import export_building_config
 
 def _write_yaml_sections(path: str, doc: dict) -> None:
     """Write a flat dict to file as separate YAML sections, one per top-level key."""
-    parts = [yaml.dump({k: v}, sort_keys=False, default_flow_style=False) for k, v in doc.items()]
-    with open(path, "w", encoding="utf-8") as fh:
-        fh.write("\n".join(parts))
+    yaml_io.write_sections(path, doc)
 
 
 def _reconcile_with_fresh_bc(updates_dir: str) -> None:
@@ -51,11 +65,10 @@ def _reconcile_with_fresh_bc(updates_dir: str) -> None:
     for bc_code in building_codes:
         fresh_path = os.path.join(updates_dir, f"_fresh_bc_{bc_code}.yaml")
         try:
-            export_building_config(bc_code, fresh_path)
-            with open(fresh_path, encoding="utf-8") as fh:
-                bc = yaml.safe_load(fh)
+            export_building_config(bc_code, fresh_path, force_refresh=True)
+            bc = yaml_io.load_file(fresh_path)
             if isinstance(bc, dict):
-                fresh_bc_by_code[bc_code] = bc
+                fresh_bc_by_code[bc_code] = BuildingConfigIndex(bc)
         except Exception as e:
             print(f"  Could not pull fresh BC for {bc_code}: {e}")
         finally:
@@ -77,8 +90,7 @@ def _reconcile_with_fresh_bc(updates_dir: str) -> None:
             continue
 
         try:
-            with open(path, encoding="utf-8") as fh:
-                doc = yaml.safe_load(fh)
+            doc = yaml_io.load_file(path)
         except Exception:
             continue
         if not isinstance(doc, dict):
@@ -99,13 +111,8 @@ def _reconcile_with_fresh_bc(updates_dir: str) -> None:
             continue
 
         # Find corresponding entries in the fresh BC
-        fresh_building_data = next(
-            (v for k, v in fresh_bc.items()
-             if k != "CONFIG_METADATA" and isinstance(v, dict)
-             and v.get("type") == "FACILITIES/BUILDING"),
-            {}
-        )
-        fresh_meter_data = fresh_bc.get(meter_guid)
+        fresh_building_data = fresh_bc.building[1] if fresh_bc.building else {}
+        fresh_meter_data = fresh_bc.config.get(meter_guid)
 
         if filename.endswith("_add.yaml") and fresh_meter_data:
             # ADD succeeded — meter now exists in BC; convert file to UPDATE
@@ -141,12 +148,19 @@ def _reconcile_with_fresh_bc(updates_dir: str) -> None:
         input("\nPress Enter to continue with onboarding... ")
 
 
-def run_onboard_and_get_status(building_code, topology_file_path, result_file_path):
+@instrumentation.timed("run_onboard_and_get_status")
+def run_onboard_and_get_status(building_code, topology_file_path, result_file_path, deadline=ONBOARD_DEADLINE_S, log=print):
+    """Submit one topology file via OnboardBuilding and poll GetOperation until it finishes.
+
+    Returns True if the operation reports success. deadline bounds the polling in
+    seconds (None waits for as long as the operation keeps running); log receives
+    progress messages (defaults to print).
+    """
     try:
         _, city_code, building_code_part = building_code.split("-", 2)
     except ValueError:
-        print("Invalid building code format. Expected: US-XXX-YYY")
-        print("\a")  # Chime for failure
+        log("Invalid building code format. Expected: US-XXX-YYY")
+        log("\a")  # Chime for failure
         return False
 
     city_code = city_code.lower()
@@ -165,14 +179,15 @@ def run_onboard_and_get_status(building_code, topology_file_path, result_file_pa
         "--set_field",
         f"topology_file=readfile({topology_file_path})"
     ]
-    print("Running onboarding command...")
-    onboard_result = subprocess.run(onboard_args, capture_output=True, text=True)
+    log("Running onboarding command...")
+    with instrumentation.span("stubby"):
+        onboard_result = subprocess.run(onboard_args, capture_output=True, text=True)
     if onboard_result.returncode != 0:
-        print("OnboardBuilding failed (return code != 0):")
-        print(onboard_result.stderr.strip())
+        log("OnboardBuilding failed (return code != 0):")
+        log(onboard_result.stderr.strip())
         if onboard_result.stdout:
-            print("Onboard stdout:\n", onboard_result.stdout)
-        print("\a")
+            log("Onboard stdout:\n " + onboard_result.stdout)
+        log("\a")
         return False
 
     onboard_combined = (onboard_result.stdout or "") + "\n" + (onboard_result.stderr or "")
@@ -181,10 +196,10 @@ def run_onboard_and_get_status(building_code, topology_file_path, result_file_pa
     if not match:
         match = re.search(r'name:\s*(projects/\S+)', onboard_combined)
     if not match:
-        print("Failed to extract operation name from OnboardBuilding output.")
-        print("Raw OnboardBuilding output:")
-        print(onboard_combined.strip()[:1000] or "(empty)")
-        print("\a")
+        log("Failed to extract operation name from OnboardBuilding output.")
+        log("Raw OnboardBuilding output:")
+        log(onboard_combined.strip()[:1000] or "(empty)")
+        log("\a")
         return False
 
     operation_name = match.group(1)
@@ -201,47 +216,87 @@ def run_onboard_and_get_status(building_code, topology_file_path, result_file_pa
         f"name: 'projects/digitalbuildings/countries/us/cities/{city_code}/buildings/{building_code_part}', profile:'projects/digitalbuildings/profiles/MaintenanceOps', operation_name: '{operation_name}'"
     ]
 
-    time.sleep(10)
-    check_count = 1
-    while True:
-        print(f"Checking operation status (attempt {check_count})...")
-        get_op_result = subprocess.run(get_op_args, capture_output=True, text=True)
+    baseline = file_signature(result_file_path)
+
+    def _check(attempt):
+        log(f"Checking operation status (attempt {attempt})...")
+        with instrumentation.span("stubby"):
+            get_op_result = subprocess.run(get_op_args, capture_output=True, text=True)
 
         file_content = ""
         try:
-            if os.path.exists(result_file_path):
-                with open(result_file_path, "r", encoding="utf-8", errors="ignore") as fh:
-                    file_content = fh.read()
+            file_content = read_fresh_outfile(result_file_path, get_op_result.returncode, baseline)
         except Exception as e:
-            print(f"Warning: couldn't read {result_file_path}: {e}")
+            log(f"Warning: couldn't read {result_file_path}: {e}")
 
         combined_out = file_content.strip() or ((get_op_result.stdout or "") + "\n" + (get_op_result.stderr or ""))
         combined_out = combined_out.strip()
 
         if get_op_result.returncode != 0:
-            print("Warning: GetOperation returned non-zero exit code:", get_op_result.returncode)
+            log(f"Warning: GetOperation returned non-zero exit code: {get_op_result.returncode}")
             if get_op_result.stderr:
-                print("GetOperation stderr:\n", get_op_result.stderr.strip())
+                log("GetOperation stderr:\n " + get_op_result.stderr.strip())
 
-        if re.search(r"\brunning\b", combined_out, re.I):
-            if check_count <= 3:
-                wait_time = 10
-            elif check_count <= 6:
-                wait_time = 30
-            else:
-                wait_time = 60
-            print(f"Operation still running — will retry in {wait_time} seconds")
-            time.sleep(wait_time)
-            check_count += 1
-            continue
+        if is_running(combined_out):
+            log("Operation still running.")
+            return False, None
+        return True, combined_out
 
-        if "Successfully completed onboard operation." not in combined_out:
-            print("Config onboarding failed.")
-            print("\a")
-            return False
-        else:
-            print("Config onboarding succeeded.")
-        return True
+    try:
+        with instrumentation.span("run_onboard_and_get_status.poll"):
+            combined_out = poll_operation(
+                _check,
+                deadline=deadline,
+                on_wait=lambda delay: log(f"Will retry in {delay:.1f} seconds"),
+            )
+    except OperationTimeout as e:
+        log(f"Config onboarding did not finish: {e}")
+        log("\a")
+        return False
+
+    if "Successfully completed onboard operation." not in combined_out:
+        log("Config onboarding failed.")
+        log("\a")
+        return False
+    log("Config onboarding succeeded.")
+    return True
+
+
+def _onboard_building_files(building_code: str, jobs: list, log=print) -> None:
+    """Onboard one building's files strictly in order (each UPDATE depends on the previous etag)."""
+    for filename, cfg_path, result_file in jobs:
+        log(f"--- Processing: {filename} ({building_code}) ---")
+        try:
+            run_onboard_and_get_status(building_code, cfg_path, result_file, log=log)
+        except Exception as e:  # e.g. stubby missing; the summary reports the file as failed
+            log(f"Onboarding {filename} raised: {e}")
+    # The building's live config changed, so a cached export of it is stale now
+    invalidate_export_cache(building_code)
+
+
+def _run_onboard_jobs(jobs_by_building: dict, max_workers: int = MAX_ONBOARD_WORKERS) -> None:
+    """Run each building's job list on its own worker, at most max_workers buildings at once."""
+    if not jobs_by_building:
+        return
+    if len(jobs_by_building) == 1 or max_workers <= 1:
+        for building_code, jobs in jobs_by_building.items():
+            print()
+            _onboard_building_files(building_code, jobs)
+        return
+
+    def _log_for(code):
+        return lambda msg: print(f"  [{code}] {msg}", flush=True)
+
+    workers = min(max_workers, len(jobs_by_building))
+    print(f"\nOnboarding {len(jobs_by_building)} building(s), up to {workers} at a time...")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_onboard_building_files, code, jobs, _log_for(code)): code
+            for code, jobs in jobs_by_building.items()
+        }
+        for future in as_completed(futures):
+            future.result()
+            print(f"--- {futures[future]}: all files submitted ---")
 
 
 def analyze_results(result_files):
@@ -282,8 +337,12 @@ def analyze_results(result_files):
 # ----------------------------
 # Main entry point
 # ----------------------------
-def run_onboard_updates(input_dir: str | None = None) -> None:
-    """Option 7: submit _add.yaml and _update.yaml files to the OnboardBuilding API."""
+def run_onboard_updates(input_dir: str | None = None, max_workers: int = MAX_ONBOARD_WORKERS) -> None:
+    """Option 7: submit _add.yaml and _update.yaml files to the OnboardBuilding API.
+
+    Different buildings are onboarded concurrently (up to max_workers at a time);
+    files for the same building run one after another because their etags chain.
+    """
     if input_dir is None:
         while True:
             raw = input(
@@ -323,6 +382,7 @@ def run_onboard_updates(input_dir: str | None = None) -> None:
     os.makedirs(results_dir, exist_ok=True)
 
     result_files = []
+    jobs_by_building: dict = {}
     for filename in update_files:
         cfg_path = os.path.join(updates_dir, filename)
 
@@ -346,8 +406,8 @@ def run_onboard_updates(input_dir: str | None = None) -> None:
             except Exception as e:
                 print(f"Warning: couldn't read {result_file}: {e}")
 
-        print(f"\n--- Processing: {filename} ({building_code}) ---")
-        run_onboard_and_get_status(building_code, cfg_path, result_file)
+        jobs_by_building.setdefault(building_code, []).append((filename, cfg_path, result_file))
         result_files.append((result_file, cfg_path, False))
 
+    _run_onboard_jobs(jobs_by_building, max_workers)
     analyze_results(result_files)
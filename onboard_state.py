@@ -0,0 +1,112 @@
+"""
+Per-building state manifest for incremental re-processing.
+
+meter_onboarding/<building>/onboard_state.json remembers, for every device a
+batch step finished, the content hashes of what the step read and what it
+wrote:
+
+    {"version": 1,
+     "devices": {"PVI-1": {
+        "normalize": {"inputs": {...}, "outputs": {...}},
+        "export":    {"inputs": {...}, "outputs": {...}}}}}
+
+inputs hold the sha256 of the device's metadata.json, of the two mapping
+files and of everything else the step depends on (discovery num_id, building
+config entries, plan options).  outputs hold what the step derived — point
+counts, dbo_name, chosen type, the ADD/UPDATE file and its hash.  A rerun
+skips a device when its inputs hash the same and every output file is still
+on disk unchanged.  Delete onboard_state.json to force a full rebuild.
+"""
+
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from json_io import write_json_if_changed
+
+STATE_FILE_NAME = "onboard_state.json"
+STATE_VERSION = 1
+
+_MAPPINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings")
+MAPPING_FILES = ("standard_field_map.yaml", "canodical_type_map.yaml")
+
+
+def file_digest(path: str) -> Optional[str]:
+    """sha256 of the file's bytes, or None if it cannot be read."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def value_digest(value: Any) -> str:
+    """sha256 of value as canonical JSON (sorted keys)."""
+    text = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def mapping_digests() -> Dict[str, Optional[str]]:
+    """Hashes of standard_field_map.yaml and canodical_type_map.yaml."""
+    return {name: file_digest(os.path.join(_MAPPINGS_DIR, name)) for name in MAPPING_FILES}
+
+
+def step_inputs(metadata_path: str, context: Any = None) -> Dict[str, Any]:
+    """Input hashes for one device step: its metadata.json, the mapping files and context."""
+    return {
+        "metadata": file_digest(metadata_path),
+        "mappings": mapping_digests(),
+        "context": value_digest(context),
+    }
+
+
+class BuildingState:
+    """onboard_state.json for one meter_onboarding/<building> folder."""
+
+    def __init__(self, work_dir: str, devices: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.path = os.path.join(work_dir, STATE_FILE_NAME)
+        self.devices: Dict[str, Dict[str, Any]] = devices or {}
+
+    @classmethod
+    def load(cls, work_dir: str) -> "BuildingState":
+        """Read the manifest; a missing, unreadable or outdated one starts empty."""
+        state = cls(work_dir)
+        try:
+            with open(state.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return state
+        if isinstance(data, dict) and data.get("version") == STATE_VERSION and isinstance(data.get("devices"), dict):
+            state.devices = data["devices"]
+        return state
+
+    def current(self, folder: str, step: str, inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the recorded outputs of step if nothing it depends on has changed, else None."""
+        record = self.devices.get(folder, {}).get(step)
+        if not record or record.get("inputs") != inputs:
+            return None
+        outputs = record.get("outputs") or {}
+        output_file = outputs.get("output_file")
+        if output_file and file_digest(output_file) != outputs.get("output_digest"):
+            return None
+        return outputs
+
+    def recorded(self, folder: str, step: str) -> Dict[str, Any]:
+        """The outputs last recorded for step, current or not ({} if none)."""
+        return (self.devices.get(folder, {}).get(step) or {}).get("outputs") or {}
+
+    def record(self, folder: str, step: str, inputs: Dict[str, Any], outputs: Dict[str, Any]) -> None:
+        """Remember a finished step; output_file, if set, is hashed now."""
+        outputs = dict(outputs)
+        if outputs.get("output_file"):
+            outputs["output_digest"] = file_digest(outputs["output_file"])
+        self.devices.setdefault(folder, {})[step] = {"inputs": inputs, "outputs": outputs}
+
+    def save(self) -> bool:
+        """Write the manifest if it changed. Returns True if written."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return write_json_if_changed(self.path, {"version": STATE_VERSION, "devices": self.devices})
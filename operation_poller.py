@@ -0,0 +1,100 @@
+import os
+import random
+import re
+import time
+
+# Backoff defaults shared by the export and onboard GetOperation loops.
+# The first check happens after INITIAL_DELAY_S; each later wait is
+# BACKOFF_FACTOR times longer (capped at MAX_DELAY_S) with +/-JITTER spread.
+INITIAL_DELAY_S = 0.5
+BACKOFF_FACTOR = 2.0
+MAX_DELAY_S = 30.0
+JITTER = 0.2
+
+_RUNNING_RE = re.compile(r"\brunning\b", re.I)
+
+
+class OperationTimeout(RuntimeError):
+    """Raised when an operation is still running at the poll deadline."""
+
+
+def backoff_delays(
+    initial=INITIAL_DELAY_S,
+    factor=BACKOFF_FACTOR,
+    max_delay=MAX_DELAY_S,
+    jitter=JITTER,
+    rng=random,
+):
+    """Yield an endless sequence of jittered, exponentially growing delays in seconds."""
+    delay = initial
+    while True:
+        spread = delay * jitter
+        yield max(0.0, delay + rng.uniform(-spread, spread))
+        delay = min(delay * factor, max_delay)
+
+
+def poll_operation(check, deadline=None, on_wait=None, delays=None, sleep=None, clock=None):
+    """Call check(attempt) with backoff until it reports completion.
+
+    check returns (done, value); the first value with done=True is returned.
+    deadline is the overall budget in seconds (None waits indefinitely); the
+    final wait is shortened so the last check lands on the deadline.
+    on_wait(delay) is called before every wait after a not-done check.
+
+    Raises OperationTimeout if the operation is still running at the deadline.
+    """
+    sleep = sleep or time.sleep
+    clock = clock or time.monotonic
+    delays = iter(delays if delays is not None else backoff_delays())
+    start = clock()
+
+    def _next_delay():
+        delay = next(delays)
+        if deadline is not None:
+            delay = min(delay, max(0.0, start + deadline - clock()))
+        return delay
+
+    attempt = 0
+    delay = _next_delay()
+    while True:
+        sleep(delay)
+        attempt += 1
+        done, value = check(attempt)
+        if done:
+            return value
+        if deadline is not None and clock() - start >= deadline:
+            raise OperationTimeout(
+                f"operation still running after {attempt} check(s) and {deadline:g}s"
+            )
+        delay = _next_delay()
+        if on_wait is not None:
+            on_wait(delay)
+
+
+def file_signature(path):
+    """Return (mtime_ns, size) for path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def read_fresh_outfile(path, returncode, baseline_signature):
+    """Return the text GetOperation wrote to path on this poll, or "" if it is stale.
+
+    The outfile is trusted when the call succeeded or the file changed since
+    polling began, so leftovers from an earlier run are never mistaken for a result.
+    """
+    if returncode != 0 and file_signature(path) == baseline_signature:
+        return ""
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as fh:
+            return fh.read()
+    except FileNotFoundError:
+        return ""
+
+
+def is_running(output):
+    """True if GetOperation output reports the operation as still running."""
+    return bool(_RUNNING_RE.search(output))
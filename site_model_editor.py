@@ -1,11 +1,15 @@
+import functools
 import json
 import os
 import re
-from typing import Dict, Any, Tuple, List, Optional, Set
+from typing import TYPE_CHECKING, Dict, Any, Tuple, List, Optional, Set
 
-import pandas as pd
+from field_map_utils import get_field_map, load_field_dbo_units, resolve_unmatched
+import instrumentation
+from translation_builder_udmi import TranslationRow, rows_to_dataframe
 
-from field_map_utils import load_field_mapping, load_field_dbo_units, resolve_unmatched
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 def load_site_model(file_path: str) -> Dict[str, Any]:
@@ -25,10 +29,10 @@ def validate_site_model(parsed: Dict[str, Any]) -> bool:
 
 def build_case_insensitive_field_map(meter_type: str) -> Dict[str, str]:
     """Load field map and return {raw_name_lower: standard_field_name}."""
-    field_map = load_field_mapping(meter_type)
-    return {k.lower(): v for k, v in field_map.items()}
+    return dict(get_field_map(meter_type).ci_raw_to_standard)
 
 
+@instrumentation.timed("process_points")
 def process_points(
     points: Dict[str, Any],
     ci_field_map: Dict[str, str],
@@ -117,27 +121,39 @@ def add_missing_points(asset_name: str, pre_add: Optional[List[str]] = None) ->
     return all_missing
 
 
-def build_translation_dataframe(
+def build_translation_rows(
     updated_points: Dict[str, Any],
     field_standard_units: Dict[str, str],
     asset_name: str,
     general_type: str,
     type_name: str,
-) -> pd.DataFrame:
+) -> List[TranslationRow]:
     rows = []
     for field_name, point_data in updated_points.items():
         dbo_unit = point_data.get("units", "")
         standard_unit = field_standard_units.get(field_name, dbo_unit)
-        rows.append({
-            "assetName": asset_name,
-            "object_name": field_name,
-            "standardFieldName": field_name,
-            "raw_units": standard_unit,
-            "DBO_standard_units": dbo_unit,
-            "generalType": general_type,
-            "typeName": type_name,
-        })
-    return pd.DataFrame(rows)
+        rows.append(TranslationRow(
+            assetName=asset_name,
+            object_name=field_name,
+            standardFieldName=field_name,
+            raw_units=standard_unit,
+            DBO_standard_units=dbo_unit,
+            generalType=general_type,
+            typeName=type_name,
+        ))
+    return rows
+
+
+def build_translation_dataframe(
+    updated_points: Dict[str, Any],
+    field_standard_units: Dict[str, str],
+    asset_name: str,
+    general_type: str,
+    type_name: str,
+) -> "pd.DataFrame":
+    return rows_to_dataframe(build_translation_rows(
+        updated_points, field_standard_units, asset_name, general_type, type_name
+    ))
 
 
 def save_updated_json(
@@ -163,6 +179,15 @@ def save_updated_json(
         print(f"Failed to save file: {e}")
 
 
+# Segments of the BACnet network prefix stripped by _strip_and_deduplicate()
+_NET_CODE_RE = re.compile(r'^[A-Z]{2,5}$')
+_CHANNEL_RE = re.compile(r'^[A-Z][A-Za-z]*\d+$')
+_DEV_ADDRESS_RE = re.compile(r'^\d+$')
+
+# Any ref that starts with a network code, e.g. "DP_" (single-ref fallback)
+_NET_CODE_PREFIX_RE = re.compile(r'^[A-Z]{2,5}_')
+
+
 def _strip_and_deduplicate(device_str: str) -> Optional[str]:
     """
     Strip BACnet network prefix from device_str, then deduplicate if the device
@@ -188,16 +213,16 @@ def _strip_and_deduplicate(device_str: str) -> Optional[str]:
     """
     parts = device_str.split("_")
     i = 0
-    if i < len(parts) - 1 and re.match(r'^[A-Z]{2,5}$', parts[i]):
+    if i < len(parts) - 1 and _NET_CODE_RE.match(parts[i]):
         i += 1
-        if i < len(parts) - 1 and re.match(r'^[A-Z][A-Za-z]*\d+$', parts[i]):
+        if i < len(parts) - 1 and _CHANNEL_RE.match(parts[i]):
             i += 1
 
     # Strip optional Modbus device-address keyword + numeric address (e.g. dev_100)
     # The type-instance that follows (e.g. EM-1) is part of the meter name — do not strip it
     if i < len(parts) - 1 and parts[i].lower() == "dev":
         i += 1  # skip "dev"
-        if i < len(parts) - 1 and re.match(r'^\d+$', parts[i]):
+        if i < len(parts) - 1 and _DEV_ADDRESS_RE.match(parts[i]):
             i += 1  # skip numeric address (e.g. "100")
 
     remaining_parts = parts[i:]
@@ -235,6 +260,12 @@ _ANY_PREFIX_RE = re.compile(
 _GATEWAY_SEGMENT_RE = re.compile(r'^[A-Z][a-z]+[A-Z][a-zA-Z0-9]*$')
 
 
+# Distinct device strings whose derived names are kept.  Every ref on a meter
+# shares one device string, so a few thousand entries cover a large building.
+DERIVATION_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=DERIVATION_CACHE_SIZE)
 def _strip_prefix(device_str: str) -> Optional[str]:
     """
     Extended prefix stripper.  Calls _strip_and_deduplicate() then removes an
@@ -243,6 +274,9 @@ def _strip_prefix(device_str: str) -> Optional[str]:
     Handles DP_Comm0_DataNab_{meter_name}:
       _strip_and_deduplicate  -> "DataNab_MAIN_Meter"
       gateway strip           -> "MAIN_Meter"
+
+    Results are memoized per device_str (LRU, DERIVATION_CACHE_SIZE entries);
+    see derivation_cache_stats().
     """
     result = _strip_and_deduplicate(device_str)
     if result is None:
@@ -254,6 +288,16 @@ def _strip_prefix(device_str: str) -> Optional[str]:
     return result
 
 
+def derivation_cache_stats() -> Dict[str, int]:
+    """Return hits, misses, maxsize and currsize of the device-name derivation cache."""
+    return _strip_prefix.cache_info()._asdict()
+
+
+def clear_derivation_cache() -> None:
+    """Drop all memoized device-name derivations and reset their stats."""
+    _strip_prefix.cache_clear()
+
+
 def _build_raw_lookup(meter_type: str):
     """
     Return (non_ignore_suffixes, ignore_key_set) built from the field map.
@@ -264,7 +308,7 @@ def _build_raw_lookup(meter_type: str):
                          used to skip irrelevant points.
     """
     try:
-        field_map = load_field_mapping(meter_type)
+        field_map = get_field_map(meter_type).raw_to_standard
     except Exception:
         return [], set()
 
@@ -279,6 +323,114 @@ def _build_raw_lookup(meter_type: str):
     return sorted(non_ignore, key=len, reverse=True), ignore_set
 
 
+class SuffixMatcher:
+    """
+    Reversed trie over lowercased raw names, equivalent to trying
+    re.search(r"_" + re.escape(raw) + r"(_\d+)?$", ref, re.IGNORECASE) for every
+    raw name longest-first — but in one pass over the tail of the ref.
+
+    A raw name can end at one of two anchors: the end of the ref, or just before
+    a trailing "_<digits>" index (e.g. the "_01" in ..._kW_01).  Both anchors are
+    walked backwards through the trie; every terminal node preceded by "_" in the
+    ref is a candidate and the longest one wins.
+    """
+
+    __slots__ = ("_root",)
+
+    _END = ""  # child key marking "a raw name ends here"; never a real character
+
+    def __init__(self, suffixes) -> None:
+        self._root: Dict[str, Any] = {}
+        for raw in suffixes:
+            raw = raw.lower()
+            if not raw:
+                continue
+            node = self._root
+            for ch in reversed(raw):
+                node = node.setdefault(ch, {})
+            node[self._END] = len(raw)
+
+    def _longest_at(self, text: str, anchor: int) -> int:
+        """Return the length of the longest raw name ending at text[anchor] and preceded by '_', or 0."""
+        best = 0
+        node = self._root
+        i = anchor
+        while i > 0:
+            node = node.get(text[i - 1])
+            if node is None:
+                break
+            i -= 1
+            if self._END in node and i > 0 and text[i - 1] == "_":
+                best = node[self._END]
+        return best
+
+    def match_start(self, ref: str) -> Optional[int]:
+        """Return the index of the '_' that starts the matched suffix, or None if nothing matched."""
+        text = ref.lower()
+        if len(text) != len(ref):
+            return self._match_start_regex(ref)
+        # "$" also matches just before a single trailing newline.
+        end = len(text) - 1 if text.endswith("\n") else len(text)
+
+        candidates = []
+        n = self._longest_at(text, end)
+        if n:
+            candidates.append((n, end - n - 1))
+        sep = text.rfind("_", 0, end)
+        if sep != -1 and sep < end - 1 and text[sep + 1:end].isdecimal():
+            n = self._longest_at(text, sep)
+            if n:
+                candidates.append((n, sep - n - 1))
+        if not candidates:
+            return None
+        # Longest raw name wins; on equal length the regex's leftmost match wins.
+        return max(candidates, key=lambda c: (c[0], -c[1]))[1]
+
+    def _match_start_regex(self, ref: str) -> Optional[int]:
+        # Case-folding changed the string length (rare non-ASCII input), so
+        # positions in ref.lower() no longer line up — use the regex scan.
+        for raw in self.suffixes():
+            m = re.search(r"_" + re.escape(raw) + r"(_\d+)?$", ref, re.IGNORECASE)
+            if m:
+                return m.start()
+        return None
+
+    def suffixes(self) -> List[str]:
+        """Return the raw names in the trie, longest first."""
+        found: List[str] = []
+        stack = [(self._root, "")]
+        while stack:
+            node, rev = stack.pop()
+            for ch, child in node.items():
+                if ch == self._END:
+                    found.append(rev[::-1])
+                else:
+                    stack.append((child, rev + ch))
+        return sorted(found, key=len, reverse=True)
+
+
+# meter_type -> (FieldMap the matcher was built from, matcher, ignore keys)
+_SUFFIX_MATCHERS: Dict[str, Tuple[Any, SuffixMatcher, Set[str]]] = {}
+
+
+def get_suffix_matcher(meter_type: str) -> Tuple[SuffixMatcher, Set[str]]:
+    """
+    Return (matcher, ignore_key_set) for meter_type, built once from _build_raw_lookup()
+    and rebuilt whenever the underlying field map is reloaded.
+    """
+    try:
+        field_map = get_field_map(meter_type)
+    except Exception:
+        return SuffixMatcher([]), set()
+    cached = _SUFFIX_MATCHERS.get(meter_type)
+    if cached is not None and cached[0] is field_map:
+        return cached[1], cached[2]
+    raw_suffixes, ignore_keys = _build_raw_lookup(meter_type)
+    matcher = SuffixMatcher(raw_suffixes)
+    _SUFFIX_MATCHERS[meter_type] = (field_map, matcher, ignore_keys)
+    return matcher, ignore_keys
+
+
 def extract_asset_name_from_refs(points: Dict[str, Any], meter_type: str) -> Optional[str]:
     """
     Extract meter device name by matching known field-map raw names against ref suffixes.
@@ -298,7 +450,7 @@ def extract_asset_name_from_refs(points: Dict[str, Any], meter_type: str) -> Opt
          This correctly handles numbered sub-points (kW_01..42, kWh_01..42 → IDF1_2Raw01)
          as well as single-point devices where the full remainder IS the device name.
     """
-    raw_suffixes, ignore_keys = _build_raw_lookup(meter_type)
+    matcher, ignore_keys = get_suffix_matcher(meter_type)
 
     candidates: Dict[str, int] = {}
     fallback_remainders: List[str] = []
@@ -313,18 +465,13 @@ def extract_asset_name_from_refs(points: Dict[str, Any], meter_type: str) -> Opt
             continue
 
         # 2. Match a known raw suffix against the full ref.
-        #    Regex allows an optional trailing _\d+ so refs like _kW_01 match.
-        matched = False
-        for raw in raw_suffixes:
-            pattern = r"_" + re.escape(raw) + r"(_\d+)?$"
-            m = re.search(pattern, ref, re.IGNORECASE)
-            if m:
-                device_str = ref[: m.start()]
-                device_name = _strip_prefix(device_str)
-                if device_name:
-                    candidates[device_name] = candidates.get(device_name, 0) + 1
-                matched = True
-                break
+        #    The matcher allows an optional trailing _\d+ so refs like _kW_01 match.
+        start = matcher.match_start(ref)
+        matched = start is not None
+        if matched:
+            device_name = _strip_prefix(ref[:start])
+            if device_name:
+                candidates[device_name] = candidates.get(device_name, 0) + 1
 
         # 4. Collect post-prefix remainders for unrecognised suffixes.
         #    Uses the broader _ANY_PREFIX_RE to handle both Comm and non-Comm
@@ -364,7 +511,7 @@ def extract_asset_name_from_refs(points: Dict[str, Any], meter_type: str) -> Opt
     return "_".join(parts_list[0][:common_len])
 
 
-def extract_name_from_single_ref(ref: str, suffix_list: list) -> Optional[str]:
+def extract_name_from_single_ref(ref: str, suffix_list) -> Optional[str]:
     """
     Extract meter name from a single ref string.  Handles:
       DP_{meter}_{point}
@@ -372,18 +519,19 @@ def extract_name_from_single_ref(ref: str, suffix_list: list) -> Optional[str]:
       DP_Comm#_DataNab_{meter}_{point}  (PascalCase gateway segment)
       ..._{point}_\\d+                   (trailing numeric index)
       DP_Comm#_{meter}                   (no trailing point at all — fallback)
+
+    suffix_list is a SuffixMatcher (see get_suffix_matcher) or a plain list of
+    raw names; pass a matcher when extracting many refs.
     """
-    for raw in suffix_list:
-        pattern = r"_" + re.escape(raw) + r"(_\d+)?$"
-        m = re.search(pattern, ref, re.IGNORECASE)
-        if m:
-            device_str = ref[: m.start()]
-            return _strip_prefix(device_str)
+    matcher = suffix_list if isinstance(suffix_list, SuffixMatcher) else SuffixMatcher(suffix_list)
+    start = matcher.match_start(ref)
+    if start is not None:
+        return _strip_prefix(ref[:start])
 
     # Fallback: no recognized suffix found.  If this looks like a valid BACnet
     # ref (starts with 2-5 uppercase letters + underscore), strip the network
     # prefix directly — the remainder is the meter name.
-    if re.match(r'^[A-Z]{2,5}_', ref):
+    if _NET_CODE_PREFIX_RE.match(ref):
         return _strip_prefix(ref)
     return None
 
@@ -1,5 +1,6 @@
 """
-Processes a raw pointset_refs.xlsx (from site_model_ref_compiler.py) in two passes:
+Processes a raw pointset_refs table (from site_model_ref_compiler.py; .csv,
+.parquet or .xlsx) in two passes:
 
   Pass 1 — Field map matching:
     Matches each point name against standard_field_map.yaml and assigns a
@@ -10,9 +11,14 @@ Processes a raw pointset_refs.xlsx (from site_model_ref_compiler.py) in two pass
     the field-map suffix approach.  Handles trailing _\\d+ indices and
     PascalCase gateway segments (e.g. DataNab).
 
+Both passes work on distinct values (each (meter_type, point) is matched and
+each (meter_type, ref) extracted once) and map the results back with
+vectorized pandas ops; per-device voting is a groupby.  This keeps
+fleet-wide exports with ~1M refs to seconds rather than hours.
+
 Usage:
     python tests/ref_extraction_validator.py
-    python tests/ref_extraction_validator.py path/to/pointset_refs.xlsx
+    python tests/ref_extraction_validator.py path/to/pointset_refs.csv
 
 Output: ref_extraction_results.xlsx (written next to the input file)
   Tab 1 "Raw Points"       — passthrough from input
@@ -24,7 +30,6 @@ Output: ref_extraction_results.xlsx (written next to the input file)
 
 import os
 import sys
-from collections import defaultdict
 
 import pandas as pd
 
@@ -35,7 +40,8 @@ _ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, _ROOT)
 
 from site_model_editor import (  # noqa: E402
-    _build_raw_lookup,
+    SuffixMatcher,
+    get_suffix_matcher,
     extract_name_from_single_ref,
 )
 from field_map_utils import _load_field_map_yaml                          # noqa: E402
@@ -43,7 +49,7 @@ from field_map_utils import _load_field_map_yaml                          # noqa
 # ---------------------------------------------------------------------------
 # Constants
 # ---------------------------------------------------------------------------
-DEFAULT_INPUT = os.path.join(os.path.dirname(__file__), "pointset_refs.xlsx")
+DEFAULT_INPUT = os.path.join(os.path.dirname(__file__), "pointset_refs.csv")
 OUTPUT_FILENAME = "ref_extraction_results.xlsx"
 
 
@@ -87,6 +93,115 @@ def _match_point(point_name: str, meter_type: str, lookups: dict):
     return "", "not in standard field map"
 
 
+def match_field_map(df_raw: pd.DataFrame, lookups: dict) -> pd.DataFrame:
+    """Pass 1: copy of df_raw with dbo_point and flag columns.
+
+    Each distinct (meter_type, lowercased point) is matched once and the
+    result is mapped back onto every row.  Rows without a ref get "" / "".
+    """
+    df = df_raw.copy()
+    has_ref = df["ref"] != ""
+    keys = pd.MultiIndex.from_arrays([df["meter_type"], df["point"].str.lower()])
+    unique = keys[has_ref.to_numpy()].unique()
+    matched = pd.DataFrame(
+        [_match_point(point, meter_type, lookups) for meter_type, point in unique],
+        index=unique, columns=["dbo_point", "flag"], dtype=object,
+    )
+    for col in ("dbo_point", "flag"):
+        values = matched[col].reindex(keys).to_numpy() if len(matched) else ""
+        df[col] = pd.Series(values, index=df.index).where(has_ref, "")
+    return df
+
+
+def extract_names(df_matched: pd.DataFrame) -> pd.Series:
+    """Pass 2: meter name per row ("" for IGNORE rows, empty refs and misses).
+
+    Refs are deduplicated per (meter_type, ref) before extraction, and each
+    meter type's precompiled suffix matcher is built once.
+    """
+    meter_types = df_matched["meter_type"]
+    matchers = {mt: get_suffix_matcher(mt)[0] for mt in meter_types.unique() if mt}
+    no_suffixes = SuffixMatcher([])
+
+    todo = (df_matched["flag"] != "IGNORE") & (df_matched["ref"] != "")
+    pairs = df_matched.loc[todo, ["meter_type", "ref"]].drop_duplicates()
+    names = {
+        (mt, ref): extract_name_from_single_ref(ref, matchers.get(mt, no_suffixes)) or ""
+        for mt, ref in pairs.itertuples(index=False, name=None)
+    }
+    keys = pd.MultiIndex.from_frame(df_matched[["meter_type", "ref"]])
+    extracted = pd.Series(names, dtype=object).reindex(keys).to_numpy() if names else ""
+    return pd.Series(extracted, index=df_matched.index, dtype=object).where(todo, "")
+
+
+def vote_devices(df_matched: pd.DataFrame) -> pd.DataFrame:
+    """Per-device extraction result (the "Per Device" sheet).
+
+    Only field-map-matched points vote.  Refs whose point name is not in the
+    field map hit the extraction fallback and include the raw point suffix in
+    the result, which would cause false INCONSISTENT.  Ties go to the name
+    seen first.
+    """
+    columns = ["building", "device", "meter_type", "extracted_name", "matched_refs", "total_refs", "result"]
+    keys = ["building", "device"]
+    considered = df_matched[(df_matched["flag"] != "IGNORE") & (df_matched["ref"] != "")]
+    if considered.empty:
+        return pd.DataFrame(columns=columns)
+
+    devices = considered.groupby(keys).agg(
+        meter_type=("meter_type", "last"), total_refs=("ref", "size")
+    )
+    voters = considered[(considered["extracted_name"] != "") & (considered["flag"] == "")]
+    votes = voters.groupby(keys + ["extracted_name"], sort=False).size().rename("matched_refs").reset_index()
+    winners = votes.loc[votes.groupby(keys, sort=False)["matched_refs"].idxmax()].set_index(keys)
+    distinct = votes.groupby(keys).size()
+
+    out = devices.join(winners[["extracted_name", "matched_refs"]])
+    voted = out["matched_refs"].notna()
+    out["extracted_name"] = out["extracted_name"].where(voted, "")
+    out["matched_refs"] = out["matched_refs"].fillna(0).astype(int)
+    out["result"] = "FAILED"
+    out.loc[voted, "result"] = (distinct.reindex(out.index)[voted] == 1).map({True: "OK", False: "INCONSISTENT"})
+    return out.reset_index()[columns]
+
+
+def build_sheets(df_raw: pd.DataFrame) -> dict:
+    """Return the five output sheets, keyed by sheet name, for a raw refs table."""
+    lookups = _build_field_lookups(_load_field_map_yaml())
+    df_matched = match_field_map(df_raw, lookups)
+    df_matched["extracted_name"] = extract_names(df_matched)
+
+    df_not_in_map = (
+        df_matched[df_matched["flag"] == "not in standard field map"][["meter_type", "point"]]
+        .drop_duplicates()
+        .sort_values(["meter_type", "point"])
+        .reset_index(drop=True)
+    )
+    df_failures = df_matched[
+        (df_matched["extracted_name"] == "") &
+        (df_matched["flag"] != "IGNORE") &
+        (df_matched["ref"] != "")
+    ][["building", "device", "meter_type", "point", "ref", "flag"]].copy()
+
+    # Tab 2 columns: raw columns + dbo_point + flag (extracted_name is for Tab 4/5)
+    return {
+        "Raw Points": df_raw,
+        "Field Map Match": df_matched[list(df_raw.columns) + ["dbo_point", "flag"]],
+        "Not In Field Map": df_not_in_map,
+        "Per Device": vote_devices(df_matched),
+        "Failures": df_failures,
+    }
+
+
+def load_refs(path: str) -> pd.DataFrame:
+    """Read a compiled refs table as all-string columns ("" for blanks)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    if ext == ".parquet":
+        return pd.read_parquet(path).astype(object).fillna("").astype(str)
+    return pd.read_excel(path, dtype=str).fillna("")
+
 
 # ---------------------------------------------------------------------------
 # Main
@@ -100,7 +215,7 @@ def main():
         input_path = sys.argv[1]
     else:
         default = DEFAULT_INPUT
-        answer = input(f"Path to pointset_refs.xlsx [{default}]: ").strip().strip('"').strip("'")
+        answer = input(f"Path to pointset_refs (.csv/.parquet/.xlsx) [{default}]: ").strip().strip('"').strip("'")
         input_path = answer if answer else default
 
     if not os.path.isfile(input_path):
@@ -110,7 +225,7 @@ def main():
     output_file = os.path.join(os.path.dirname(os.path.abspath(input_path)), OUTPUT_FILENAME)
 
     print(f"Reading {input_path} ...")
-    df_raw = pd.read_excel(input_path, dtype=str).fillna("")
+    df_raw = load_refs(input_path)
 
     required = {"building", "device", "meter_type", "point", "ref"}
     missing = required - set(df_raw.columns)
@@ -118,142 +233,40 @@ def main():
         print(f"ERROR: missing columns: {missing}")
         sys.exit(1)
 
-    # ------------------------------------------------------------------
-    # Pass 1: field map matching
-    # ------------------------------------------------------------------
-    all_mappings = _load_field_map_yaml()
-    lookups = _build_field_lookups(all_mappings)
-
-    dbo_points = []
-    flags = []
-    for _, row in df_raw.iterrows():
-        if not row["ref"]:
-            dbo_points.append("")
-            flags.append("")
-            continue
-        dbo_point, flag = _match_point(row["point"], row["meter_type"], lookups)
-        dbo_points.append(dbo_point)
-        flags.append(flag)
-
-    df_matched = df_raw.copy()
-    df_matched["dbo_point"] = dbo_points
-    df_matched["flag"] = flags
-
-    df_not_in_map = (
-        df_matched[df_matched["flag"] == "not in standard field map"][["meter_type", "point"]]
-        .drop_duplicates()
-        .sort_values(["meter_type", "point"])
-        .reset_index(drop=True)
-    )
-
-    # ------------------------------------------------------------------
-    # Pass 2: meter name extraction
-    # ------------------------------------------------------------------
-    suffix_lists = {mt: _build_raw_lookup(mt)[0] for mt in df_matched["meter_type"].unique() if mt}
-
-    extracted_names = []
-    for _, row in df_matched.iterrows():
-        if row["flag"] == "IGNORE" or not row["ref"]:
-            extracted_names.append("")
-            continue
-        name = extract_name_from_single_ref(row["ref"], suffix_lists.get(row["meter_type"], []))
-        extracted_names.append(name or "")
-
-    df_matched["extracted_name"] = extracted_names
-
-    # ------------------------------------------------------------------
-    # Per-device voting & consistency
-    # ------------------------------------------------------------------
-    device_vote: dict = defaultdict(lambda: defaultdict(int))
-    device_meta: dict = {}
-    device_total: dict = defaultdict(int)
-
-    for _, row in df_matched.iterrows():
-        if row["flag"] == "IGNORE" or not row["ref"]:
-            continue
-        key = (row["building"], row["device"])
-        device_meta[key] = row["meter_type"]
-        device_total[key] += 1
-        # Only vote using field-map-matched points.  Refs whose point name is
-        # not in the field map hit the extraction fallback and include the raw
-        # point suffix in the result, which would cause false INCONSISTENT.
-        if row["extracted_name"] and row["flag"] == "":
-            device_vote[key][row["extracted_name"]] += 1
-
-    per_device_rows = []
-    for key in sorted(device_meta):
-        building, device = key
-        vote = device_vote.get(key, {})
-        total = device_total[key]
-
-        if not vote:
-            winner, matched, result = "", 0, "FAILED"
-        else:
-            winner = max(vote, key=lambda k: vote[k])
-            matched = vote[winner]
-            result = "OK" if len(vote) == 1 else "INCONSISTENT"
-
-        per_device_rows.append({
-            "building": building,
-            "device": device,
-            "meter_type": device_meta[key],
-            "extracted_name": winner,
-            "matched_refs": matched,
-            "total_refs": total,
-            "result": result,
-        })
-
-    df_devices = pd.DataFrame(per_device_rows)
-
-    df_failures = df_matched[
-        (df_matched["extracted_name"] == "") &
-        (df_matched["flag"] != "IGNORE") &
-        (df_matched["ref"] != "")
-    ][["building", "device", "meter_type", "point", "ref", "flag"]].copy()
+    sheets = build_sheets(df_raw)
 
     # ------------------------------------------------------------------
     # Write output
     # ------------------------------------------------------------------
-    # Tab 2 columns: raw columns + dbo_point + flag (drop extracted_name — that's for Tab 4/5)
-    tab2_cols = list(df_raw.columns) + ["dbo_point", "flag"]
-    df_tab2 = df_matched[tab2_cols]
-
     with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
-        df_raw.to_excel(writer, sheet_name="Raw Points", index=False)
-        df_tab2.to_excel(writer, sheet_name="Field Map Match", index=False)
-        df_not_in_map.to_excel(writer, sheet_name="Not In Field Map", index=False)
-        df_devices.to_excel(writer, sheet_name="Per Device", index=False)
-        df_failures.to_excel(writer, sheet_name="Failures", index=False)
+        for name, sheet_df in sheets.items():
+            sheet_df.to_excel(writer, sheet_name=name, index=False)
 
     # ------------------------------------------------------------------
     # Console summary
     # ------------------------------------------------------------------
+    df_tab2 = sheets["Field Map Match"]
+    df_devices = sheets["Per Device"]
     n_total = len(df_devices)
     n_ok = (df_devices["result"] == "OK").sum()
     n_inconsistent = (df_devices["result"] == "INCONSISTENT").sum()
     n_failed = (df_devices["result"] == "FAILED").sum()
     pct = 100 * n_ok / n_total if n_total else 0
 
-    print(f"\nField map:  {len(df_matched)} rows matched")
-    print(f"  Mapped              : {(df_matched['flag'] == '').sum()}")
-    print(f"  IGNORE              : {(df_matched['flag'] == 'IGNORE').sum()}")
-    print(f"  Not in field map    : {(df_matched['flag'] == 'not in standard field map').sum()}")
-    print(f"  Distinct unmatched  : {len(df_not_in_map)}")
+    print(f"\nField map:  {len(df_tab2)} rows matched")
+    print(f"  Mapped              : {(df_tab2['flag'] == '').sum()}")
+    print(f"  IGNORE              : {(df_tab2['flag'] == 'IGNORE').sum()}")
+    print(f"  Not in field map    : {(df_tab2['flag'] == 'not in standard field map').sum()}")
+    print(f"  Distinct unmatched  : {len(sheets['Not In Field Map'])}")
 
     print(f"\nExtraction: {n_total} devices")
     print(f"  OK          : {n_ok}  ({pct:.1f}%)")
     print(f"  INCONSISTENT: {n_inconsistent}")
     print(f"  FAILED      : {n_failed}")
-    print(f"  Unmatched refs (no suffix): {len(df_failures)}")
+    print(f"  Unmatched refs (no suffix): {len(sheets['Failures'])}")
 
     print(f"\nWrote {output_file}")
-    for name, sheet_df in [
-        ("Raw Points", df_raw),
-        ("Field Map Match", df_tab2),
-        ("Not In Field Map", df_not_in_map),
-        ("Per Device", df_devices),
-        ("Failures", df_failures),
-    ]:
+    for name, sheet_df in sheets.items():
         print(f"  '{name}': {len(sheet_df)} rows")
 
 
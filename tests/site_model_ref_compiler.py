@@ -1,6 +1,30 @@
-import os
+"""
+Compiles every meter point ref in a site models directory into one table.
+
+Buildings are scanned in parallel worker processes (os.scandir walk, one
+json.load per metadata.json) and rows are streamed to the output building by
+building, in sorted building/device order, so memory stays flat.
+
+Usage:
+    python tests/site_model_ref_compiler.py SITE_MODELS_DIR
+    python tests/site_model_ref_compiler.py SITE_MODELS_DIR -o refs.parquet --workers 8
+
+Output format follows the file extension:
+  .csv     (default) plain CSV, no row limit
+  .parquet needs pyarrow
+  .xlsx    slow, single "Raw Points" sheet capped at 1,048,575 rows
+
+Columns: building, device, meter_type, point, ref, units.
+ref_extraction_validator.py reads any of the three formats.
+"""
+
+import argparse
+import csv
 import json
-import pandas as pd
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
 
 METER_PREFIXES = ("EM-", "GM-", "WM-", "PVI-", "EMV-")
 
@@ -12,6 +36,13 @@ PREFIX_TO_METER_TYPE = {
     "EMV-": "EM",
 }
 
+COLUMNS = ["building", "device", "meter_type", "point", "ref", "units"]
+DEFAULT_OUTPUT = "pointset_refs.csv"
+XLSX_MAX_ROWS = 1_048_575  # Excel sheet limit minus the header row
+MAX_WORKERS = min(8, os.cpu_count() or 1)
+
+Row = Tuple[str, str, str, str, str, str]
+
 
 def get_meter_type(device):
     for prefix, meter_type in PREFIX_TO_METER_TYPE.items():
@@ -20,56 +51,180 @@ def get_meter_type(device):
     return None
 
 
-site_models_dir = input("Enter path to site models directory: ").strip().strip('"').strip("'")
-output_xlsx = "pointset_refs.xlsx"
+def _sorted_dirs(path: str) -> List[str]:
+    with os.scandir(path) as it:
+        return sorted(e.name for e in it if e.is_dir())
 
-rows = []
 
-for building in sorted(os.listdir(site_models_dir)):
-    building_path = os.path.join(site_models_dir, building)
-    devices_path = os.path.join(building_path, "udmi", "devices")
+def list_buildings(site_models_dir: str) -> List[str]:
+    """Sorted building folders that contain udmi/devices/."""
+    return [
+        b for b in _sorted_dirs(site_models_dir)
+        if os.path.isdir(os.path.join(site_models_dir, b, "udmi", "devices"))
+    ]
 
-    if not os.path.isdir(devices_path):
-        continue
 
-    print(f"Processing {building}...")
-
-    for device in sorted(os.listdir(devices_path)):
+def compile_building(site_models_dir: str, building: str) -> Tuple[List[Row], List[str]]:
+    """Return (rows, warnings) for one building's meter devices."""
+    devices_path = os.path.join(site_models_dir, building, "udmi", "devices")
+    rows: List[Row] = []
+    warnings: List[str] = []
+    for device in _sorted_dirs(devices_path):
         if not device.startswith(METER_PREFIXES):
             continue
-
-        meter_type = get_meter_type(device)
-
+        meter_type = get_meter_type(device) or ""
         metadata_path = os.path.join(devices_path, device, "metadata.json")
-        if not os.path.isfile(metadata_path):
-            continue
-
-        with open(metadata_path, "r") as f:
-            try:
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
                 data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"  Failed to parse {metadata_path}: {e}")
-                continue
+        except FileNotFoundError:
+            continue
+        except (OSError, ValueError) as e:
+            warnings.append(f"  Failed to parse {metadata_path}: {e}")
+            continue
 
         points = data.get("pointset", {}).get("points", {})
         for point_name, point_data in points.items():
             ref = point_data.get("ref")
             if not ref:
                 continue
-
-            rows.append({
-                "building": building,
-                "device": device,
-                "meter_type": meter_type or "",
-                "point": point_name,
-                "ref": ref,
-                "units": point_data.get("units", ""),
-            })
-
-df = pd.DataFrame(rows, columns=["building", "device", "meter_type", "point", "ref", "units"])
-
-with pd.ExcelWriter(output_xlsx, engine="openpyxl") as writer:
-    df.to_excel(writer, sheet_name="Raw Points", index=False)
-
-print(f"\nWrote {len(rows)} rows to {output_xlsx}")
-print(f"  Sheet 'Raw Points': {len(df)} rows")
+            units = point_data.get("units", "")
+            rows.append((building, device, meter_type, point_name, ref, "" if units is None else str(units)))
+    return rows, warnings
+
+
+def _compile_one(args: Tuple[str, str]) -> Tuple[List[Row], List[str]]:
+    return compile_building(*args)
+
+
+def iter_building_rows(
+    site_models_dir: str, workers: int = MAX_WORKERS
+) -> Iterator[Tuple[str, List[Row], List[str]]]:
+    """Yield (building, rows, warnings) in sorted building order."""
+    buildings = list_buildings(site_models_dir)
+    jobs = [(site_models_dir, b) for b in buildings]
+    workers = min(workers, len(buildings))
+    if workers <= 1:
+        for building, job in zip(buildings, jobs):
+            yield (building, *_compile_one(job))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for building, result in zip(buildings, pool.map(_compile_one, jobs)):
+            yield (building, *result)
+
+
+class _CsvSink:
+    def __init__(self, path: str) -> None:
+        self._fh = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._fh)
+        self._writer.writerow(COLUMNS)
+
+    def write(self, rows: List[Row]) -> None:
+        self._writer.writerows(rows)
+
+    def close(self) -> None:
+        self._fh.close()
+
+    def discard(self) -> None:
+        self._fh.close()
+        os.remove(self._fh.name)
+
+
+class _ParquetSink:
+    def __init__(self, path: str) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow); use .csv instead.")
+        self._pa = pa
+        self._schema = pa.schema([(c, pa.string()) for c in COLUMNS])
+        self._path = path
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: List[Row]) -> None:
+        if rows:
+            columns = list(zip(*rows))
+            self._writer.write_table(self._pa.table(
+                {c: self._pa.array(col, self._pa.string()) for c, col in zip(COLUMNS, columns)},
+                schema=self._schema,
+            ))
+
+    def close(self) -> None:
+        self._writer.close()
+
+    def discard(self) -> None:
+        self._writer.close()
+        os.remove(self._path)
+
+
+class _XlsxSink:
+    """Slow path: buffers rows and writes one sheet on close."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._rows: List[Row] = []
+
+    def write(self, rows: List[Row]) -> None:
+        if len(self._rows) + len(rows) > XLSX_MAX_ROWS:
+            raise RuntimeError(f"More than {XLSX_MAX_ROWS:,} refs do not fit in one xlsx sheet; use .csv or .parquet.")
+        self._rows.extend(rows)
+
+    def close(self) -> None:
+        import pandas as pd
+
+        df = pd.DataFrame(self._rows, columns=COLUMNS)
+        with pd.ExcelWriter(self._path, engine="openpyxl") as writer:
+            df.to_excel(writer, sheet_name="Raw Points", index=False)
+
+    def discard(self) -> None:
+        self._rows = []
+
+
+_SINKS = {".csv": _CsvSink, ".parquet": _ParquetSink, ".xlsx": _XlsxSink}
+
+
+def compile_refs(site_models_dir: str, output_path: str, workers: int = MAX_WORKERS, log=print) -> int:
+    """Write every meter point ref under site_models_dir to output_path. Returns the row count."""
+    ext = os.path.splitext(output_path)[1].lower()
+    if ext not in _SINKS:
+        raise ValueError(f"Unsupported output format {ext!r}; use one of {sorted(_SINKS)}")
+    sink = _SINKS[ext](output_path)
+    total = 0
+    try:
+        for building, rows, warnings in iter_building_rows(site_models_dir, workers):
+            log(f"Processing {building}...")
+            for w in warnings:
+                log(w)
+            sink.write(rows)
+            total += len(rows)
+    except BaseException:
+        sink.discard()  # no partial output files
+        raise
+    sink.close()
+    return total
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compile every meter point ref in a site models directory.")
+    parser.add_argument("site_models_dir", help="folder containing <building>/udmi/devices/")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT,
+                        help=f"output file; .csv, .parquet or .xlsx (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"buildings scanned in parallel (default {MAX_WORKERS})")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.site_models_dir):
+        print(f"ERROR: not a directory: {args.site_models_dir}")
+        return 1
+    try:
+        total = compile_refs(args.site_models_dir, args.output, max(1, args.workers))
+    except (RuntimeError, ValueError) as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f"\nWrote {total} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,10 +7,37 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import glob
+import io
+import shutil
+import json
+import re
+import stat
+import subprocess
+import tempfile
+import threading
 import unittest
+import unittest.mock
 from unittest.mock import patch, mock_open
 
+import batch_pipeline
+import building_batch
+import building_config_updater
+import discovery_json
+import export_building_config as ebc
 import field_map_utils
+import instrumentation
+import json_io
+import onboard_config_updates
+import onboard_state
+import operation_poller
+import site_model_editor
+import translation_builder_udmi
+import type_matcher
+import yaml
+import yaml_io
+
+_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 class TestFieldMapUtils(unittest.TestCase):
@@ -44,5 +71,1007 @@ class TestFieldMapUtils(unittest.TestCase):
         with self.assertRaises(ValueError):
             field_map_utils.load_field_mapping("INVALID_TYPE", "test_field_map.yaml")
 
+class TestFieldMapCache(unittest.TestCase):
+    """Tests for the compiled, mtime-invalidated field map cache."""
+
+    YAML_V1 = (
+        "EM:\n"
+        "  power_sensor:\n"
+        "    dbo_unit: kilowatts\n"
+        "    standard_unit: kilowatts\n"
+        "    names: [kW]\n"
+    )
+    YAML_V2 = YAML_V1 + (
+        "  line_frequency_sensor:\n"
+        "    dbo_unit: hertz\n"
+        "    standard_unit: hertz\n"
+        "    names: [Frequency]\n"
+    )
+
+    def setUp(self):
+        field_map_utils.clear_field_map_cache()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "field_map.yaml")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(self.YAML_V1)
+
+    def tearDown(self):
+        field_map_utils.clear_field_map_cache()
+        self.tmp.cleanup()
+
+    def test_parsed_once_until_file_changes(self):
+        real_safe_load = field_map_utils.yaml.safe_load
+        with patch('field_map_utils.yaml.safe_load', side_effect=real_safe_load) as mock_yaml:
+            field_map_utils.load_field_mapping("EM", self.path)
+            field_map_utils.load_field_dbo_units("EM", self.path)
+            field_map_utils.load_field_standard_units("EM", self.path)
+            self.assertEqual(mock_yaml.call_count, 1)
+
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(self.YAML_V2)
+            result = field_map_utils.load_field_mapping("EM", self.path)
+            self.assertEqual(mock_yaml.call_count, 2)
+        self.assertEqual(result["Frequency"], "line_frequency_sensor")
+        self.assertEqual(result["power_sensor"], "power_sensor")
+
+    def test_returned_dicts_are_copies(self):
+        mapping = field_map_utils.load_field_mapping("EM", self.path)
+        mapping["bogus"] = "bogus"
+        self.assertNotIn("bogus", field_map_utils.load_field_mapping("EM", self.path))
+
+
+class TestSuffixMatcher(unittest.TestCase):
+    """The trie matcher must agree with the original per-suffix regex scan."""
+
+    @staticmethod
+    def _regex_start(ref, suffixes):
+        for raw in suffixes:
+            m = re.search(r"_" + re.escape(raw) + r"(_\d+)?$", ref, re.IGNORECASE)
+            if m:
+                return m.start()
+        return None
+
+    def _fixture_refs(self):
+        for path in sorted(glob.glob(os.path.join(_TESTS_DIR, "site_models", "*", "udmi", "devices", "*", "metadata.json"))):
+            with open(path, encoding="utf-8") as f:
+                points = json.load(f)["pointset"]["points"]
+            yield os.path.basename(os.path.dirname(path)), points
+
+    def test_matches_regex_on_fixture_refs(self):
+        suffixes, _ = site_model_editor._build_raw_lookup("EM")
+        matcher = site_model_editor.SuffixMatcher(suffixes)
+        extra = ["DP_Comm2_MAIN_kW_01", "DP_Comm2_MAIN_KWH", "DP_MAIN_Meter", "kW", "_kW", "DP_Comm0_x_kw_"]
+        refs = [p["ref"] for _, points in self._fixture_refs() for p in points.values() if p.get("ref")]
+        for ref in refs + extra:
+            self.assertEqual(matcher.match_start(ref), self._regex_start(ref, suffixes), ref)
+
+    def test_extract_asset_name_unchanged_on_fixtures(self):
+        suffixes, ignore_keys = site_model_editor._build_raw_lookup("EM")
+        for folder, points in self._fixture_refs():
+            if not folder.startswith("PVI-"):
+                continue
+            expected = {}
+            for key, point in points.items():
+                ref = point.get("ref", "")
+                if key.lower() in ignore_keys or not ref:
+                    continue
+                start = self._regex_start(ref, suffixes)
+                if start is not None:
+                    name = site_model_editor._strip_prefix(ref[:start])
+                    if name:
+                        expected[name] = expected.get(name, 0) + 1
+            if expected:
+                self.assertEqual(
+                    site_model_editor.extract_asset_name_from_refs(points, "EM"),
+                    max(expected, key=lambda k: expected[k]),
+                    folder,
+                )
+
+    def test_derivation_cache_matches_uncached(self):
+        uncached = site_model_editor._strip_prefix.__wrapped__
+        suffixes, _ = site_model_editor._build_raw_lookup("EM")
+        device_strs = ["DP_Comm0_DataNab_MAIN_Meter", "DP_PV_Inverter-01_PV_Inverter-01", "UC_Ch1_dev_7_EM-1_Main", "DP"]
+        for _, points in self._fixture_refs():
+            for point in points.values():
+                start = self._regex_start(point.get("ref", ""), suffixes)
+                if start is not None:
+                    device_strs.append(point["ref"][:start])
+
+        site_model_editor.clear_derivation_cache()
+        for _ in range(2):
+            for device_str in device_strs:
+                self.assertEqual(site_model_editor._strip_prefix(device_str), uncached(device_str), device_str)
+        stats = site_model_editor.derivation_cache_stats()
+        self.assertEqual(stats["misses"], len(set(device_strs)))
+        self.assertEqual(stats["hits"], 2 * len(device_strs) - len(set(device_strs)))
+        site_model_editor.clear_derivation_cache()
+        self.assertEqual(site_model_editor.derivation_cache_stats()["currsize"], 0)
+
+
+class TestDeviceSnapshot(unittest.TestCase):
+    """select_devices should read each metadata.json exactly once."""
+
+    DEVICES_DIR = os.path.join(_TESTS_DIR, "site_models", "building_a", "udmi", "devices")
+
+    def test_select_devices_reads_each_file_once(self):
+        folders = building_batch.find_device_folders(self.DEVICES_DIR)
+        discovery = {f: 123456 for f in folders}
+        real_load = building_batch.load_site_model
+        with patch('building_batch.load_site_model', side_effect=real_load) as mock_load, \
+                patch('builtins.input', return_value='all'), \
+                patch('builtins.print'):
+            selected = building_batch.select_devices(
+                folders, self.DEVICES_DIR, discovery, {"CONFIG_METADATA": {}}
+            )
+        self.assertEqual(selected, folders)
+        self.assertEqual(mock_load.call_count, len(folders))
+
+    def test_parallel_scan_keeps_folder_order(self):
+        folders = building_batch.find_device_folders(self.DEVICES_DIR) + ["PVI-404"]
+        barrier = threading.Barrier(2, timeout=5)
+        real_load = building_batch.load_site_model
+
+        def slow_first(path):
+            if os.path.basename(os.path.dirname(path)) in folders[:2]:
+                barrier.wait()  # the first two reads must overlap
+            return real_load(path)
+
+        messages = []
+        with patch('building_batch.load_site_model', side_effect=slow_first):
+            snapshots = building_batch.load_device_snapshots(
+                self.DEVICES_DIR, folders, max_workers=4, log=messages.append
+            )
+        self.assertEqual(list(snapshots), folders)
+        self.assertIsInstance(snapshots["PVI-404"].load_error, FileNotFoundError)
+        self.assertEqual(snapshots[folders[0]].parsed, real_load(snapshots[folders[0]].meta_path))
+        self.assertEqual(len(messages), 1)
+        self.assertIn(f"Scanned {len(folders)} metadata.json", messages[0])
+
+    def test_missing_metadata_is_reported_not_raised(self):
+        snapshot = building_batch.load_device_snapshot(self.DEVICES_DIR, "PVI-404")
+        self.assertIsNone(snapshot.parsed)
+        self.assertIsInstance(snapshot.load_error, FileNotFoundError)
+        self.assertEqual(building_batch._get_num_id_status(snapshot, {"PVI-404": 1}), "[?]")
+        self.assertEqual(building_batch._get_points_status(snapshot), "[?]")
+
+
+class TestMetadataWrite(unittest.TestCase):
+    """metadata.json is replaced atomically and left alone when nothing changed."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.path = os.path.join(self.tmp, "metadata.json")
+        self.parsed = {"cloud": {}, "pointset": {"points": {"kW": {"units": "kilowatts"}}}}
+
+    def test_identical_content_is_not_rewritten(self):
+        self.assertTrue(json_io.write_json_if_changed(self.path, self.parsed))
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(f.read(), json.dumps(self.parsed, indent=2))
+        os.chmod(self.path, 0o640)
+        os.utime(self.path, ns=(1, 1))
+
+        self.assertFalse(json_io.write_json_if_changed(self.path, json.loads(json.dumps(self.parsed))))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 1)
+
+        building_batch._apply_num_id_from_discovery(self.parsed, 42)
+        with patch('builtins.print'):
+            self.assertTrue(building_batch.overwrite_json(self.path, self.parsed, {}))
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), {"cloud": {"num_id": 42}, "pointset": {"points": {}}})
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(os.listdir(self.tmp), ["metadata.json"])
+
+    def test_failed_write_keeps_original(self):
+        json_io.write_json_if_changed(self.path, self.parsed)
+        with patch('building_batch.os.replace', side_effect=OSError("disk full")), \
+                patch('builtins.print') as mock_print:
+            self.assertFalse(building_batch.save_device_metadata(self.path, {"changed": True}))
+        self.assertIn("disk full", str(mock_print.call_args))
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), self.parsed)
+        self.assertEqual(os.listdir(self.tmp), ["metadata.json"])
+
+
+class TestBuildingConfigIndex(unittest.TestCase):
+    """Index lookups must agree with the first-match linear scans they replace."""
+
+    CONFIG = {
+        "CONFIG_METADATA": {"operation": "EXPORT", "code": "not-an-entity"},
+        "b-guid": {"code": "US-MTV-1667", "type": "FACILITIES/BUILDING", "etag": "b1"},
+        "m-guid": {"code": "power-meter-MAIN", "type": "METERS/EM_PWM", "etag": "m1"},
+        "dup-guid": {"code": "power-meter-MAIN", "type": "METERS/EM_PWM"},
+        "odd": "not a dict",
+    }
+
+    def test_lookups(self):
+        index = building_config_updater.BuildingConfigIndex(self.CONFIG)
+        self.assertEqual(index.building, ("b-guid", self.CONFIG["b-guid"]))
+        self.assertEqual(index.guid_for_code("power-meter-MAIN"), "m-guid")
+        self.assertIsNone(index.guid_for_code("not-an-entity"))
+        self.assertIs(building_config_updater.BuildingConfigIndex.of(index), index)
+        self.assertFalse(building_config_updater.BuildingConfigIndex({}))
+
+    def test_find_helpers_accept_plain_dicts(self):
+        self.assertEqual(building_config_updater._find_building_entity(self.CONFIG)[0], "b-guid")
+        self.assertEqual(
+            building_config_updater._find_meter_entity_by_code("power-meter-MAIN", self.CONFIG)[0], "m-guid"
+        )
+        self.assertIsNone(building_config_updater._find_meter_entity_by_code("missing", self.CONFIG))
+
+
+FAKE_STUBBY = """#!{python}
+import os
+import sys
+args = sys.argv[1:]
+request = args[-1]
+if "/cities/bad/" in request:
+    sys.stderr.write("building not found")
+    sys.exit(1)
+if args[2].endswith(".ExportBuildingConfig"):
+    print("name: 'projects/digitalbuildings/operations/op-export'")
+    sys.exit(0)
+if args[2].endswith(".OnboardBuilding"):
+    print("name: 'projects/digitalbuildings/operations/op-onboard'")
+    sys.exit(0)
+outfile = next(a.split("=", 1)[1] for a in args if a.startswith("--outfile="))
+counter = outfile + ".polls"
+polls = int(open(counter).read()) if os.path.exists(counter) else 0
+with open(counter, "w") as fh:
+    fh.write(str(polls + 1))
+with open(outfile, "w", encoding="utf-8") as fh:
+    if polls == 0:
+        fh.write("done: false\\nstate: RUNNING\\n")
+    elif "op-onboard" in request:
+        fh.write("done: true\\nSuccessfully completed onboard operation.\\n")
+    elif "/cities/junk/" in request:
+        fh.write("done: true\\nerror: internal\\n")
+    else:
+        fh.write("\\x08junk CONFIG_METADATA:\\n  operation: EXPORT\\n")
+"""
+
+
+class FakeStubbyTestCase(unittest.TestCase):
+    """Puts a fake `stubby` executable first on PATH for the duration of a test."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        bin_dir = os.path.join(self.tmp.name, "bin")
+        os.makedirs(bin_dir)
+        script = os.path.join(bin_dir, "stubby")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(FAKE_STUBBY.format(python=sys.executable))
+        os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+        patchers = [
+            patch.dict(os.environ, {"PATH": bin_dir + os.pathsep + os.environ.get("PATH", "")}),
+            patch('operation_poller.time.sleep'),
+            patch('builtins.print'),
+            patch('export_building_config.EXPORT_CACHE_DIR', os.path.join(self.tmp.name, "export_cache")),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+class TestExportPool(FakeStubbyTestCase):
+    """export_building_configs overlaps exports and reports each result."""
+
+    def test_exports_concurrently_and_reports(self):
+        out_dir = os.path.join(self.tmp.name, "full_building_configs")
+        codes = ["US-MTV-1667", "US-SVL-100", "US-BAD-1"]
+        outfiles = {c: os.path.join(out_dir, f"{c}_full_building_config.yaml") for c in codes}
+        reported = []
+        results = ebc.export_building_configs(
+            outfiles, max_workers=3, on_result=lambda code, path, err: reported.append((code, err is None))
+        )
+        self.assertEqual(results, {"success": ["US-MTV-1667", "US-SVL-100"], "failed": ["US-BAD-1"]})
+        self.assertEqual(sorted(reported), [("US-BAD-1", False), ("US-MTV-1667", True), ("US-SVL-100", True)])
+        with open(outfiles["US-MTV-1667"], encoding="utf-8") as f:
+            self.assertTrue(f.read().startswith("CONFIG_METADATA:"))
+        self.assertFalse(os.path.exists(outfiles["US-BAD-1"]))
+
+
+class TestExportCache(FakeStubbyTestCase):
+    """A recent export is reused unless the caller forces a refresh."""
+
+    def _export_calls(self, outfile):
+        with open(outfile + ".polls", encoding="utf-8") as f:
+            return int(f.read())
+
+    def test_reuses_fresh_export_and_honours_force_refresh(self):
+        first = os.path.join(self.tmp.name, "a", "US-MTV-1667_full_building_config.yaml")
+        second = os.path.join(self.tmp.name, "b", "US-MTV-1667_full_building_config.yaml")
+        ebc.export_building_config("US-MTV-1667", first)
+        polls = self._export_calls(first)
+
+        ebc.export_building_config("US-MTV-1667", second)
+        self.assertFalse(os.path.exists(second + ".polls"), "cached export went to the server")
+        with open(first, encoding="utf-8") as a, open(second, encoding="utf-8") as b:
+            self.assertEqual(a.read(), b.read())
+        with open(os.path.join(ebc.EXPORT_CACHE_DIR, "US-MTV-1667.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["config_metadata"], {"operation": "EXPORT"})
+
+        ebc.export_building_config("US-MTV-1667", first, force_refresh=True)
+        self.assertGreater(self._export_calls(first), polls)
+
+        ebc.export_building_config("US-MTV-1667", second, max_age=0)
+        self.assertTrue(os.path.exists(second + ".polls"))
+
+    def test_pipeline_workers_honour_policy_ttl(self):
+        site_models = os.path.join(self.tmp.name, "site_models")
+        for b in ("building_a", "building_b"):
+            shutil.copytree(os.path.join(_TESTS_DIR, "site_models", b), os.path.join(site_models, b))
+        polls = lambda: glob.glob(os.path.join(self.tmp.name, "meter_onboarding", "*", "*.polls"))
+
+        def run(**kwargs):
+            for p in polls():
+                os.remove(p)
+            policy = batch_pipeline.PipelinePolicy(
+                site_models_dir=site_models, normalize_points=False, generate_updates=False,
+                workers=2, incremental=False, **kwargs,
+            )
+            with patch('builtins.input', side_effect=AssertionError("prompted")):
+                batch_pipeline.run_headless(policy)
+            return len(polls())
+
+        run()  # fills the export cache
+        self.assertEqual(run(), 0, "workers ignored the fresh cached export")
+        # The parent-only module TTL stays 600; only the policy tells workers to refresh
+        self.assertEqual(run(export_cache_ttl=0), 2)
+
+    def test_export_without_config_metadata_fails_and_is_not_cached(self):
+        outfile = os.path.join(self.tmp.name, "US-JUNK-1_full_building_config.yaml")
+        with self.assertRaises(RuntimeError):
+            ebc.export_building_config("US-JUNK-1", outfile)
+        self.assertFalse(os.path.exists(os.path.join(ebc.EXPORT_CACHE_DIR, "US-JUNK-1.json")))
+
+    def test_cached_record_without_config_metadata_is_a_miss(self):
+        outfile = os.path.join(self.tmp.name, "US-MTV-1667_full_building_config.yaml")
+        ebc.export_building_config("US-MTV-1667", outfile)
+        meta_path = os.path.join(ebc.EXPORT_CACHE_DIR, "US-MTV-1667.json")
+        with open(meta_path, encoding="utf-8") as f:
+            record = json.load(f)
+        record["config_metadata"] = None
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(record, f)
+        self.assertIsNone(ebc._load_cached_export("US-MTV-1667", 600))
+
+    def test_invalidate_drops_entry(self):
+        outfile = os.path.join(self.tmp.name, "US-MTV-1667_full_building_config.yaml")
+        ebc.export_building_config("US-MTV-1667", outfile)
+        ebc.invalidate_export_cache("US-MTV-1667")
+        self.assertIsNone(ebc._load_cached_export("US-MTV-1667", 600))
+
+    def test_scan_export_metadata(self):
+        path = os.path.join(_TESTS_DIR, "meter_onboarding", "building_a", "building_a_full_building_config_local.yaml")
+        self.assertEqual(ebc._scan_export_metadata(path), ({"operation": "EXPORT"}, "5cbc9d0e"))
+
+
+class TestOperationPoller(unittest.TestCase):
+    """Backoff polling shared by the export and onboard paths."""
+
+    def _fake_clock(self):
+        now = [0.0]
+        return now, (lambda: now[0]), (lambda d: now.__setitem__(0, now[0] + d))
+
+    def test_backoff_grows_and_caps(self):
+        rng = unittest.mock.Mock(uniform=lambda a, b: 0.0)
+        delays = operation_poller.backoff_delays(initial=0.5, factor=2, max_delay=3, rng=rng)
+        self.assertEqual([next(delays) for _ in range(5)], [0.5, 1.0, 2.0, 3, 3])
+
+    def test_returns_value_once_done(self):
+        now, clock, sleep = self._fake_clock()
+        value = operation_poller.poll_operation(
+            lambda attempt: (attempt == 3, "ok"), delays=[0.5, 1, 2, 4], sleep=sleep, clock=clock,
+        )
+        self.assertEqual(value, "ok")
+        self.assertEqual(now[0], 3.5)
+
+    def test_deadline_raises_and_clamps_last_wait(self):
+        now, clock, sleep = self._fake_clock()
+        checks = []
+        with self.assertRaises(operation_poller.OperationTimeout):
+            operation_poller.poll_operation(
+                lambda attempt: (checks.append(now[0]), (False, None))[1],
+                deadline=5, delays=iter(lambda: 2, None), sleep=sleep, clock=clock,
+            )
+        self.assertEqual(checks, [2, 4, 5])
+
+
+class TestOnboardPolling(FakeStubbyTestCase):
+    """run_onboard_and_get_status polls past 'running' and detects success."""
+
+    def test_onboard_succeeds_after_running(self):
+        results_dir = os.path.join(self.tmp.name, "results")
+        result_file = os.path.join(results_dir, "US-MTV-1667_power-meter-X_add_result.yaml")
+        ok = onboard_config_updates.run_onboard_and_get_status("US-MTV-1667", "topology.yaml", result_file)
+        self.assertTrue(ok)
+        with open(result_file + ".polls", encoding="utf-8") as f:
+            self.assertEqual(f.read(), "2")
+
+
+class TestParallelOnboarding(unittest.TestCase):
+    """run_onboard_updates overlaps buildings but keeps each building's files in order."""
+
+    FILES = [
+        "US-MTV-1667_power-meter-A_add.yaml",
+        "US-MTV-1667_power-meter-B_update.yaml",
+        "US-SVL-100_power-meter-C_add.yaml",
+        "US-SVL-100_power-meter-D_update.yaml",
+        "US-NYC-9_power-meter-E_add.yaml",
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.updates_dir = os.path.join(self.tmp.name, "building_config_updates")
+        os.makedirs(os.path.join(self.updates_dir, "results"))
+        for name in self.FILES:
+            with open(os.path.join(self.updates_dir, name), "w", encoding="utf-8") as f:
+                f.write("CONFIG_METADATA: {}\n")
+        # Already onboarded on a previous run — must be skipped, not resubmitted
+        done = os.path.join(self.updates_dir, "results", "US-NYC-9_power-meter-E_add_result.yaml")
+        with open(done, "w", encoding="utf-8") as f:
+            f.write("Successfully completed onboard operation.\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_serialized_per_building_concurrent_across(self):
+        lock = threading.Lock()
+        active = {}
+        calls = []
+        peak = {"buildings": 0}
+
+        def fake_onboard(building_code, cfg_path, result_file, log=print):
+            with lock:
+                active[building_code] = active.get(building_code, 0) + 1
+                self.assertEqual(active[building_code], 1, "same-building files overlapped")
+                peak["buildings"] = max(peak["buildings"], sum(1 for v in active.values() if v))
+                calls.append(os.path.basename(cfg_path))
+            threading.Event().wait(0.05)
+            with open(result_file, "w", encoding="utf-8") as f:
+                f.write("Successfully completed onboard operation.\n")
+            with lock:
+                active[building_code] -= 1
+            return True
+
+        with patch('onboard_config_updates.run_onboard_and_get_status', side_effect=fake_onboard), \
+                patch('onboard_config_updates._reconcile_with_fresh_bc'), \
+                patch('onboard_config_updates.analyze_results') as mock_analyze, \
+                patch('builtins.print'):
+            onboard_config_updates.run_onboard_updates(self.tmp.name, max_workers=4)
+
+        self.assertEqual(len(calls), 4)
+        self.assertLess(calls.index(self.FILES[0]), calls.index(self.FILES[1]))
+        self.assertLess(calls.index(self.FILES[2]), calls.index(self.FILES[3]))
+        self.assertEqual(peak["buildings"], 2)
+        result_files = mock_analyze.call_args[0][0]
+        self.assertEqual([os.path.basename(cfg) for _, cfg, _ in result_files], sorted(self.FILES))
+        self.assertEqual([skipped for _, _, skipped in result_files], [False, False, True, False, False])
+
+
+class TestHeadlessPipeline(unittest.TestCase):
+    """End-to-end run of batch_pipeline against the bundled building_a fixture."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.site_models = os.path.join(self.tmp.name, "site_models")
+        shutil.copytree(os.path.join(_TESTS_DIR, "site_models", "building_a"),
+                        os.path.join(self.site_models, "building_a"))
+        shutil.copytree(os.path.join(_TESTS_DIR, "meter_onboarding", "building_a"),
+                        os.path.join(self.tmp.name, "meter_onboarding", "building_a"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plan_runs_without_prompts(self):
+        plan = os.path.join(self.tmp.name, "plan.yaml")
+        with open(plan, "w", encoding="utf-8") as f:
+            f.write("site_models_dir: %s\nexport_building_config: false\n" % self.site_models)
+        policy = batch_pipeline.load_plan(plan)
+
+        with patch('builtins.input', side_effect=AssertionError("prompted")), \
+                patch('builtins.print'):
+            result = batch_pipeline.run_headless(policy)
+
+        report = os.path.join(self.tmp.name, "meter_onboarding", "headless_report.json")
+        with open(report, encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["summary"], result["summary"])
+        self.assertEqual(result["summary"]["errors"], 0)
+        self.assertEqual(result["summary"]["added"], 1)
+        self.assertEqual(result["summary"]["updated"], 3)
+        updates = os.listdir(os.path.join(self.tmp.name, "meter_onboarding", "building_a",
+                                          "building_config_updates"))
+        self.assertIn("US-MTV-1667_power-meter-FAKE_new_METER_add.yaml", updates)
+
+    def test_portfolio_parallel_writes_only_changed_files(self):
+        shutil.copytree(os.path.join(_TESTS_DIR, "site_models", "building_b"),
+                        os.path.join(self.site_models, "building_b"))
+        policy = batch_pipeline.portfolio_policy(
+            batch_pipeline.PipelinePolicy(site_models_dir=self.site_models, export_building_config=False), workers=2
+        )
+        with patch('builtins.input', side_effect=AssertionError("prompted")), patch('builtins.print'):
+            first = batch_pipeline.run_headless(policy)
+            metas = glob.glob(os.path.join(self.site_models, "*", "udmi", "devices", "*", "metadata.json"))
+            mtimes = {m: os.stat(m).st_mtime_ns for m in metas}
+            second = batch_pipeline.run_headless(policy)
+
+        self.assertEqual([b["building"] for b in first["buildings"]], ["building_a", "building_b"])
+        self.assertTrue(first["report_path"].endswith("portfolio_report.json"))
+        self.assertGreater(first["summary"]["normalized"], 0)
+        self.assertEqual(first["summary"]["added"] + first["summary"]["updated"], 0)
+        self.assertEqual(second["summary"]["normalized"], 0)
+        self.assertEqual(second["summary"]["unchanged"], first["summary"]["devices"])
+        self.assertEqual({m: os.stat(m).st_mtime_ns for m in metas}, mtimes)
+
+    def test_incremental_rerun_skips_unchanged_devices(self):
+        policy = batch_pipeline.PipelinePolicy(site_models_dir=self.site_models, export_building_config=False)
+        with patch('builtins.input', side_effect=AssertionError("prompted")), patch('builtins.print'):
+            first = batch_pipeline.run_headless(policy)
+            second = batch_pipeline.run_headless(policy)
+            meta = glob.glob(os.path.join(self.site_models, "building_a", "udmi", "devices", "*",
+                                          "metadata.json"))[0]
+            with open(meta, "a", encoding="utf-8") as f:
+                f.write("\n")
+            third = batch_pipeline.run_headless(policy)
+
+        state = os.path.join(self.tmp.name, "meter_onboarding", "building_a", "onboard_state.json")
+        self.assertTrue(os.path.isfile(state))
+        self.assertEqual(first["summary"]["reused"], 0)
+        self.assertEqual(second["summary"]["reused"], first["summary"]["devices"])
+        self.assertEqual(third["summary"]["reused"], first["summary"]["devices"] - 1)
+        self.assertEqual(second["summary"]["errors"], 0)
+        first_files = sorted(d.get("output_file") or "" for d in first["buildings"][0]["devices"])
+        second_files = sorted(d.get("output_file") or "" for d in second["buildings"][0]["devices"])
+        self.assertEqual(first_files, second_files)
+
+        unchanged = batch_pipeline.PipelinePolicy(site_models_dir=self.site_models,
+                                                  export_building_config=False, incremental=False)
+        with patch('builtins.input', side_effect=AssertionError("prompted")), patch('builtins.print'):
+            full = batch_pipeline.run_headless(unchanged)
+        self.assertEqual(full["summary"]["reused"], 0)
+
+    def test_plan_rejects_unknown_keys(self):
+        with self.assertRaises(ValueError):
+            batch_pipeline.PipelinePolicy.from_dict({"site_models_dir": "x", "bogus": 1})
+
+    def test_plan_rejects_malformed_overrides(self):
+        for data in ([{"site_models_dir": "x"}],
+                     {"site_models_dir": "x", "overrides": None},
+                     {"site_models_dir": "x", "overrides": {"building_a": ["PVI-1"]}},
+                     {"site_models_dir": "x", "overrides": {"building_a": {"PVI-1": "skip"}}}):
+            with self.assertRaises(ValueError):
+                batch_pipeline.PipelinePolicy.from_dict(data)
+        plan = os.path.join(self.tmp.name, "plan.yaml")
+        with open(plan, "w", encoding="utf-8") as f:
+            f.write("- site_models_dir: x\n")
+        with self.assertRaises(ValueError):
+            batch_pipeline.load_plan(plan)
+
+
+class TestBuildingState(unittest.TestCase):
+    """onboard_state.json reuses a step only while its inputs and output file are unchanged."""
+
+    def test_current_recorded_and_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            meta = os.path.join(tmp, "metadata.json")
+            out = os.path.join(tmp, "PVI-1_update.yaml")
+            for path in (meta, out):
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write("{}")
+            config = {"m-guid": {"code": "power-meter-X", "type": "METERS/EM", "etag": "1"}}
+            inputs = lambda: onboard_state.step_inputs(meta, building_batch._export_context(
+                "PVI-1", "power-meter-X", {}, config, "interactive"))
+
+            state = onboard_state.BuildingState(tmp)
+            self.assertEqual(state.recorded("PVI-1", "export"), {})
+            state.record("PVI-1", "export", inputs(), {"dbo_name": "power-meter-X", "output_file": out})
+            self.assertTrue(state.save())
+
+            state = onboard_state.BuildingState.load(tmp)
+            self.assertEqual(state.recorded("PVI-1", "export")["dbo_name"], "power-meter-X")
+            self.assertIsNotNone(state.current("PVI-1", "export", inputs()))
+            config["m-guid"]["etag"] = "2"  # the meter's BC entry changed
+            self.assertIsNone(state.current("PVI-1", "export", inputs()))
+            config["m-guid"]["etag"] = "1"
+            with open(out, "a", encoding="utf-8") as f:
+                f.write("\n")
+            self.assertIsNone(state.current("PVI-1", "export", inputs()))
+
+
+class TestTypeRanking(unittest.TestCase):
+    """Tests for the compiled bitset type ranking in type_matcher."""
+
+    TYPE_MAP = {
+        "EM": {
+            "EM_A": {"power": "required", "energy": "required", "voltage": "optional"},
+            "EM_B": {"power": "required", "current": "optional"},
+            "EM_C": {"energy": "required", "power": "optional", "current": "optional"},
+            "EM_BARE": None,
+        }
+    }
+
+    def test_rank_types_orders_and_reports_missing(self):
+        ranked = type_matcher.rank_types({"power", "current", "extra"}, "EM", self.TYPE_MAP)
+        self.assertEqual([r.type_name for r in ranked], ["EM_B", "EM_A", "EM_C"])
+        self.assertEqual(ranked[0].required_pct, 100.0)
+        self.assertEqual(ranked[0].unlinked, 1)
+        self.assertEqual(ranked[1].missing_required, ["energy"])
+        self.assertEqual(ranked[1].missing_optional, ["voltage"])
+        self.assertEqual(ranked[2].total_matched, 2)
+
+    def test_rank_types_prunes_types_without_shared_fields(self):
+        type_map = {"EM": dict(self.TYPE_MAP["EM"], EM_OPT={"frequency": "optional"},
+                               EM_FAR={"frequency": "required"})}
+        ranked = type_matcher.rank_types({"voltage"}, "EM", type_map)
+        self.assertEqual([r.type_name for r in ranked], ["EM_OPT", "EM_A"])
+        self.assertEqual(type_matcher.rank_types(set(), "EM", type_map)[0].type_name, "EM_OPT")
+        # Nothing shared: every type is ranked so the user can still choose
+        self.assertEqual(len(type_matcher.rank_types({"zzz"}, "EM", self.TYPE_MAP)), 3)
+        far = type_matcher.match_type({"voltage"}, "EM_FAR", "EM", type_map)
+        self.assertEqual(far.missing_required, ["frequency"])
+        self.assertIsNone(type_matcher.match_type({"voltage"}, "EM_NONE", "EM", type_map))
+
+    def test_top_types_equals_head_of_full_ranking(self):
+        present_sets = [set(), {"power"}, {"energy", "voltage"}, {"power", "energy", "current", "x"}]
+        for p in present_sets:
+            full = type_matcher.rank_types(p, "EM", self.TYPE_MAP)
+            for k in range(4):
+                self.assertEqual(type_matcher.top_types(p, "EM", self.TYPE_MAP, k), full[:k])
+
+    def test_run_type_matcher_can_show_all_types(self):
+        type_map = {"EM": {f"EM_{i:02d}": {"power": "required", f"f{i}": "optional"} for i in range(15)}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "types.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                yaml.safe_dump(type_map, f)
+            with patch('builtins.input', side_effect=["a", "14"]), patch('builtins.print') as mock_print:
+                chosen, pre_add = type_matcher.run_type_matcher({"power"}, "EM", path)
+        self.assertEqual(chosen, "EM_13")
+        self.assertEqual(pre_add, [])
+        self.assertIn("Top 10 of 15", str(mock_print.call_args_list))
+
+    def test_rank_many_matches_rank_types(self):
+        present_sets = [set(), {"power"}, {"energy", "voltage"}, {"power", "energy", "current", "x"}]
+        many = type_matcher.rank_many(present_sets, "EM", self.TYPE_MAP)
+        self.assertEqual(many, [type_matcher.rank_types(p, "EM", self.TYPE_MAP) for p in present_sets])
+        self.assertEqual(type_matcher.rank_many(present_sets, "WM", self.TYPE_MAP), [[], [], [], []])
+
+    def test_type_index_cached_until_file_changes(self):
+        type_matcher.clear_type_index_cache()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "types.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("EM:\n  EM_A:\n    power: required\n")
+            first = type_matcher.get_type_index(path)
+            self.assertIs(type_matcher.get_type_index(path), first)
+            self.assertEqual(type_matcher.get_type_fields("EM_A", "EM", path), {"power"})
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("EM:\n  EM_A:\n    power: required\n    energy: optional\n")
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+            self.assertIsNot(type_matcher.get_type_index(path), first)
+            self.assertEqual(type_matcher.get_type_fields("EM_A", "EM", path), {"power", "energy"})
+        type_matcher.clear_type_index_cache()
+
+
+class TestTranslationRows(unittest.TestCase):
+    """build_udmi_dict_from_rows must match the DataFrame path."""
+
+    def test_rows_match_dataframe_path(self):
+        points = {
+            "active_power_sensor": {"units": "kW"},
+            "energy_accumulator": {"units": "kWh"},
+        }
+        standard_units = {"active_power_sensor": "kilowatts", "energy_accumulator": "kilowatt_hours"}
+        rows = site_model_editor.build_translation_rows(points, standard_units, "power-meter-X", "METER", "EM_A")
+        rows += translation_builder_udmi.missing_translation_rows(["voltage_sensor"], "power-meter-X", "METER", "EM_A")
+
+        from_rows = translation_builder_udmi.build_udmi_dict_from_rows(rows, num_id="42", guid="g-1")
+        from_df = translation_builder_udmi.build_udmi_dict(
+            translation_builder_udmi.rows_to_dataframe(rows), num_id="42", guid="g-1"
+        )
+        self.assertEqual(from_rows, from_df)
+        meter = from_rows["g-1"]
+        self.assertEqual(meter["type"], "METERS/EM_A")
+        self.assertEqual(meter["translation"]["voltage_sensor"], "MISSING")
+        self.assertEqual(meter["translation"]["active_power_sensor"]["units"]["values"], {"kW": "kilowatts"})
+
+    def test_empty_rows(self):
+        self.assertEqual(translation_builder_udmi.build_udmi_dict_from_rows([]), {"": {}})
+        self.assertEqual(
+            translation_builder_udmi.build_udmi_dict(translation_builder_udmi.rows_to_dataframe([])), {"": {}}
+        )
+
+
+class TestYamlIO(unittest.TestCase):
+    """yaml_io must match yaml.safe_load / yaml.dump output exactly."""
+
+    DOCS = [
+        {"CONFIG_METADATA": {"operation": "UPDATE"}, "g-1": {"code": "power-meter-X", "etag": "12",
+                                                             "translation": {"a": "MISSING"}, "mask": ["type"]}},
+        {"": {"empty key": True}},
+        {"code": "Zähler " + "é" * 90, "note": "line1\nline2", "ctrl": "a\rb", "nums": [1, 2.5, None, "yes"]},
+    ]
+
+    def test_dump_sections_byte_identical(self):
+        for doc in self.DOCS:
+            expected = "\n".join(
+                yaml.dump({k: v}, sort_keys=False, default_flow_style=False) for k, v in doc.items()
+            )
+            self.assertEqual(yaml_io.dump_sections(doc), expected)
+
+    def test_load_file_cached_hits_until_content_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "US-X-1_full_building_config.yaml")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("g-1:\n  code: meter-a\n")
+            self.assertEqual(yaml_io.load_file_cached(path), {"g-1": {"code": "meter-a"}})
+            self.assertTrue(os.path.isfile(os.path.join(tmp, yaml_io.CACHE_DIR_NAME, os.path.basename(path) + ".pickle")))
+
+            with patch('yaml_io.load', side_effect=AssertionError("re-parsed")):
+                first = yaml_io.load_file_cached(path)
+                os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+                second = yaml_io.load_file_cached(path)  # touched, same content
+            self.assertEqual(first, second)
+            self.assertIsNot(first, second)
+
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("g-1:\n  code: meter-b\n")
+            self.assertEqual(yaml_io.load_file_cached(path), {"g-1": {"code": "meter-b"}})
+
+    def test_load_matches_safe_load(self):
+        for doc in self.DOCS:
+            text = yaml.dump(doc, sort_keys=False)
+            self.assertEqual(yaml_io.load(text), yaml.safe_load(text))
+
+
+class TestDiscoveryScan(unittest.TestCase):
+    """Streaming device_discovery.json validation + latest-row lookup."""
+
+    HEADER = ["device_registry_id", "device_id", "device_num_id", "last_event_time"]
+
+    def _write(self, tmp, rows_or_text):
+        path = os.path.join(tmp, "device_discovery.json")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(rows_or_text if isinstance(rows_or_text, str) else json.dumps(rows_or_text, indent=1))
+        return path
+
+    def test_iter_json_array_small_chunks(self):
+        rows = [self.HEADER] + [["R", f"PVI-{i}", str(10 ** 15 + i), 1.5e3] for i in range(50)]
+        text = json.dumps(rows)
+        self.assertEqual(list(discovery_json.iter_json_array(io.StringIO(text), chunk_size=3)), rows)
+
+    def test_malformed_row_fails_without_reading_the_rest(self):
+        rows = ",".join(json.dumps(["R", f"PVI-{i}", str(10 ** 15 + i), "2024-01-01"]) for i in range(20000))
+        text = '[%s, ["R", "PVI-0" "1", "x"], %s]' % (json.dumps(self.HEADER), rows)
+        reads = []
+
+        class CountingIO(io.StringIO):
+            def read(self, size=-1):
+                reads.append(size)
+                return super().read(size)
+
+        with self.assertRaises(json.JSONDecodeError):
+            list(discovery_json.iter_json_array(CountingIO(text), chunk_size=1024))
+        self.assertLessEqual(len(reads), 2)
+
+    def test_latest_row_wins_and_result_is_cached(self):
+        rows = [
+            self.HEADER,
+            ["R", "PVI-1", "100", "null"],
+            ["R", "PVI-1", "101", "2024-01-02"],
+            ["R", "PVI-1", "102", "2024-01-01"],
+            ["R", "PVI-2", None, "2024-01-05"],
+            ["R", "PVI-2", "200", None],
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self._write(tmp, rows)
+            self.assertEqual(building_batch._validate_discovery_json(path), (True, ""))
+            with patch('discovery_json._scan_stream', side_effect=AssertionError("re-parsed")):
+                self.assertEqual(building_batch._load_discovery_lookup(tmp), {"PVI-1": 101, "PVI-2": 200})
+
+    def test_invalid_files(self):
+        cases = {
+            "[]": "Expected a JSON array with at least 2 rows (header + data).",
+            json.dumps([self.HEADER]): "Expected a JSON array with at least 2 rows (header + data).",
+            json.dumps([{"a": 1}, []]): "First row must be an array of column headers.",
+            json.dumps([["device_id"], []]): "Missing required headers: ['device_registry_id', 'device_num_id', 'last_event_time']",
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            for text, error in cases.items():
+                self.assertEqual(discovery_json.scan_discovery(self._write(tmp, text), use_cache=False).error, error)
+            scan = discovery_json.scan_discovery(self._write(tmp, '[["a"], [1, 2'), use_cache=False)
+            self.assertFalse(scan.valid)
+            self.assertTrue(scan.error.startswith("Invalid JSON"))
+
+
+class TestInstrumentation(unittest.TestCase):
+    """Spans record nothing unless enabled, and report() emits table + JSON line."""
+
+    def setUp(self):
+        patcher = patch.object(instrumentation, "_state", instrumentation._State())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_is_a_no_op(self):
+        instrumentation.disable()
+        with instrumentation.span("stage"):
+            pass
+        instrumentation.count("hits")
+        self.assertEqual(instrumentation.snapshot()["stages"], [])
+        self.assertIsNone(instrumentation.report(log=self.fail))
+
+    def test_spans_counters_prompts_and_report(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        json_path = os.path.join(tmp.name, "timing.jsonl")
+        instrumentation.enable(json_path)
+
+        @instrumentation.timed("work")
+        def work(x):
+            return x * 2
+
+        self.assertEqual(work(2), 4)
+        with self.assertRaises(KeyError), instrumentation.span("work"):
+            raise KeyError
+        instrumentation.count("yaml.cache_hit", 2)
+        with patch('builtins.input', return_value="y"):
+            with instrumentation.track_prompts():
+                self.assertEqual(input("? "), "y")
+            self.assertIsInstance(input, unittest.mock.Mock)
+
+        lines = []
+        data = instrumentation.report("Run 1", log=lines.append, option="4")
+        stages = {s["stage"]: s for s in data["stages"]}
+        self.assertEqual(stages["work"]["calls"], 2)
+        self.assertEqual(stages["user_input"]["calls"], 1)
+        self.assertEqual(data["counters"], {"yaml.cache_hit": 2})
+        self.assertIn("Run 1", lines[0])
+        with open(json_path, encoding="utf-8") as f:
+            record = json.loads(f.readline())
+        self.assertEqual((record["title"], record["option"]), ("Run 1", "4"))
+        self.assertEqual(instrumentation.snapshot()["stages"], [])  # report() resets
+
+    def test_worker_process_spans_are_merged(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        site_models = os.path.join(tmp.name, "site_models")
+        for b in ("building_a", "building_b"):
+            shutil.copytree(os.path.join(_TESTS_DIR, "site_models", b), os.path.join(site_models, b))
+        instrumentation.enable()
+        policy = batch_pipeline.portfolio_policy(
+            batch_pipeline.PipelinePolicy(site_models_dir=site_models, export_building_config=False), workers=2
+        )
+        with patch('builtins.input', side_effect=AssertionError("prompted")), patch('builtins.print'):
+            batch_pipeline.run_headless(policy)
+
+        stages = {s["stage"]: s for s in instrumentation.snapshot()["stages"]}
+        self.assertEqual(stages["load_device_snapshots"]["calls"], 2)
+        self.assertIn("process_points", stages)
+
+
+class TestStartupImports(unittest.TestCase):
+    """Showing the menu must not import pandas, numpy, PyYAML or the flow modules."""
+
+    # Cumulative `python -X importtime` budget for `import main`; pandas alone is ~400 ms
+    MENU_IMPORT_BUDGET_US = 150_000
+    HEAVY = ("pandas", "numpy", "yaml", "building_batch", "udmi_script", "batch_pipeline")
+
+    def _importtime(self, module):
+        code = f"import sys, {module}; print(','.join(m for m in {self.HEAVY!r} if m in sys.modules))"
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=os.path.dirname(_TESTS_DIR), capture_output=True, text=True, check=True,
+        )
+        cumulative = {}
+        for line in proc.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, cum, name = line[len("import time:"):].split("|")
+                if cum.strip().isdigit():
+                    cumulative[name.strip()] = int(cum)
+        return [m for m in proc.stdout.strip().split(",") if m], cumulative[module]
+
+    def test_menu_startup_is_light(self):
+        loaded, cumulative_us = self._importtime("main")
+        self.assertEqual(loaded, [])
+        self.assertLess(cumulative_us, self.MENU_IMPORT_BUDGET_US)
+
+    def test_batch_editor_does_not_load_pandas(self):
+        loaded, _ = self._importtime("building_batch")
+        self.assertNotIn("pandas", loaded)
+        self.assertNotIn("numpy", loaded)
+
+
+class TestRefExtractionValidator(unittest.TestCase):
+    """Vectorized validator sheets, checked against hand-computed results."""
+
+    ROWS = [
+        # building, device, meter_type, point, ref
+        ["b2", "EM-1", "EM", "kW", "DP_Comm1_A_kW"],
+        ["b2", "EM-1", "EM", "kWh", "DP_Comm1_B_kWh"],        # tie: A seen first wins
+        ["b2", "EM-1", "EM", "kW", ""],                       # no ref: not counted
+        ["b2", "EM-2", "EM", "Volts_AN", "DP_Comm2_MAIN_Volts_AN"],
+        ["b2", "EM-2", "EM", "Volts_BN", "DP_Comm2_MAIN_Volts_BN"],
+        ["b2", "EM-2", "EM", "Data_Stale", "DP_Comm2_MAIN_Data_Stale"],  # IGNORE
+        ["b1", "EM-3", "EM", "mystery", "lowercase_ref"],     # not in map, no suffix
+    ]
+
+    def test_sheets(self):
+        import pandas as pd
+        import ref_extraction_validator as rev
+
+        df_raw = pd.DataFrame([r + [""] for r in self.ROWS],
+                              columns=["building", "device", "meter_type", "point", "ref", "units"])
+        sheets = rev.build_sheets(df_raw)
+        self.assertEqual(list(sheets), ["Raw Points", "Field Map Match", "Not In Field Map", "Per Device", "Failures"])
+
+        tab2 = sheets["Field Map Match"]
+        self.assertEqual(list(tab2["flag"]), ["", "", "", "", "", "IGNORE", "not in standard field map"])
+        self.assertEqual(tab2["dbo_point"][3], "phase1_neutral_line_voltage_sensor")
+        self.assertEqual(sheets["Not In Field Map"].values.tolist(), [["EM", "mystery"]])
+
+        devices = sheets["Per Device"]
+        self.assertEqual(devices[["device", "extracted_name", "matched_refs", "total_refs", "result"]].values.tolist(), [
+            ["EM-3", "", 0, 1, "FAILED"],
+            ["EM-1", "A", 1, 2, "INCONSISTENT"],
+            ["EM-2", "MAIN", 2, 2, "OK"],
+        ])
+        self.assertEqual(sheets["Failures"]["ref"].tolist(), ["lowercase_ref"])
+
+    def test_compiled_csv_feeds_validator(self):
+        import ref_extraction_validator as rev
+        import site_model_ref_compiler as compiler
+        from benchmarks.synthetic_site import generate_site
+
+        with tempfile.TemporaryDirectory() as tmp:
+            site = generate_site(tmp, buildings=3, meters=4, points=6)
+            out = os.path.join(tmp, "refs.csv")
+            total = compiler.compile_refs(site.site_models_dir, out, workers=2, log=lambda *a: None)
+            df_raw = rev.load_refs(out)
+        self.assertEqual(len(df_raw), total)
+        self.assertEqual(list(df_raw.columns), compiler.COLUMNS)
+        self.assertEqual(sorted(set(df_raw["building"])), [b.site_code for b in site.buildings])
+        self.assertEqual(len(rev.build_sheets(df_raw)["Per Device"]), site.meter_count)
+
+
+class TestSyntheticSite(unittest.TestCase):
+    """The benchmark generator must produce site models the tool accepts."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_generated_site_runs_through_pipeline(self):
+        from benchmarks.synthetic_site import generate_site
+        site = generate_site(self.tmp.name, buildings=2, meters=6, points=12)
+        meter = site.buildings[0].meters[0]
+        snapshot = building_batch.load_device_snapshot(site.buildings[0].devices_dir, meter.folder)
+        self.assertEqual(snapshot.dbo_name, site_model_editor.build_yaml_asset_name(meter.name, meter.meter_type))
+
+        policy = batch_pipeline.PipelinePolicy(site_models_dir=site.site_models_dir, export_building_config=False)
+        with patch('builtins.input', side_effect=AssertionError("prompted")), \
+                patch('builtins.print'):
+            summary = batch_pipeline.run_headless(policy)["summary"]
+        self.assertEqual(summary["buildings"], 2)
+        self.assertEqual(summary["errors"], 0)
+        self.assertGreater(summary["added"], 0)
+        self.assertGreater(summary["updated"], 0)
+
+    def test_bench_pipeline_reports_every_stage(self):
+        from benchmarks import bench_pipeline
+        result = bench_pipeline.run_scale(1, 4, 8, repeat=1)
+        self.assertEqual(result["meters"], 4)
+        self.assertEqual(result["add_files"] + result["update_files"], 4)
+        self.assertEqual(set(result["stages"]), {
+            "process_points", "extract_asset_name_from_refs", "rank_types",
+            "build_udmi_dict", "run_building_config_updater_from_data",
+        })
+        self.assertEqual(bench_pipeline.parse_scale("2x3x4"), (2, 3, 4))
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -1,32 +1,70 @@
-from typing import Dict, Any
-import pandas as pd
-import yaml
+from dataclasses import astuple, dataclass
+from typing import TYPE_CHECKING, Dict, Any, Iterable, List
 import os
 
+import instrumentation
+import yaml_io
 
-def build_udmi_dict(df: pd.DataFrame, num_id: str = "", guid: str | None = None) -> Dict[str, Any]:
-    """Build and return {guid: meter_data} without saving to disk."""
+if TYPE_CHECKING:
+    import pandas as pd  # imported lazily; only DataFrame callers need it
+
+# Column order of the translation review table / DataFrame.
+TRANSLATION_COLUMNS = [
+    "assetName", "object_name", "standardFieldName", "raw_units",
+    "DBO_standard_units", "generalType", "typeName",
+]
+
+
+@dataclass(slots=True)
+class TranslationRow:
+    """One row of the translation table; fields follow TRANSLATION_COLUMNS."""
+    assetName: str
+    object_name: str
+    standardFieldName: str
+    raw_units: str
+    DBO_standard_units: str
+    generalType: str = ""
+    typeName: str = ""
+
+
+def missing_translation_rows(fields: Iterable[str], asset_name: str, general_type: str, type_name: str) -> List[TranslationRow]:
+    """MISSING placeholder rows for fields the device does not report."""
+    return [
+        TranslationRow(asset_name, "MISSING", field, "MISSING", "MISSING", general_type, type_name)
+        for field in fields
+    ]
+
+
+def rows_to_dataframe(rows: Iterable[TranslationRow]) -> "pd.DataFrame":
+    """Build the DataFrame view of rows, e.g. for the mapping review table."""
+    import pandas as pd
+
+    return pd.DataFrame([astuple(r) for r in rows], columns=TRANSLATION_COLUMNS)
+
+
+@instrumentation.timed("build_udmi_dict")
+def build_udmi_dict_from_rows(rows: Iterable[TranslationRow], num_id: str = "", guid: str | None = None) -> Dict[str, Any]:
+    """Build and return {guid: meter_data} from translation rows without saving to disk."""
     yaml_output: Dict[str, Any] = {}
 
-    for _, row in df.iterrows():
-        field_key = row['standardFieldName']
+    for row in rows:
+        field_key = row.standardFieldName
         if not field_key:
             continue
-        device = row['assetName']
 
         if not yaml_output:
             yaml_output = {
                 'cloud_device_id': num_id,
-                'code': device,
+                'code': row.assetName,
                 'translation': {},
-                'type': f"METERS/{row['typeName']}",
+                'type': f"METERS/{row.typeName}",
                 'update_mask': ['type', 'translation'],
             }
 
         translations = yaml_output['translation']
 
         if field_key not in translations:
-            if row['object_name'].lower() == "missing":
+            if row.object_name.lower() == "missing":
                 translations[field_key] = "MISSING"
             else:
                 translations[field_key] = {
@@ -34,7 +72,7 @@ def build_udmi_dict(df: pd.DataFrame, num_id: str = "", guid: str | None = None)
                     'units': {
                         'key': f"pointset.points.{field_key}.unit",
                         'values': {
-                            row['DBO_standard_units']: row['raw_units']
+                            row.DBO_standard_units: row.raw_units
                         }
                     }
                 }
@@ -43,9 +81,19 @@ def build_udmi_dict(df: pd.DataFrame, num_id: str = "", guid: str | None = None)
     return {guid: yaml_output}
 
 
-def translation_builder_udmi(df: pd.DataFrame, auto_filename: str = "output", save_dir: str | None = None, num_id: str = "", guid: str | None = None) -> str:
+def build_udmi_dict(df: "pd.DataFrame", num_id: str = "", guid: str | None = None) -> Dict[str, Any]:
+    """Build and return {guid: meter_data} without saving to disk."""
+    columns = ["assetName", "object_name", "standardFieldName", "raw_units", "DBO_standard_units", "typeName"]
+    rows = (
+        TranslationRow(asset, obj, std, raw, dbo, typeName=type_name)
+        for asset, obj, std, raw, dbo, type_name in df.reindex(columns=columns, fill_value="").itertuples(index=False, name=None)
+    )
+    return build_udmi_dict_from_rows(rows, num_id=num_id, guid=guid)
+
+
+def translation_builder_udmi(df: "pd.DataFrame", auto_filename: str = "output", save_dir: str | None = None, num_id: str = "", guid: str | None = None) -> str:
     data = build_udmi_dict(df, num_id=num_id, guid=guid)
-    yaml_string = yaml.dump(data, sort_keys=False)
+    yaml_string = yaml_io.dump(data)
 
     if not save_dir:
         print("No directory provided. Skipping save.")
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import heapq
 import os
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Set, Tuple
@@ -17,10 +18,15 @@ def get_type_name(suggestion: Optional[str] = None) -> str:
 
 import yaml
 
+import instrumentation
+
 _TYPE_MAP_FILE = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "mappings", "canodical_type_map.yaml"
 )
 
+# Rows shown in the interactive type match table (best first)
+MATCH_TABLE_ROWS = 10
+
 
 @dataclass
 class MatchResult:
@@ -60,32 +66,259 @@ def load_type_map(yaml_path: Optional[str] = None) -> Dict:
         raise FileNotFoundError(f"Canonical type map not found: {path}")
 
 
-def _score_one(type_name: str, present: Set[str], type_def: Dict, total_present: int) -> MatchResult:
-    required = [f for f, v in type_def.items() if v == "required"]
-    optional = [f for f, v in type_def.items() if v == "optional"]
-    return MatchResult(
-        type_name=type_name,
-        total_defined=len(required) + len(optional),
-        total_matched=sum(1 for f in required if f in present) + sum(1 for f in optional if f in present),
-        required_total=len(required),
-        required_matched=sum(1 for f in required if f in present),
-        missing_required=[f for f in required if f not in present],
-        missing_optional=[f for f in optional if f not in present],
-        total_present=total_present,
-    )
-
-
-def rank_types(present: Set[str], category: str, type_map: Dict) -> List[MatchResult]:
-    total_present = len(present)
-    results = [
-        _score_one(type_name, present, type_def, total_present)
-        for type_name, type_def in (type_map.get(category) or {}).items()
-        if type_def  # skip undefined (bare key) types
-    ]
-    results.sort(key=lambda r: (r.required_pct, -r.unlinked, r.total_matched), reverse=True)
+@dataclass
+class _TypeBits:
+    """One canonical type compiled to bitmasks over its category's field IDs."""
+    name: str
+    required: List[Tuple[str, int]]
+    optional: List[Tuple[str, int]]
+    required_mask: int
+    optional_mask: int
+    fields: frozenset
+
+
+class CategoryIndex:
+    """Canonical types of one category compiled to integer field IDs.
+
+    Each field defined anywhere in the category gets one bit; a type is a pair
+    of required/optional masks, so scoring a device is a few popcounts.
+
+    types_by_field is the inverted index field -> positions of the types that
+    define it.  Ranking only scores types sharing a field with the device, plus
+    those with no required fields (always 100% required).  Every other type
+    matches nothing and has 0% required, so it would sort below all of them.
+    When no type shares a field with the device, every type is scored, so the
+    user can still pick one.
+    """
+
+    def __init__(self, category_map: Optional[Dict]):
+        self.field_ids: Dict[str, int] = {}
+        self.types: List[_TypeBits] = []
+        for type_name, type_def in (category_map or {}).items():
+            if not type_def:  # skip undefined (bare key) types
+                continue
+            required = [(f, self._bit(f)) for f, v in type_def.items() if v == "required"]
+            optional = [(f, self._bit(f)) for f, v in type_def.items() if v == "optional"]
+            self.types.append(_TypeBits(
+                name=type_name,
+                required=required,
+                optional=optional,
+                required_mask=_mask(required),
+                optional_mask=_mask(optional),
+                fields=frozenset(type_def.keys()),
+            ))
+        self.by_name: Dict[str, _TypeBits] = {t.name: t for t in self.types}
+        self.types_by_field: Dict[str, List[int]] = {}
+        self.no_required: List[int] = []
+        for pos, t in enumerate(self.types):
+            for f, _ in t.required + t.optional:
+                self.types_by_field.setdefault(f, []).append(pos)
+            if not t.required:
+                self.no_required.append(pos)
+
+    def _bit(self, field_name: str) -> int:
+        if field_name not in self.field_ids:
+            self.field_ids[field_name] = len(self.field_ids)
+        return 1 << self.field_ids[field_name]
+
+    def present_mask(self, present: Set[str]) -> int:
+        ids = self.field_ids
+        mask = 0
+        for f in present:
+            i = ids.get(f)
+            if i is not None:
+                mask |= 1 << i
+        return mask
+
+    def score(self, t: _TypeBits, mask: int, total_present: int) -> MatchResult:
+        required_matched = (mask & t.required_mask).bit_count()
+        return MatchResult(
+            type_name=t.name,
+            total_defined=len(t.required) + len(t.optional),
+            total_matched=required_matched + (mask & t.optional_mask).bit_count(),
+            required_total=len(t.required),
+            required_matched=required_matched,
+            missing_required=[f for f, bit in t.required if not mask & bit],
+            missing_optional=[f for f, bit in t.optional if not mask & bit],
+            total_present=total_present,
+        )
+
+    def candidates(self, present: Set[str]) -> List[int]:
+        """Positions, in definition order, of the types worth scoring for present."""
+        hits = set()
+        by_field = self.types_by_field
+        for f in present:
+            hits.update(by_field.get(f, ()))
+        if not hits:
+            return list(range(len(self.types)))
+        hits.update(self.no_required)
+        return sorted(hits)
+
+    def result(self, type_name: str, present: Set[str]) -> Optional[MatchResult]:
+        """Score one named type against present, whether or not ranking would keep it."""
+        t = self.by_name.get(type_name)
+        if t is None:
+            return None
+        return self.score(t, self.present_mask(present), len(present))
+
+    def rank(self, present: Set[str], top: Optional[int] = None) -> List[MatchResult]:
+        """Candidate types best first; with top, only the best top of them."""
+        mask = self.present_mask(present)
+        total_present = len(present)
+        types = self.types
+        return _select([self.score(types[i], mask, total_present) for i in self.candidates(present)], top)
+
+    def rank_many(self, present_sets: List[Set[str]], top: Optional[int] = None) -> List[List[MatchResult]]:
+        """Rank every present-field set against its candidate types in one pass.
+
+        Matched counts for the whole batch come from two matrix products
+        (devices x fields) @ (fields x types); only the per-result missing
+        lists are built per device.
+        """
+        if not present_sets:
+            return []
+        if not self.types:
+            return [[] for _ in present_sets]
+        import numpy as np  # only batch ranking needs it; keeps startup light
+
+        n_fields = len(self.field_ids)
+        presence = np.zeros((len(present_sets), n_fields), dtype=np.int32)
+        for row, present in enumerate(present_sets):
+            cols = [self.field_ids[f] for f in present if f in self.field_ids]
+            presence[row, cols] = 1
+        req = np.zeros((n_fields, len(self.types)), dtype=np.int32)
+        opt = np.zeros((n_fields, len(self.types)), dtype=np.int32)
+        for col, t in enumerate(self.types):
+            req[[self.field_ids[f] for f, _ in t.required], col] = 1
+            opt[[self.field_ids[f] for f, _ in t.optional], col] = 1
+        req_matched = (presence @ req).tolist()
+        opt_matched = (presence @ opt).tolist()
+
+        ranked_all: List[List[MatchResult]] = []
+        for row, present in enumerate(present_sets):
+            mask = self.present_mask(present)
+            total_present = len(present)
+            results = []
+            for col in self.candidates(present):
+                t = self.types[col]
+                results.append(MatchResult(
+                    type_name=t.name,
+                    total_defined=len(t.required) + len(t.optional),
+                    total_matched=req_matched[row][col] + opt_matched[row][col],
+                    required_total=len(t.required),
+                    required_matched=req_matched[row][col],
+                    missing_required=[f for f, bit in t.required if not mask & bit],
+                    missing_optional=[f for f, bit in t.optional if not mask & bit],
+                    total_present=total_present,
+                ))
+            ranked_all.append(_select(results, top))
+        return ranked_all
+
+
+def _mask(items: List[Tuple[str, int]]) -> int:
+    mask = 0
+    for _, bit in items:
+        mask |= bit
+    return mask
+
+
+def _rank_key(r: MatchResult) -> Tuple[float, int, int]:
+    return (r.required_pct, -r.unlinked, r.total_matched)
+
+
+def _select(results: List[MatchResult], top: Optional[int]) -> List[MatchResult]:
+    """Best first; with top, a partial selection equal to the full sort's first top."""
+    if top is not None and top < len(results):
+        return heapq.nlargest(top, results, key=_rank_key)
+    results.sort(key=_rank_key, reverse=True)
     return results
 
 
+class TypeIndex:
+    """A parsed canonical type map with a lazily compiled CategoryIndex per category."""
+
+    def __init__(self, type_map: Dict):
+        self.type_map = type_map
+        self._categories: Dict[str, CategoryIndex] = {}
+
+    def category(self, category: str) -> CategoryIndex:
+        index = self._categories.get(category)
+        if index is None:
+            index = self._categories[category] = CategoryIndex(self.type_map.get(category))
+        return index
+
+    def type_fields(self, type_name: str, category: str) -> Set[str]:
+        t = self.category(category).by_name.get(type_name)
+        return set(t.fields) if t else set()
+
+
+# Resolved YAML path -> (file signature, TypeIndex).  Reused until the file's
+# (mtime, size) changes, so run_type_matcher / get_type_fields no longer
+# re-read the YAML for every device.
+_TYPE_INDEX_CACHE: Dict[str, Tuple[Tuple[int, int], TypeIndex]] = {}
+
+
+def clear_type_index_cache() -> None:
+    """Drop all compiled type maps (the next lookup re-reads the YAML)."""
+    _TYPE_INDEX_CACHE.clear()
+
+
+def get_type_index(yaml_path: Optional[str] = None) -> TypeIndex:
+    """Return the compiled type map for yaml_path, parsing it only when it changed."""
+    path = os.path.abspath(yaml_path or _TYPE_MAP_FILE)
+    try:
+        st = os.stat(path)
+        signature = (st.st_mtime_ns, st.st_size)
+    except OSError:
+        signature = None
+    cached = _TYPE_INDEX_CACHE.get(path)
+    if cached is not None and signature is not None and cached[0] == signature:
+        return cached[1]
+    index = TypeIndex(load_type_map(path))
+    if signature is not None:
+        _TYPE_INDEX_CACHE[path] = (signature, index)
+    return index
+
+
+def _as_index(type_map) -> TypeIndex:
+    if isinstance(type_map, TypeIndex):
+        return type_map
+    for _, index in _TYPE_INDEX_CACHE.values():
+        if index.type_map is type_map:
+            return index
+    return TypeIndex(type_map)
+
+
+def rank_types(present: Set[str], category: str, type_map, top: Optional[int] = None) -> List[MatchResult]:
+    """Rank the category's candidate types for one device; type_map is a dict or a TypeIndex.
+
+    Types sharing no field with present (and having required fields) are left
+    out.  With top, only the best top results are returned.
+    """
+    return _as_index(type_map).category(category).rank(present, top)
+
+
+def top_types(present: Set[str], category: str, type_map, k: int) -> List[MatchResult]:
+    """The best k results of rank_types, without sorting the rest."""
+    return rank_types(present, category, type_map, top=k)
+
+
+def match_type(present: Set[str], type_name: str, category: str, type_map) -> Optional[MatchResult]:
+    """Score one named type for a device (None if the category does not define it)."""
+    return _as_index(type_map).category(category).result(type_name, present)
+
+
+def rank_many(
+    present_sets: List[Set[str]], category: str, type_map=None, top: Optional[int] = None,
+) -> List[List[MatchResult]]:
+    """rank_types for a batch of devices; result i is the ranking for present_sets[i].
+
+    type_map is a dict or a TypeIndex and defaults to the cached canonical_type_map.yaml.
+    """
+    index = _as_index(type_map) if type_map is not None else get_type_index()
+    return index.category(category).rank_many([set(p) for p in present_sets], top)
+
+
 def display_match_table(ranked: List[MatchResult]) -> None:
     if not ranked:
         print("  No defined types found for this category.")
@@ -110,26 +343,37 @@ def run_type_matcher(
         suggested_type_name: top-ranked type name (None if no types defined)
         pre_add_fields:      missing required fields the user agreed to add as placeholders
     """
-    try:
-        type_map = load_type_map(yaml_path)
-    except FileNotFoundError as e:
-        print(f"  Warning: {e}\n  Skipping type matching.")
-        return None, []
-
-    ranked = rank_types(present, meter_type, type_map)
+    with instrumentation.span("run_type_matcher.rank"):
+        try:
+            type_index = get_type_index(yaml_path)
+        except FileNotFoundError as e:
+            print(f"  Warning: {e}\n  Skipping type matching.")
+            return None, []
+        category = type_index.category(meter_type)
+        total = len(category.candidates(present))
+        ranked = category.rank(present, top=MATCH_TABLE_ROWS)
     if not ranked:
         print("  No type definitions found for this category. Skipping type matching.")
         return None, []
 
     print("\n--- Type Match Results ---")
+    if not any(f in category.types_by_field for f in present):
+        print("  No type shares a field with this device — ranking every type.")
     display_match_table(ranked)
 
-    # Let user pick a type by number; Enter defaults to #1
+    # Let user pick a type by number; Enter defaults to #1, 'a' lists the rest
     while True:
-        raw = input(f"  Select type # (press Enter for #1 — {ranked[0].type_name}): ").strip()
+        more = f", a = show all {total}" if len(ranked) < total else ""
+        if more:
+            print(f"  (Top {len(ranked)} of {total} types shown.)")
+        raw = input(f"  Select type # (press Enter for #1 — {ranked[0].type_name}{more}): ").strip().lower()
         if raw == "":
             selected = ranked[0]
             break
+        if raw == "a" and more:
+            ranked = category.rank(present)
+            display_match_table(ranked)
+            continue
         if raw.isdigit() and 1 <= int(raw) <= len(ranked):
             selected = ranked[int(raw) - 1]
             break
@@ -139,8 +383,7 @@ def run_type_matcher(
     pre_add: List[str] = []
 
     # Compute field breakdowns relative to the selected type
-    type_def = (type_map.get(meter_type) or {}).get(selected.type_name) or {}
-    type_fields = set(type_def.keys())
+    type_fields = type_index.type_fields(selected.type_name, meter_type)
     matched_list  = sorted(f for f in present if f in type_fields)
     unlinked_list = sorted(f for f in present if f not in type_fields)
 
@@ -170,8 +413,6 @@ def run_type_matcher(
 def get_type_fields(type_name: str, meter_type: str, yaml_path: Optional[str] = None) -> set:
     """Return all field names (required + optional) defined for a canonical type."""
     try:
-        type_map = load_type_map(yaml_path)
+        return get_type_index(yaml_path).type_fields(type_name, meter_type)
     except FileNotFoundError:
         return set()
-    type_def = (type_map.get(meter_type) or {}).get(type_name) or {}
-    return set(type_def.keys())
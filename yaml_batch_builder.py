@@ -1,19 +1,17 @@
 import os
 
-import pandas as pd
-
 from field_map_utils import load_field_standard_units
 from building_batch import find_device_folders, select_devices
 from site_model_editor import (
     load_site_model,
     validate_site_model,
-    build_translation_dataframe,
+    build_translation_rows,
     add_missing_points,
     build_yaml_asset_name,
 )
 from type_matcher import run_type_matcher, get_type_name, get_type_fields
-from translation_builder_udmi import build_udmi_dict
-from export_building_config import export_building_config
+from translation_builder_udmi import build_udmi_dict_from_rows, missing_translation_rows
+from export_building_config import export_building_configs
 from building_config_updater import run_building_config_updater_from_data
 
 
@@ -85,14 +83,17 @@ def run_yaml_batch_builder() -> None:
 
     if site_codes:
         print(f"\nExporting building configs for {len(site_codes)} site(s)...")
-        for code in sorted(site_codes):
-            outfile = os.path.join(bc_dir, f"{code}_full_building_config.yaml")
-            print(f"--- Exporting: {code} ---")
-            try:
-                export_building_config(code, outfile)
-                print(f"  Saved: {outfile}")
-            except RuntimeError as e:
-                print(f"  Warning: failed to export config for {code}: {e}")
+
+        def _report(code, outfile, error):
+            if error is None:
+                print(f"--- {code}: Saved: {outfile}")
+            else:
+                print(f"--- {code}: Warning: failed to export config: {error}")
+
+        export_building_configs(
+            {code: os.path.join(bc_dir, f"{code}_full_building_config.yaml") for code in sorted(site_codes)},
+            on_result=_report,
+        )
     else:
         print("\nWarning: no site codes found in selected device metadata. Building config export skipped.")
 
@@ -199,25 +200,14 @@ def run_yaml_batch_builder() -> None:
 
         # Build DataFrame and handle missing fields
         missing_fields = add_missing_points(asset_name, pre_add=pre_add_fields)
-        df = build_translation_dataframe(
+        rows = build_translation_rows(
             yaml_points, field_standard_units, asset_name, general_type, type_name
         )
-
-        if missing_fields:
-            missing_rows = pd.DataFrame([{
-                "assetName": asset_name,
-                "object_name": "MISSING",
-                "standardFieldName": field,
-                "raw_units": "MISSING",
-                "DBO_standard_units": "MISSING",
-                "generalType": general_type,
-                "typeName": type_name,
-            } for field in missing_fields])
-            df = pd.concat([df, missing_rows], ignore_index=True)
+        rows += missing_translation_rows(missing_fields, asset_name, general_type, type_name)
 
         # Build meter data dict in memory — no file written
         site = parsed.get("system", {}).get("location", {}).get("site", "")
-        udmi_dict = build_udmi_dict(df, num_id=num_id, guid=guid)
+        udmi_dict = build_udmi_dict_from_rows(rows, num_id=num_id, guid=guid)
         guid_key = guid if guid is not None else ""
         meter_data = udmi_dict.get(guid_key, next(iter(udmi_dict.values()), {}))
 
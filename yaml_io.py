@@ -0,0 +1,145 @@
+"""
+Shared YAML load/dump helpers.
+
+Uses the LibYAML-backed CSafeLoader / CSafeDumper when PyYAML was built with
+LibYAML and falls back to the pure-Python SafeLoader / SafeDumper otherwise.
+
+The LibYAML emitter differs from the Python one for a few inputs (empty keys,
+control characters, line folding of long non-ASCII strings), so dump() only
+hands a document to CSafeDumper when every string in it is printable ASCII
+and no key is empty.  Everything else goes through the Python emitter, which
+keeps ADD/UPDATE files byte-identical to plain yaml.dump output.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, IO, Optional, Union
+
+import yaml
+
+import instrumentation
+
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+_CSafeDumper = getattr(yaml, "CSafeDumper", None)
+HAS_LIBYAML = SafeLoader is not yaml.SafeLoader and _CSafeDumper is not None
+
+
+def load(stream: Union[str, bytes, IO]) -> Any:
+    """Parse one YAML document (same result as yaml.safe_load)."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def load_file(path: str) -> Any:
+    """Parse the YAML document in path."""
+    with instrumentation.span("yaml.load"), open(path, "r", encoding="utf-8") as fh:
+        return load(fh)
+
+
+# Parsed documents are pickled into this folder next to the source file.
+CACHE_DIR_NAME = ".yaml_cache"
+_CACHE_VERSION = 1
+
+
+def _cache_path(path: str, cache_dir: Optional[str]) -> str:
+    folder = cache_dir or os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    return os.path.join(folder, os.path.basename(path) + ".pickle")
+
+
+def load_file_cached(path: str, cache_dir: Optional[str] = None) -> Any:
+    """Parse path like load_file, reusing an on-disk pickle of an earlier parse.
+
+    The pickle is keyed by the file's size, mtime and SHA-256, and is only
+    used when the size and hash match, so a re-exported config with identical
+    content still hits and any edit misses.  Cache read/write failures fall
+    back to a normal parse.  Each call returns a fresh object.
+    """
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    st = os.stat(path)
+    digest = hashlib.sha256(raw).hexdigest()
+    cache_file = _cache_path(path, cache_dir)
+
+    try:
+        with open(cache_file, "rb") as fh:
+            version, size, mtime_ns, cached_digest = pickle.load(fh)
+            if version == _CACHE_VERSION and size == len(raw) and cached_digest == digest:
+                data = pickle.load(fh)
+                if mtime_ns != st.st_mtime_ns:
+                    _write_cache(cache_file, (version, size, st.st_mtime_ns, digest), data)
+                instrumentation.count("yaml.cache_hit")
+                return data
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError, ImportError):
+        pass
+
+    instrumentation.count("yaml.cache_miss")
+    with instrumentation.span("yaml.load"):
+        data = load(raw.decode("utf-8"))
+    _write_cache(cache_file, (_CACHE_VERSION, len(raw), st.st_mtime_ns, digest), data)
+    return data
+
+
+def _write_cache(cache_file: str, header: tuple, data: Any) -> None:
+    """Atomically write header + data to cache_file; errors are ignored."""
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(header, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+        tmp = None
+    except (OSError, pickle.PicklingError):
+        pass
+    finally:
+        if tmp is not None:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _emits_identically(data: Any) -> bool:
+    """True if LibYAML is known to emit data exactly like the Python emitter."""
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str):
+            if not (obj.isascii() and obj.isprintable()):
+                return False
+        elif isinstance(obj, dict):
+            for k, v in obj.items():
+                if k == "":
+                    return False
+                stack.append(k)
+                stack.append(v)
+        elif isinstance(obj, (list, tuple)):
+            stack.extend(obj)
+    return True
+
+
+def dump(data: Any, **kwargs) -> str:
+    """Serialize data block-style with insertion-ordered keys (yaml.dump(sort_keys=False))."""
+    kwargs.setdefault("sort_keys", False)
+    kwargs.setdefault("default_flow_style", False)
+    dumper = _CSafeDumper if _CSafeDumper is not None and _emits_identically(data) else yaml.SafeDumper
+    return yaml.dump(data, Dumper=dumper, **kwargs)
+
+
+def dump_sections(doc: Dict[str, Any]) -> str:
+    """Serialize each top-level key as its own block, separated by a blank line.
+
+    This is the layout of the CONFIG_METADATA / building / meter ADD and
+    UPDATE files passed to UpdateBuildingConfig.
+    """
+    return "\n".join(dump({k: v}) for k, v in doc.items())
+
+
+def write_sections(path: str, doc: Dict[str, Any]) -> None:
+    """Write doc to path in the dump_sections layout."""
+    with instrumentation.span("yaml.write"):
+        text = dump_sections(doc)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(text)